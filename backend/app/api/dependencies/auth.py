@@ -1,24 +1,51 @@
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import SECRET_KEY, API_PREFIX
 from app.models.user import UserInDB
-from app.api.dependencies.database import get_repository
+from app.api.dependencies.database import WRITER_STATE_KEY, get_repository
 from app.db.repositories.users import UsersRepository
-from app.services import auth_service
+from app.services import auth_service, token_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{API_PREFIX}/users/login/token/")
 
 async def get_user_from_token(
     *,
+    request: Request,
     token: str = Depends(oauth2_scheme),
     user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
 ) -> Optional[UserInDB]:
+    user = await _user_from_token(token, user_repo)
+    if user:
+        # for ReadYourWritesMiddleware to remember who wrote
+        setattr(request.state, WRITER_STATE_KEY, user.id)
+    return user
+
+async def get_active_user_from_websocket(
+    websocket: WebSocket, token: str = Query(..., description="A bearer token for the user.")
+) -> Optional[UserInDB]:
+    """
+    Browsers can't set headers on a WebSocket handshake, so the token comes in the query string.
+    Returns None instead of raising when there's no active user, for the endpoint to close the socket.
+    """
+    try:
+        user = await _user_from_token(token, UsersRepository(websocket.app.state._db))
+    except HTTPException:
+        return None
+    return user if user and user.is_active else None
+
+async def _user_from_token(token: str, user_repo: UsersRepository) -> Optional[UserInDB]:
+    # a cache hit skips both the JWT verification and the user lookup
+    cached = token_cache.get(token)
+    if cached:
+        return cached.user.copy()
     try:
-        username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
-        user = await user_repo.get_user_by_username(username=username)
+        payload = auth_service.get_payload_from_token(token=token, secret_key=str(SECRET_KEY))
+        user = await user_repo.get_user_by_username(username=payload.username)
     except Exception as e:
         raise e
+    if user:
+        token_cache.set(token, claims=payload, user=user.copy())
     return user
     
 def get_current_active_user(current_user: UserInDB = Depends(get_user_from_token)) -> Optional[UserInDB]:
@@ -1,15 +1,53 @@
 from typing import Callable, Type
 from databases import Database
 from fastapi import Depends
+from fastapi.security.utils import get_authorization_scheme_param
 from starlette.requests import Request
+from app.db.loaders import LoaderRegistry
 from app.db.repositories.base import BaseRepository
+from app.services import token_cache
+
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+# request.state attribute holding the authenticated user's id, for ReadYourWritesMiddleware
+WRITER_STATE_KEY = "user_id"
 
 
 def get_database(request: Request) -> Database:
     return request.app.state._db
 
+
+def get_read_database(request: Request) -> Database:
+    """
+    Route reads to the replica when there is one, except for users who wrote within
+    the last READ_YOUR_WRITES_SECONDS - those stay on the primary so they see their own changes
+    """
+    primary = request.app.state._db
+    replica = getattr(request.app.state, "_db_replica", None)
+    if replica is None or request.method not in READ_ONLY_METHODS:
+        return primary
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return replica
+    # the user is only looked up once the database is chosen, so go by the token cache - every write
+    # caches its token, so one that isn't cached may still belong to a user who just wrote
+    cached = token_cache.peek(token)
+    if cached is None or request.app.state._recent_writes.wrote_recently(cached.user.id):
+        return primary
+    return replica
+
+
+def get_loaders(request: Request) -> LoaderRegistry:
+    # one registry per request so batching and memoization never leak across requests
+    if not hasattr(request.state, "loaders"):
+        request.state.loaders = LoaderRegistry()
+    return request.state.loaders
+
     
 def get_repository(Repo_type: Type[BaseRepository]) -> Callable:
-    def get_repo(db: Database = Depends(get_database)) -> Type[BaseRepository]:
-        return Repo_type(db)
+    def get_repo(
+        db: Database = Depends(get_database),
+        read_db: Database = Depends(get_read_database),
+        loaders: LoaderRegistry = Depends(get_loaders),
+    ) -> Type[BaseRepository]:
+        return Repo_type(db, loaders=loaders, read_db=read_db)
     return get_repo
@@ -0,0 +1,38 @@
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.requests import Request
+from app.services import login_ip_limiter, login_email_limiter, token_cache
+
+
+def client_key(request: Request) -> str:
+    """
+    The bucket key for a request - the user's id when it carries a token we have already verified,
+    otherwise the client IP. That is only the real client's address when uvicorn runs with
+    --proxy-headers and the proxy is listed in --forwarded-allow-ips (see docker-compose.yml);
+    without them every client behind the proxy shares the proxy's bucket.
+    """
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() == "bearer" and token:
+        cached = token_cache.peek(token)
+        if cached is not None:
+            return f"user:{cached.user.id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def throttle_login_attempts(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(OAuth2PasswordRequestForm),
+) -> None:
+    """
+    Reject excess login attempts per client and per email before any password hashing happens
+    """
+    retry_after = await login_ip_limiter.hit(client_key(request))
+    if retry_after is None:
+        retry_after = await login_email_limiter.hit(form_data.username.strip().lower())
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts. Please try again later.",
+            headers={"Retry-After": str(retry_after)},
+        )
@@ -0,0 +1,392 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.dependencies.database import READ_ONLY_METHODS, WRITER_STATE_KEY
+from app.core.metrics import REGISTRY, Gauge, Histogram
+from app.core.profiling import TaskSampler
+from app.db.instrumentation import QUERIES_PER_REQUEST, QUERY_LOG, QueryLog, logger as query_logger
+from app.services.recent_writes import RecentWrites
+
+# anything else is counted as "other", so made-up methods can't add label values
+HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+UNSAFE_FILENAME_CHARACTERS = re.compile(r"[^\w-]")
+# in order of preference when the client accepts several equally
+COMPRESSION_ENCODINGS = ("br", "gzip")
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+# every event has to reach the client as soon as it is sent, and they are too small to gain much
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+BYTES_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "nextup_http_request_duration_seconds",
+        "Time from receiving a request to sending the end of its response.",
+        ("route", "method", "status"),
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    )
+)
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge("nextup_http_requests_in_flight", "HTTP requests being handled."))
+REQUEST_SIZE = REGISTRY.register(
+    Histogram("nextup_http_request_size_bytes", "Size of request bodies.", ("route",), buckets=BYTES_BUCKETS)
+)
+RESPONSE_SIZE = REGISTRY.register(
+    Histogram("nextup_http_response_size_bytes", "Size of response bodies.", ("route",), buckets=BYTES_BUCKETS)
+)
+
+
+class QueryTimingMiddleware:
+    """
+    Collects the SQL statements of each request in a QueryLog. Their count and total time go out in a
+    `Server-Timing` header and the nextup_db_queries_per_request histogram, and the full list is logged
+    to `app.db.queries` at DEBUG level once the response has been sent.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        query_log = QueryLog()
+        token = QUERY_LOG.set(query_log)
+        status_code = None
+
+        async def send_with_server_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # statements a streaming response runs after this point are only in the log and the metrics
+                MutableHeaders(scope=message).append("Server-Timing", query_log.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            QUERY_LOG.reset(token)
+            QUERIES_PER_REQUEST.observe(query_log.count)
+            if query_logger.isEnabledFor(logging.DEBUG):
+                query_logger.debug(
+                    json.dumps(
+                        {
+                            "event": "request_queries",
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "status": status_code,
+                            **query_log.as_dict(),
+                        }
+                    )
+                )
+
+
+class ReadYourWritesMiddleware:
+    """
+    Records the authenticated user of every write that succeeds in `recent_writes`, so get_read_database
+    keeps their next reads on the primary. Failed writes are not recorded. It is done as the response starts,
+    before the client can send its next request.
+    """
+    def __init__(self, app: ASGIApp, *, recent_writes: RecentWrites) -> None:
+        self.app = app
+        self.recent_writes = recent_writes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in READ_ONLY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        # shared with request.state, where get_user_from_token leaves the user id
+        state = scope.setdefault("state", {})
+
+        async def send_recording_writer(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400 and WRITER_STATE_KEY in state:
+                self.recent_writes.record(state[WRITER_STATE_KEY])
+            await send(message)
+
+        await self.app(scope, receive, send_recording_writer)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status, body sizes and in-flight requests for every HTTP request, labelled with the
+    `name` of the route that handled it ("unmatched" for 404s). WebSocket connections are not counted,
+    and streaming responses are timed until their last chunk is sent.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._route_names: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def receive_counting() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_counting(message: Message) -> None:
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            else:
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive_counting, send_counting)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = self._route_name(scope)
+            method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+            REQUEST_DURATION.observe(time.perf_counter() - started, route, method, str(status_code))
+            REQUEST_SIZE.observe(request_bytes, route)
+            RESPONSE_SIZE.observe(response_bytes, route)
+
+    def _route_name(self, scope: Scope) -> str:
+        # the router leaves the matched route's endpoint in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        name = self._route_names.get(endpoint)
+        if name is None:
+            self._route_names.update(
+                (route.endpoint, route.name) for route in scope["app"].routes if hasattr(route, "endpoint")
+            )
+            name = self._route_names.setdefault(endpoint, getattr(endpoint, "__name__", "unnamed"))
+        return name
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry the admin `X-Profile-Token`, plus a random share of the requests to the
+    routes in `sample_rates`, with a TaskSampler. Each profile is written to `directory` as a folded-stacks
+    file, and token requests get its path back in an `X-Profile` header.
+    """
+    def __init__(
+        self, app: ASGIApp, *, token: str, sample_rates: Dict[str, float], interval: float, directory: str
+    ) -> None:
+        self.app = app
+        self.token = token.encode()
+        self.sample_rates = sample_rates
+        self.interval = interval
+        self.directory = directory
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = self.token and any(
+            name == PROFILE_TOKEN_HEADER and hmac.compare_digest(value, self.token) for name, value in scope["headers"]
+        )
+        route = None
+        if requested or self.sample_rates:
+            route = self._route_name(scope)
+        if not requested and random.random() >= self.sample_rates.get(route, 0.0):
+            await self.app(scope, receive, send)
+            return
+
+        safe_route = UNSAFE_FILENAME_CHARACTERS.sub("_", route or "unmatched")
+        filename = os.path.join(self.directory, f"{safe_route}-{int(time.time())}-{secrets.token_hex(4)}.folded")
+
+        async def send_with_profile_path(message: Message) -> None:
+            if requested and message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile", filename)
+            await send(message)
+
+        sampler = TaskSampler(asyncio.current_task(), thread_id=threading.get_ident(), interval=self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_path)
+        finally:
+            sampler.stop()
+            await asyncio.get_event_loop().run_in_executor(None, self._write, filename, sampler.folded())
+
+    def _write(self, filename: str, folded: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(filename, "w") as f:
+            f.write(folded)
+
+    @staticmethod
+    def _route_name(scope: Scope) -> Optional[str]:
+        # the router hasn't run yet, so find the route the same way it will
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.name
+        return None
+
+
+def choose_encoding(accept_encoding: str, available: Sequence[str] = COMPRESSION_ENCODINGS) -> Optional[str]:
+    """
+    The first of `available` with the highest quality in an Accept-Encoding header, or None for identity
+    """
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class GzipEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality, mode=brotli.MODE_TEXT)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses text and JSON responses with brotli or gzip, whichever the client prefers.
+
+    Complete bodies under `minimum_size` bytes are sent as they are, since they save too little to be worth
+    the CPU. Streaming responses are always compressed, and each chunk is flushed so clients can use rows
+    as they arrive. Compressed bodies of responses with an ETag are kept in an LRU cache keyed by content,
+    so pages that haven't changed aren't compressed again.
+    """
+    def __init__(self, app: ASGIApp, *, minimum_size: int, gzip_level: int, brotli_quality: int, cache_size: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message: Optional[Message] = None
+        encoder: Any = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, encoder
+            if message["type"] == "http.response.start":
+                # held back until the first chunk of the body shows whether it's worth compressing
+                start_message = message
+                return
+            if start_message is None:
+                if encoder is not None:
+                    body = encoder.compress(message.get("body", b""))
+                    more_body = message.get("more_body", False)
+                    body += encoder.flush() if more_body else encoder.finish()
+                    message = {"type": "http.response.body", "body": body, "more_body": more_body}
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if not self._compressible(headers):
+                await send(start)
+                await send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is None or (not more_body and len(body) < self.minimum_size):
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            if not more_body:
+                body = self._compress_body(encoding, body, cacheable="etag" in headers)
+                headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            encoder = self._encoder(encoding)
+            await send(start)
+            await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.flush(), "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        content_type = headers.get("content-type", "")
+        return (
+            "content-encoding" not in headers
+            and "no-transform" not in headers.get("cache-control", "")
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+            and not content_type.startswith(UNCOMPRESSED_TYPES)
+        )
+
+    def _encoder(self, encoding: str) -> Any:
+        return BrotliEncoder(self.brotli_quality) if encoding == "br" else GzipEncoder(self.gzip_level)
+
+    def _compress_body(self, encoding: str, body: bytes, *, cacheable: bool) -> bytes:
+        if not cacheable or not self.cache_size:
+            encoder = self._encoder(encoding)
+            return encoder.compress(body) + encoder.finish()
+        # hashing is an order of magnitude cheaper than compressing
+        key = (encoding, blake2b(body, digest_size=16).digest())
+        compressed = self._cache.get(key)
+        if compressed is not None:
+            self._cache.move_to_end(key)
+            return compressed
+        encoder = self._encoder(encoding)
+        compressed = self._cache[key] = encoder.compress(body) + encoder.finish()
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return compressed
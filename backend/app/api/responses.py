@@ -0,0 +1,84 @@
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def _encode_model(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class TrustedJSONResponse(ORJSONResponse):
+    """
+    Renders models built from our own database rows (see `from_trusted_record`) straight to JSON.
+
+    FastAPI returns a Response from an endpoint as is, so this skips its response_model step,
+    which dumps the model to a dict and validates it all over again. Only return models whose
+    fields match the route's response_model - nothing is filtered out here.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_encode_model)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    A weak ETag for a representation, from the values that version it - e.g. (id, updated_at)
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match / If-Match header lists `etag`, compared weakly (the W/ prefix is ignored).
+    Our tags come from the row versions, so weak comparison is safe for If-Match too.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == opaque
+        for candidate in (value.strip() for value in header.split(","))
+    )
+
+
+def conditional_response(request: Request, content: Any, *, etag: str) -> Response:
+    """
+    304 with no body when the client already holds `etag`, otherwise the content tagged with it
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return TrustedJSONResponse(content, headers={"ETag": etag})
+
+
+def check_if_match(request: Request, etag: str) -> None:
+    """
+    Raise 412 if the request sent an If-Match that doesn't list `etag`
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is not None and not etag_matches(if_match, etag):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="The resource has changed since it was fetched.",
+        )
+
+
+async def service_busy_handler(request: Request, exc: Exception) -> Response:
+    """
+    Answers requests that gave up waiting for a scarce resource, such as a database connection,
+    with a 503 telling the client to retry shortly
+    """
+    return ORJSONResponse(
+        {"detail": "The service is busy. Please try again shortly."},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
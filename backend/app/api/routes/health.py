@@ -0,0 +1,44 @@
+import asyncio
+from fastapi import APIRouter, status
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+router = APIRouter()
+
+# how long the readiness probe waits on the database before reporting unready
+READINESS_TIMEOUT_SECONDS = 2.0
+
+@router.get("/live/", name="health:liveness")
+async def liveness() -> dict:
+    return {"status": "ok"}
+
+@router.get("/ready/", name="health:readiness")
+async def readiness(request: Request) -> JSONResponse:
+    db = getattr(request.app.state, "_db", None)
+    pool = getattr(request.app.state, "_db_pool", None)
+    listener = getattr(request.app.state, "_todo_listener", None)
+    # a disconnected listener only degrades push events (clients fall back to syncing), so it doesn't fail the probe
+    body = {
+        "status": "ok",
+        "pool": pool.stats() if pool else None,
+        "todo_events": listener.stats() if listener else None,
+    }
+    if db is None:
+        body["status"] = "database not connected"
+        return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        await asyncio.wait_for(db.execute("SELECT 1"), timeout=READINESS_TIMEOUT_SECONDS)
+    except Exception as e:
+        body["status"] = f"database unavailable: {e.__class__.__name__}"
+        return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    replica = getattr(request.app.state, "_db_replica", None)
+    if replica is not None:
+        replica_pool = request.app.state._db_replica_pool
+        body["replica_pool"] = replica_pool.stats()
+        try:
+            await asyncio.wait_for(replica.execute("SELECT 1"), timeout=READINESS_TIMEOUT_SECONDS)
+        except Exception as e:
+            # GET requests are routed to the replica, so it has to be up for this worker to be ready
+            body["status"] = f"replica unavailable: {e.__class__.__name__}"
+            return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return JSONResponse(body)
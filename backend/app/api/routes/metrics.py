@@ -0,0 +1,33 @@
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
+from app.core.settings import METRICS_TOKEN
+
+router = APIRouter()
+
+
+def verify_metrics_token(request: Request) -> None:
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+# served outside /api like the other scrape targets, keep it off the public load balancer as well
+@router.get(
+    "/metrics",
+    name="metrics:prometheus",
+    include_in_schema=False,
+    dependencies=[Depends(verify_metrics_token)],
+)
+async def prometheus_metrics() -> Response:
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,14 +1,22 @@
-from fastapi import Depends, APIRouter, HTTPException, Path, Body, status
+from fastapi import Depends, APIRouter, HTTPException, Path, Body, Request, status
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
+from app.api.responses import TrustedJSONResponse, check_if_match, conditional_response, make_etag
 from app.models.user import UserCreate, UserUpdate, UserInDB, UserPublic
-from app.models.profile import ProfileUpdate, ProfilePublic
+from app.models.profile import ProfileInDB, ProfileUpdate, ProfilePublic
 from app.db.repositories.profiles import ProfilesRepository
 
 router = APIRouter()
 
+
+def profile_etag(profile: ProfileInDB, *, username: str, email: str) -> str:
+    # username and email come from the users row, so they version the representation too
+    return make_etag(profile.id, profile.updated_at, username, email)
+
+
 @router.get("/{username}/", response_model=ProfilePublic, name="profiles:get-profile-by-username")
 async def get_profile_by_username(
+    request: Request,
     username: str = Path(..., min_length=3, regex="[a-zA-Z0-9_-]+$"),
     current_user: UserInDB = Depends(get_current_active_user),
     profiles_repo: ProfilesRepository = Depends(get_repository(ProfilesRepository)),
@@ -16,13 +24,24 @@ async def get_profile_by_username(
     profile = await profiles_repo.get_profile_by_username(username=username)
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile found with that username.")
-    return profile
+    etag = profile_etag(profile, username=profile.username, email=profile.email)
+    return conditional_response(request, profile, etag=etag)
 
 @router.put("/me/", response_model=ProfilePublic, name="profiles:update-own-profile")
 async def update_own_profile(
+    request: Request,
     profile_update: ProfileUpdate = Body(..., embed=True),
     current_user: UserInDB = Depends(get_current_active_user),
     profiles_repo: ProfilesRepository = Depends(get_repository(ProfilesRepository)),    
 ) -> ProfilePublic:
-    updated_profile = await profiles_repo.update_profile(profile_update=profile_update, requesting_user=current_user)
-    return updated_profile
+    expected_updated_at = None
+    if request.headers.get("if-match") is not None:
+        # memoized for the request, so update_profile doesn't look it up again
+        current_profile = await profiles_repo.get_profile_by_user_id(user_id=current_user.id)
+        check_if_match(request, profile_etag(current_profile, username=current_user.username, email=current_user.email))
+        expected_updated_at = current_profile.updated_at
+    updated_profile = await profiles_repo.update_profile(
+        profile_update=profile_update, requesting_user=current_user, expected_updated_at=expected_updated_at
+    )
+    etag = profile_etag(updated_profile, username=current_user.username, email=current_user.email)
+    return TrustedJSONResponse(updated_profile, headers={"ETag": etag})
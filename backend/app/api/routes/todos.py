@@ -1,30 +1,254 @@
-from typing import List
-from fastapi import APIRouter, Body, Path, Depends, HTTPException, status
+import asyncio
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Mapping, Optional, Union
+from fastapi import APIRouter, Body, Path, Query, Depends, HTTPException, Request, WebSocket, status
+from pydantic import conlist
+from starlette.responses import StreamingResponse
 
 from app.models.user import UserCreate, UserUpdate, UserInDB, UserPublic
-from app.models.todo import Todo, TodoIn, TodoInDB, TodoPublic
+from app.models.todo import (
+    CompactTodoPage,
+    Todo,
+    TodoChanges,
+    TodoIn,
+    TodoInDB,
+    TodoPublic,
+    TodoPage,
+    TodoSearchResults,
+    TodoStats,
+    TodoBatchUpdate,
+    TodoBatchResult,
+)
 from app.db.repositories.todos import TodosRepository
 from app.api.dependencies.database import get_repository
-from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.auth import get_current_active_user, get_active_user_from_websocket
+from app.core.settings import TODO_EVENTS_HEARTBEAT_SECONDS
+from app.db.notifications import Subscription
+from app.api.responses import TrustedJSONResponse, check_if_match, conditional_response, make_etag
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Todo], name="todos:get-all-todos")
+# number of rows encoded per chunk written to the socket when exporting
+EXPORT_CHUNK_ROWS = 200
+EXPORT_FIELDS = ("id", "task", "completed", "owner", "created_at", "updated_at")
+# upper bound on items per batch request, keeps each statement well under postgres' bind parameter limit
+MAX_BATCH_SIZE = 500
+
+
+def todo_etag(todo: TodoInDB) -> str:
+    parts = [todo.id, todo.updated_at]
+    # an embedded owner changes the representation too
+    if isinstance(todo.owner, UserPublic):
+        parts += [todo.owner.updated_at, todo.owner.profile.updated_at if todo.owner.profile else None]
+    return make_etag(*parts)
+
+
+async def _todos_as_ndjson(records: AsyncIterator[Mapping]) -> AsyncIterator[str]:
+    lines = []
+    async for record in records:
+        row = {field: record[field] for field in EXPORT_FIELDS}
+        row["created_at"] = row["created_at"].isoformat()
+        row["updated_at"] = row["updated_at"].isoformat()
+        lines.append(json.dumps(row))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def _todos_as_csv(records: AsyncIterator[Mapping]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    rows = 0
+    async for record in records:
+        writer.writerow(
+            [record["id"], record["task"], record["completed"], record["owner"],
+             record["created_at"].isoformat(), record["updated_at"].isoformat()]
+        )
+        rows += 1
+        if rows >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+
+async def _todo_events_as_sse(request: Request, user_id: int) -> AsyncIterator[str]:
+    with request.app.state._todo_listener.subscribe(user_id) as subscription:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=TODO_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                # a comment line keeps proxies from closing an idle stream
+                yield ": heartbeat\n\n"
+                continue
+            yield f"event: {event['op']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _forward_todo_events(websocket: WebSocket, subscription: Subscription) -> None:
+    received = asyncio.ensure_future(websocket.receive())
+    next_event = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            await asyncio.wait({received, next_event}, return_when=asyncio.FIRST_COMPLETED)
+            if received.done():
+                if received.result()["type"] == "websocket.disconnect":
+                    return
+                # anything the client sends is ignored, keep waiting for it to disconnect
+                received = asyncio.ensure_future(websocket.receive())
+            if next_event.done():
+                await websocket.send_json(next_event.result())
+                next_event = asyncio.ensure_future(subscription.get())
+    finally:
+        received.cancel()
+        next_event.cancel()
+
+
+@router.get("/", response_model=Union[TodoPage, CompactTodoPage], name="todos:get-all-todos")
 async def get_all_todos(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of todos to return."),
+    after: Optional[str] = Query(None, description="The `next_cursor` returned with the previous page."),
+    completed: Optional[bool] = Query(None, description="Only return completed or open todos."),
+    format: str = Query(
+        "full", regex="^(full|compact)$", description="`compact` returns one array per column instead of objects."
+    ),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> Union[TodoPage, CompactTodoPage]:
+    if format == "compact":
+        compact, version = await todos_repo.list_todos_page_compact(
+            limit=limit, after=after, requesting_user=current_user, completed=completed
+        )
+        etag = make_etag(format, compact.next_cursor, *version)
+        return conditional_response(request, compact.as_columns(), etag=etag)
+    page, version = await todos_repo.list_todos_page(
+        limit=limit, after=after, requesting_user=current_user, completed=completed
+    )
+    return conditional_response(request, page, etag=make_etag(format, page.next_cursor, *version))
+
+@router.get("/export/", name="todos:export-user-todos")
+async def export_user_todos(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Either `ndjson` or `csv`."),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> StreamingResponse:
+    records = todos_repo.iterate_user_todos(requesting_user=current_user)
+    if format == "csv":
+        return StreamingResponse(
+            _todos_as_csv(records),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="todos.csv"'},
+        )
+    return StreamingResponse(_todos_as_ndjson(records), media_type="application/x-ndjson")
+
+@router.get("/changes/", response_model=TodoChanges, name="todos:list-todo-changes")
+async def list_todo_changes(
+    since: Optional[str] = Query(None, description="The `next_cursor` returned by the previous sync."),
+    limit: int = Query(500, ge=1, le=1000, description="Maximum number of todos to return."),
+    current_user: UserInDB = Depends(get_current_active_user),
     todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
-) -> List[Todo]:
-    return await todos_repo.get_all_todos()
+) -> TodoChanges:
+    changes = await todos_repo.list_todo_changes(requesting_user=current_user, since=since, limit=limit)
+    return TrustedJSONResponse(changes)
+
+@router.get("/stats/", response_model=TodoStats, name="todos:get-todo-stats")
+async def get_todo_stats(
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> TodoStats:
+    return TrustedJSONResponse(await todos_repo.get_todo_stats(requesting_user=current_user))
+
+@router.get("/search/", response_model=TodoSearchResults, name="todos:search-todos")
+async def search_todos(
+    q: str = Query(..., min_length=1, max_length=200, description="Words or part of a word to look for."),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of todos to return."),
+    after: Optional[str] = Query(None, description="The `next_cursor` returned with the previous page."),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> TodoSearchResults:
+    results = await todos_repo.search_user_todos(requesting_user=current_user, q=q, limit=limit, after=after)
+    return TrustedJSONResponse(results)
+
+@router.get("/events/", name="todos:stream-todo-events")
+async def stream_todo_events(
+    request: Request, current_user: UserInDB = Depends(get_current_active_user)
+) -> StreamingResponse:
+    """
+    Server-sent events for changes to the user's todos: `insert`, `update` and `delete` with the todo's id,
+    or `resync` when events were missed and the client should catch up through /todos/changes/.
+    """
+    return StreamingResponse(
+        _todo_events_as_sse(request, current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws/", name="todos:todo-events-websocket")
+async def todo_events_websocket(
+    websocket: WebSocket, current_user: Optional[UserInDB] = Depends(get_active_user_from_websocket)
+) -> None:
+    """
+    The same events as /todos/events/, one JSON message each
+    """
+    if not current_user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    with websocket.app.state._todo_listener.subscribe(current_user.id) as subscription:
+        await _forward_todo_events(websocket, subscription)
+
+@router.post(
+    "/batch/",
+    response_model=List[TodoBatchResult],
+    name="todos:create-todos-batch",
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_todos_batch(
+    new_todos: conlist(TodoIn, min_items=1, max_items=MAX_BATCH_SIZE) = Body(..., embed=True),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> List[TodoBatchResult]:
+    return await todos_repo.create_todos_batch(new_todos=new_todos, requesting_user=current_user)
+
+@router.put("/batch/", response_model=List[TodoBatchResult], name="todos:update-todos-batch")
+async def update_todos_batch(
+    todo_updates: conlist(TodoBatchUpdate, min_items=1, max_items=MAX_BATCH_SIZE) = Body(..., embed=True),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> List[TodoBatchResult]:
+    return await todos_repo.update_todos_batch(todo_updates=todo_updates, requesting_user=current_user)
+
+# DELETE requests with a body are dropped by some proxies and clients, so batch deletes are a POST
+@router.post("/batch/delete/", response_model=List[TodoBatchResult], name="todos:delete-todos-batch")
+async def delete_todos_batch(
+    todo_ids: conlist(int, min_items=1, max_items=MAX_BATCH_SIZE) = Body(..., embed=True),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> List[TodoBatchResult]:
+    return await todos_repo.delete_todos_batch(ids=todo_ids, requesting_user=current_user)
 
 @router.get("/{todo_id}/", response_model=TodoPublic, name="todos:get-todo-by-id")
 async def get_todo_by_id(
+    request: Request,
     todo_id: int = Path(..., ge=1),
+    populate_owner: bool = Query(False, description="Embed the owner's public user and profile."),
     current_user: UserInDB = Depends(get_current_active_user),
     todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
 ) -> TodoPublic:
     todo = await todos_repo.get_todo_by_id(id=todo_id, requesting_user=current_user)
     if not todo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id.")
-    return todo
+    if populate_owner:
+        [todo] = await todos_repo.populate_todos(todos=[todo])
+    return conditional_response(request, todo, etag=todo_etag(todo))
 
 
 
@@ -41,15 +265,26 @@ async def create_todo(
 
 @router.put("/{todo_id}/", response_model=TodoPublic, name="todos:update-todo-by-id")
 async def update_todo_by_id(
+    request: Request,
     todo_id: int = Path(..., ge=1, title="The ID of the todo to update."),
     current_user: UserInDB = Depends(get_current_active_user),
     todo_update: Todo = Body(..., embed=True),
     todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
 ) -> TodoPublic:
-    updated_todo = await todos_repo.update_todo(todo_id=id, todo_update=todo_update, requesting_user=current_user)
+    expected_updated_at = None
+    if request.headers.get("if-match") is not None:
+        current_todo = await todos_repo.get_todo_by_id(id=todo_id, requesting_user=current_user)
+        if not current_todo:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id.")
+        check_if_match(request, todo_etag(current_todo))
+        # the write is guarded on this version too, so a concurrent update in between still gets a 412
+        expected_updated_at = current_todo.updated_at
+    updated_todo = await todos_repo.update_todo(
+        id=todo_id, todo_update=todo_update, requesting_user=current_user, expected_updated_at=expected_updated_at
+    )
     if not updated_todo:
-        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No todo found with that id.")
-    return updated_todo
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id.")
+    return TrustedJSONResponse(updated_todo, headers={"ETag": todo_etag(updated_todo)})
 
 
 @router.delete("/{todo_id}/", response_model=int, name="todos:delete-todo-by-id")
@@ -58,8 +293,8 @@ async def delete_todo_by_id(
     current_user: UserInDB = Depends(get_current_active_user),
     todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
 ) -> int:
-    deleted_id = await todos_repo.delete_todo_by_id(todo_id=id, requesting_user=current_user)
+    deleted_id = await todos_repo.delete_todo_by_id(id=todo_id, requesting_user=current_user)
     if not deleted_id:
-        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No todo found with that id.")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id.")
     return deleted_id
 
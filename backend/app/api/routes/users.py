@@ -4,6 +4,8 @@ from app.models.token import AccessToken
 from app.services import auth_service
 from app.api.dependencies.database import get_repository
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.rate_limit import throttle_login_attempts
+from app.api.responses import TrustedJSONResponse
 from app.models.user import UserCreate, UserUpdate, UserInDB, UserPublic
 
 from starlette.status import (
@@ -28,9 +30,14 @@ async def register_new_user(
     access_token = AccessToken(
         access_token=auth_service.create_access_token_for_user(user=created_user), token_type="bearer"
     )
-    return UserPublic(**created_user.dict(), access_token=access_token)
+    return created_user.copy(update={"access_token": access_token})
 
-@router.post("/login/token/", response_model=AccessToken, name="users:login-email-and-password")
+@router.post(
+    "/login/token/",
+    response_model=AccessToken,
+    name="users:login-email-and-password",
+    dependencies=[Depends(throttle_login_attempts)],
+)
 async def user_login_with_email_and_password(
     user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
     form_data: OAuth2PasswordRequestForm = Depends(OAuth2PasswordRequestForm),
@@ -46,6 +53,18 @@ async def user_login_with_email_and_password(
     return access_token
 
 @router.get("/me/", response_model=UserPublic, name="users:get-current-user")
-async def get_currently_authenticated_user(current_user: UserInDB = Depends(get_current_active_user)) -> UserPublic:
-    return current_user
+async def get_currently_authenticated_user(
+    current_user: UserInDB = Depends(get_current_active_user),
+    user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
+) -> UserPublic:
+    # user and profile come back from a single joined query
+    user = await user_repo.get_populated_user_by_id(user_id=current_user.id)
+    if not user:
+        # the token is still valid (or cached) but its account has been deleted since
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="No authenticated user.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return TrustedJSONResponse(user)
 
@@ -1,13 +1,37 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.core import config, tasks  
+from app.core.profiling import parse_sample_rates
+from app.core.settings import (
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_CACHE_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MINIMUM_SIZE,
+    PROFILING_DIR,
+    PROFILING_INTERVAL_MS,
+    PROFILING_SAMPLE_RATES,
+    PROFILING_TOKEN,
+    READ_YOUR_WRITES_SECONDS,
+)
+from app.api.middleware import (
+    CompressionMiddleware,
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    QueryTimingMiddleware,
+    ReadYourWritesMiddleware,
+)
+from app.api.responses import service_busy_handler
 from app.api.routes import router as api_router
+from app.api.routes.metrics import router as metrics_router
+from app.db.pool import PoolExhausted
+from app.services.recent_writes import RecentWrites
 
 
 def get_application():
     # enable CORS to tell our FastAPI to allow requests from external callers to these endpoints
-    app = FastAPI(title="NextUp")
+    app = FastAPI(title="NextUp", default_response_class=ORJSONResponse)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -15,11 +39,34 @@ def get_application():
         allow_methods=["*"],
         allow_headers=["*"]
     )
+    app.add_middleware(QueryTimingMiddleware)
+    app.state._recent_writes = RecentWrites(window=READ_YOUR_WRITES_SECONDS)
+    app.add_middleware(ReadYourWritesMiddleware, recent_writes=app.state._recent_writes)
+    if PROFILING_TOKEN or PROFILING_SAMPLE_RATES:
+        app.add_middleware(
+            ProfilingMiddleware,
+            token=PROFILING_TOKEN,
+            sample_rates=parse_sample_rates(PROFILING_SAMPLE_RATES),
+            interval=PROFILING_INTERVAL_MS / 1000,
+            directory=PROFILING_DIR,
+        )
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MINIMUM_SIZE,
+        gzip_level=COMPRESSION_GZIP_LEVEL,
+        brotli_quality=COMPRESSION_BROTLI_QUALITY,
+        cache_size=COMPRESSION_CACHE_SIZE,
+    )
+    # added last so it is the outermost and times the other middleware too, and counts compressed sizes
+    app.add_middleware(MetricsMiddleware)
+
+    app.add_exception_handler(PoolExhausted, service_busy_handler)
 
     app.add_event_handler("startup", tasks.start_app_handler(app))
     app.add_event_handler("shutdown", tasks.stop_app_handler(app))
 
     app.include_router(api_router, prefix="/api")
+    app.include_router(metrics_router)
 
     return app
 
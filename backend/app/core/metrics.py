@@ -0,0 +1,136 @@
+import abc
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+# seconds, from sub-millisecond statements up to the 30s statement timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """
+    A metric family with a fixed set of label names. Label values are passed positionally, in the same order,
+    to keep recording to a dict lookup and an addition.
+    """
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """
+        (name suffix, label names, label values, value) of every sample, in exposition order
+        """
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for suffix, names, values, value in self.samples():
+            yield f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        for labelvalues, value in sorted(self._values.items()):
+            yield "_total", self.labelnames, labelvalues, value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) - amount
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        self._values[labelvalues] = value
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        for labelvalues, value in sorted(self._values.items()):
+            yield "", self.labelnames, labelvalues, value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: [count per bucket (not cumulative), then the +Inf bucket], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        series = self._values.get(labelvalues)
+        if series is None:
+            series = self._values[labelvalues] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        names = self.labelnames + ("le",)
+        for labelvalues, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", names, labelvalues + (_format_value(upper_bound),), cumulative
+            yield "_sum", self.labelnames, labelvalues, total[0]
+            yield "_count", self.labelnames, labelvalues, cumulative
+
+
+MetricT = TypeVar("MetricT", bound=Metric)
+
+
+class Registry:
+    """
+    The metrics of this process. Every worker keeps its own, so each one has to be scraped.
+    """
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: MetricT) -> MetricT:
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
@@ -0,0 +1,92 @@
+import asyncio
+import collections
+import sys
+import threading
+from types import FrameType
+from typing import Any, Counter, Dict, Iterable, List, Optional
+
+
+def parse_sample_rates(items: Iterable[str]) -> Dict[str, float]:
+    """
+    `route-name=rate` items, e.g. "todos:search-todos=0.01", into a route name -> probability mapping
+    """
+    rates = {}
+    for item in items:
+        name, sep, rate = item.strip().rpartition("=")
+        if not sep or not name:
+            raise ValueError(f"Expected route-name=rate, got {item!r}.")
+        rates[name] = float(rate)
+        if not 0 <= rates[name] <= 1:
+            raise ValueError(f"The sample rate for {name} must be between 0 and 1.")
+    return rates
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    # ";" separates frames in the folded format
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+class TaskSampler:
+    """
+    A wall-clock sampling profiler for one asyncio task. A background thread wakes up every `interval`
+    seconds and records the task's stack, following the chain of awaited coroutines even while the task is
+    suspended - so time spent waiting on the database shows up under the await that is waiting for it,
+    ending in an `[await ...]` frame. The result is in the folded format read by flamegraph.pl and speedscope.
+    While the task holds the GIL the thread only gets to sample every sys.getswitchinterval() (5ms).
+    """
+    def __init__(self, task: "asyncio.Task", *, thread_id: int, interval: float) -> None:
+        self.task = task
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[str] = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="task-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            stack = self._sample()
+            if stack:
+                self.samples[";".join(stack)] += 1
+
+    def _sample(self) -> List[str]:
+        stack: List[str] = []
+        awaitable: Any = self.task.get_coro()
+        innermost: Optional[FrameType] = None
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None)
+            frame = frame or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                # a future, or a coroutine that has just finished
+                if not stack:
+                    break
+                stack.append(f"[await {type(awaitable).__name__}]")
+                return stack
+            stack.append(_label(frame))
+            innermost = frame
+            awaitable = (
+                getattr(awaitable, "cr_await", None)
+                or getattr(awaitable, "ag_await", None)
+                or getattr(awaitable, "gi_yieldfrom", None)
+            )
+        if innermost is None:
+            return stack
+        # nothing awaited, so the task is running - add the plain function calls below its innermost coroutine
+        current = sys._current_frames().get(self.thread_id)
+        calls: List[str] = []
+        while current is not None and current is not innermost:
+            calls.append(_label(current))
+            current = current.f_back
+        if current is innermost:
+            stack.extend(reversed(calls))
+        return stack
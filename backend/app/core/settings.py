@@ -0,0 +1,79 @@
+from starlette.config import Config
+from starlette.datastructures import CommaSeparatedStrings
+
+# app.core.config holds the secrets and is kept out of version control.
+# Operational tunables that have safe defaults live here and can be overridden from the same .env file.
+config = Config(".env")
+
+# verified-token cache used by get_user_from_token
+AUTH_TOKEN_CACHE_MAX_SIZE = config("AUTH_TOKEN_CACHE_MAX_SIZE", cast=int, default=10000)
+AUTH_TOKEN_CACHE_TTL_SECONDS = config("AUTH_TOKEN_CACHE_TTL_SECONDS", cast=float, default=60.0)
+
+# bcrypt runs off the event loop on this pool - "thread" or "process"
+PASSWORD_HASHING_EXECUTOR = config("PASSWORD_HASHING_EXECUTOR", cast=str, default="thread")
+PASSWORD_HASHING_WORKERS = config("PASSWORD_HASHING_WORKERS", cast=int, default=4)
+# hashes allowed to wait for a worker before new ones are rejected with a 503 (0 = unbounded)
+PASSWORD_HASHING_MAX_QUEUE = config("PASSWORD_HASHING_MAX_QUEUE", cast=int, default=200)
+
+# login throttling - token buckets of `CAPACITY` attempts refilled at `PER_MINUTE` attempts a minute.
+# The "IP" buckets are per user for requests with a known token, and per proxy unless uvicorn trusts its
+# X-Forwarded-For header (FORWARDED_ALLOW_IPS in docker-compose.yml)
+LOGIN_RATE_LIMIT_BACKEND = config("LOGIN_RATE_LIMIT_BACKEND", cast=str, default="memory")
+LOGIN_RATE_LIMIT_IP_CAPACITY = config("LOGIN_RATE_LIMIT_IP_CAPACITY", cast=int, default=20)
+LOGIN_RATE_LIMIT_IP_PER_MINUTE = config("LOGIN_RATE_LIMIT_IP_PER_MINUTE", cast=float, default=10.0)
+LOGIN_RATE_LIMIT_EMAIL_CAPACITY = config("LOGIN_RATE_LIMIT_EMAIL_CAPACITY", cast=int, default=5)
+LOGIN_RATE_LIMIT_EMAIL_PER_MINUTE = config("LOGIN_RATE_LIMIT_EMAIL_PER_MINUTE", cast=float, default=3.0)
+
+# database connection pool
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", cast=int, default=2)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=10)
+# seconds a request may wait for a free connection before getting a 503
+DB_POOL_ACQUIRE_TIMEOUT = config("DB_POOL_ACQUIRE_TIMEOUT", cast=float, default=5.0)
+# server-side statement_timeout in milliseconds (0 disables it)
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", cast=int, default=30000)
+# connections older than this many seconds are closed when released and reopened on demand (0 disables it)
+DB_CONNECTION_MAX_LIFETIME = config("DB_CONNECTION_MAX_LIFETIME", cast=float, default=1800.0)
+# startup connection attempts, waiting DB_CONNECT_BACKOFF seconds doubled after every failure
+DB_CONNECT_ATTEMPTS = config("DB_CONNECT_ATTEMPTS", cast=int, default=5)
+DB_CONNECT_BACKOFF = config("DB_CONNECT_BACKOFF", cast=float, default=0.5)
+
+# optional read-only replica - GET requests read from it unless the user wrote recently
+DATABASE_REPLICA_URL = config("DATABASE_REPLICA_URL", cast=str, default="")
+# seconds after a user's own write during which their reads stay on the primary
+READ_YOUR_WRITES_SECONDS = config("READ_YOUR_WRITES_SECONDS", cast=float, default=5.0)
+
+# prepared statements kept per connection by asyncpg, and compiled repository queries kept per process
+DB_STATEMENT_CACHE_SIZE = config("DB_STATEMENT_CACHE_SIZE", cast=int, default=256)
+DB_COMPILED_QUERY_CACHE_SIZE = config("DB_COMPILED_QUERY_CACHE_SIZE", cast=int, default=1024)
+
+# todo change events pushed over SSE / WebSocket from one LISTEN connection per process
+TODO_EVENTS_QUEUE_SIZE = config("TODO_EVENTS_QUEUE_SIZE", cast=int, default=100)
+TODO_EVENTS_HEARTBEAT_SECONDS = config("TODO_EVENTS_HEARTBEAT_SECONDS", cast=float, default=15.0)
+# tombstones of deleted todos are kept this many days by `python -m app.db.prune_tombstones` - clients that
+# haven't synced for longer get a 410 and start over
+TODO_TOMBSTONE_RETENTION_DAYS = config("TODO_TOMBSTONE_RETENTION_DAYS", cast=int, default=30)
+# seconds between health checks of the listener connection, doubled while reconnecting fails
+TODO_EVENTS_RECONNECT_INTERVAL = config("TODO_EVENTS_RECONNECT_INTERVAL", cast=float, default=1.0)
+
+# statements slower than this many milliseconds are logged, with their plan when DB_EXPLAIN_SLOW_QUERIES is on
+DB_SLOW_QUERY_MS = config("DB_SLOW_QUERY_MS", cast=float, default=200.0)
+DB_EXPLAIN_SLOW_QUERIES = config("DB_EXPLAIN_SLOW_QUERIES", cast=bool, default=True)
+
+# sampling profiler, only installed when a token or a sample rate is set - requests sending the token in an
+# X-Profile-Token header are profiled, as is the given share of requests to each route ("route-name=rate")
+PROFILING_TOKEN = config("PROFILING_TOKEN", cast=str, default="")
+PROFILING_SAMPLE_RATES = config("PROFILING_SAMPLE_RATES", cast=CommaSeparatedStrings, default="")
+PROFILING_INTERVAL_MS = config("PROFILING_INTERVAL_MS", cast=float, default=2.0)
+# folded stacks are written here, one file per profiled request
+PROFILING_DIR = config("PROFILING_DIR", cast=str, default="profiles")
+
+# /metrics is only served when a token is set, and only to scrapers sending it as a bearer token
+METRICS_TOKEN = config("METRICS_TOKEN", cast=str, default="")
+
+# response compression - bodies under COMPRESSION_MINIMUM_SIZE bytes fit in a packet or two and are sent as they are.
+# Levels are picked for dynamic responses, see benchmarks/bench_compression.py
+COMPRESSION_MINIMUM_SIZE = config("COMPRESSION_MINIMUM_SIZE", cast=int, default=1024)
+COMPRESSION_GZIP_LEVEL = config("COMPRESSION_GZIP_LEVEL", cast=int, default=6)
+COMPRESSION_BROTLI_QUALITY = config("COMPRESSION_BROTLI_QUALITY", cast=int, default=4)
+# compressed bodies of responses with an ETag, kept per process so unchanged pages aren't compressed again
+COMPRESSION_CACHE_SIZE = config("COMPRESSION_CACHE_SIZE", cast=int, default=256)
@@ -1,6 +1,7 @@
 from typing import Callable
 from fastapi import FastAPI
 from app.db.tasks import connect_to_db, close_db_connection
+from app.services import auth_service
 
 def start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
@@ -10,4 +11,5 @@ def start_app_handler(app: FastAPI) -> Callable:
 def stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
         await close_db_connection(app)
+        auth_service.hashing_pool.shutdown()
     return stop_app
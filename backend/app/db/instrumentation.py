@@ -0,0 +1,203 @@
+import asyncio
+import importlib
+import json
+import logging
+import pkgutil
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict, List, NamedTuple, Optional, Pattern, Set, Tuple, Union
+
+from sqlalchemy.sql import ClauseElement
+
+from app.core.metrics import REGISTRY, Counter, Histogram
+from app.core.settings import DB_COMPILED_QUERY_CACHE_SIZE, DB_EXPLAIN_SLOW_QUERIES, DB_SLOW_QUERY_MS
+from app.db.statements import PreparedDatabase, compile_query
+
+logger = logging.getLogger("app.db.queries")
+
+# plans of slow statements are looked up in the background, at most this many at a time
+MAX_CONCURRENT_EXPLAINS = 2
+TEMPLATE_FIELD = re.compile(r"\{\w+\}")
+
+QUERY_DURATION = REGISTRY.register(
+    Histogram("nextup_db_query_duration_seconds", "Time spent executing each SQL statement.", ("statement",))
+)
+QUERY_ROWS = REGISTRY.register(
+    Histogram(
+        "nextup_db_query_rows",
+        "Rows returned by each SQL statement.",
+        ("statement",),
+        buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000),
+    )
+)
+QUERIES_PER_REQUEST = REGISTRY.register(
+    Histogram(
+        "nextup_db_queries_per_request", "SQL statements issued per HTTP request.", buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21)
+    )
+)
+SLOW_QUERIES = REGISTRY.register(
+    Counter("nextup_db_slow_queries", f"SQL statements slower than {DB_SLOW_QUERY_MS:g}ms.", ("statement",))
+)
+
+
+class QueryStat(NamedTuple):
+    name: str
+    seconds: float
+    rows: int
+
+
+class QueryLog:
+    """
+    The statements issued while handling one request
+    """
+    __slots__ = ("statements",)
+
+    def __init__(self) -> None:
+        self.statements: List[QueryStat] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(statement.seconds for statement in self.statements)
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"'
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "queries": self.count,
+            "db_ms": round(self.seconds * 1000, 2),
+            "statements": [
+                {"name": name, "ms": round(seconds * 1000, 2), "rows": rows} for name, seconds, rows in self.statements
+            ],
+        }
+
+
+# set for the duration of each HTTP request by QueryTimingMiddleware
+QUERY_LOG: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+
+
+@lru_cache(maxsize=1)
+def _known_statements() -> Tuple[Dict[str, str], List[Tuple[Pattern, str]]]:
+    # imported here, the repositories import half the app and nothing has to be named until the first query
+    from app.db import repositories
+
+    names: Dict[str, str] = {}
+    templates: List[Tuple[Pattern, str]] = []
+    for module_info in pkgutil.iter_modules(repositories.__path__):
+        module = importlib.import_module(f"{repositories.__name__}.{module_info.name}")
+        for attr, value in vars(module).items():
+            if not attr.endswith("_QUERY") or not isinstance(value, str):
+                continue
+            names[value] = attr
+            if TEMPLATE_FIELD.search(value):
+                # queries completed with str.format() at call time, e.g. the generated VALUES list of a batch
+                pattern = ".*?".join(re.escape(part) for part in TEMPLATE_FIELD.split(value))
+                templates.append((re.compile(pattern, re.DOTALL), attr))
+    return names, templates
+
+
+@lru_cache(maxsize=DB_COMPILED_QUERY_CACHE_SIZE)
+def statement_name(query: str) -> str:
+    """
+    The name of the repository `*_QUERY` constant a query came from, or "unnamed"
+    """
+    names, templates = _known_statements()
+    if query in names:
+        return names[query]
+    for pattern, name in templates:
+        if pattern.fullmatch(query):
+            return name
+    return "unnamed"
+
+
+class InstrumentedDatabase(PreparedDatabase):
+    """
+    A `PreparedDatabase` that times every statement. Each one is added to the request's QueryLog and the
+    nextup_db_* metrics, and statements slower than DB_SLOW_QUERY_MS are logged along with their plan.
+    """
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._explains: Set[asyncio.Future] = set()
+
+    async def fetch_all(self, query: Union[ClauseElement, str], values: dict = None) -> List[Any]:
+        started = time.perf_counter()
+        records = await super().fetch_all(query, values)
+        self._record(query, values, time.perf_counter() - started, len(records))
+        return records
+
+    async def fetch_one(self, query: Union[ClauseElement, str], values: dict = None) -> Optional[Any]:
+        started = time.perf_counter()
+        record = await super().fetch_one(query, values)
+        self._record(query, values, time.perf_counter() - started, int(record is not None))
+        return record
+
+    async def fetch_val(self, query: Union[ClauseElement, str], values: dict = None, column: Any = 0) -> Any:
+        # execute() goes through here too
+        started = time.perf_counter()
+        value = await super().fetch_val(query, values, column=column)
+        self._record(query, values, time.perf_counter() - started, int(value is not None))
+        return value
+
+    async def iterate(self, query: Union[ClauseElement, str], values: dict = None) -> AsyncGenerator[Any, None]:
+        # only the time spent waiting on the cursor counts, not the time the caller spends on each row
+        seconds = 0.0
+        rows = 0
+        records = super().iterate(query, values).__aiter__()
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    record = await records.__anext__()
+                except StopAsyncIteration:
+                    seconds += time.perf_counter() - started
+                    break
+                seconds += time.perf_counter() - started
+                rows += 1
+                yield record
+        finally:
+            await records.aclose()
+            self._record(query, values, seconds, rows)
+
+    def _record(self, query: Union[ClauseElement, str], values: Optional[dict], seconds: float, rows: int) -> None:
+        name = statement_name(query) if isinstance(query, str) else "sqlalchemy"
+        QUERY_DURATION.observe(seconds, name)
+        QUERY_ROWS.observe(rows, name)
+        query_log = QUERY_LOG.get()
+        if query_log is not None:
+            query_log.statements.append(QueryStat(name, seconds, rows))
+        if DB_SLOW_QUERY_MS and seconds * 1000 >= DB_SLOW_QUERY_MS:
+            SLOW_QUERIES.inc(name)
+            if DB_EXPLAIN_SLOW_QUERIES and isinstance(query, str) and len(self._explains) < MAX_CONCURRENT_EXPLAINS:
+                explain = asyncio.ensure_future(self._log_slow_query(name, query, values, seconds, rows))
+                self._explains.add(explain)
+                explain.add_done_callback(self._explains.discard)
+            else:
+                _log_slow_query(name, seconds, rows, plan=None)
+
+    async def _log_slow_query(self, name: str, query: str, values: Optional[dict], seconds: float, rows: int) -> None:
+        compiled = compile_query(query)
+        plan = None
+        # straight from the pool, so the plan never lands inside the request's connection or transaction
+        pool = self._backend._pool
+        try:
+            connection = await pool.acquire()
+            try:
+                # plain EXPLAIN only plans the statement, writes are not executed again
+                plan = json.loads(await connection.fetchval(f"EXPLAIN (FORMAT JSON) {compiled.sql}", *compiled.args(values)))
+            finally:
+                await pool.release(connection)
+        except Exception as e:
+            logger.debug("Could not explain %s: %s", name, e)
+        _log_slow_query(name, seconds, rows, plan=plan)
+
+
+def _log_slow_query(name: str, seconds: float, rows: int, *, plan: Optional[Any]) -> None:
+    logger.warning(
+        json.dumps({"event": "slow_query", "statement": name, "ms": round(seconds * 1000, 2), "rows": rows, "plan": plan})
+    )
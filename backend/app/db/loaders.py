@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+# loader names shared by the repositories
+TODOS_BY_ID = "todos:by-id"
+PROFILES_BY_USER_ID = "profiles:by-user-id"
+POPULATED_USERS_BY_ID = "users:populated-by-id"
+
+BatchLoadFn = Callable[[List[Hashable]], Awaitable[Mapping[Hashable, Any]]]
+
+
+class DataLoader:
+    """
+    Coalesces every `load(key)` made during the same event-loop tick into one call of
+    `batch_load_fn(keys)`, which must return a mapping of key -> value (missing keys resolve to None).
+    Results are memoized for the lifetime of the loader, i.e. the rest of the request.
+    """
+    def __init__(self, batch_load_fn: BatchLoadFn) -> None:
+        self.batch_load_fn = batch_load_fn
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Tuple[Hashable, asyncio.Future]] = []
+        self.batches = 0
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append((key, future))
+        # the first key queued this tick schedules the dispatch, later ones just ride along
+        if len(self._queue) == 1:
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(value)
+        self._cache[key] = future
+
+    def clear(self, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def _dispatch(self) -> None:
+        batch, self._queue = self._queue, []
+        asyncio.ensure_future(self._load_batch(batch))
+
+    async def _load_batch(self, batch: List[Tuple[Hashable, asyncio.Future]]) -> None:
+        self.batches += 1
+        try:
+            results = await self.batch_load_fn([key for key, _ in batch])
+        except Exception as e:
+            for key, future in batch:
+                # don't memoize failures, a later load may retry
+                if self._cache.get(key) is future:
+                    del self._cache[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch:
+            if not future.done():
+                future.set_result(results.get(key))
+
+
+class LoaderRegistry:
+    """
+    One DataLoader per name, shared by every repository created for the same request
+    """
+    def __init__(self) -> None:
+        self._loaders: Dict[str, DataLoader] = {}
+
+    def get(self, name: str, batch_load_fn: BatchLoadFn) -> DataLoader:
+        loader = self._loaders.get(name)
+        if loader is None:
+            loader = self._loaders[name] = DataLoader(batch_load_fn)
+        return loader
+
+    def clear(self, name: str, key: Optional[Hashable] = None) -> None:
+        loader = self._loaders.get(name)
+        if loader is not None:
+            loader.clear(key)
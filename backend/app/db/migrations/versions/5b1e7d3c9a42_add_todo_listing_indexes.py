@@ -0,0 +1,25 @@
+"""add_todo_listing_indexes
+
+Revision ID: 5b1e7d3c9a42
+Revises: 2ddfb6d64961
+Create Date: 2026-10-17 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = "5b1e7d3c9a42"
+down_revision = "2ddfb6d64961"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # keyset pagination walks todos in (owner, id) order
+    op.create_index("ix_todos_owner_id", "todos", ["owner", "id"])
+    op.create_index("ix_todos_owner_completed_id", "todos", ["owner", "completed", "id"])
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_owner_completed_id", table_name="todos")
+    op.drop_index("ix_todos_owner_id", table_name="todos")
@@ -0,0 +1,94 @@
+"""add_todo_sync_tracking
+
+Revision ID: 8c2f4e6a1b37
+Revises: 5b1e7d3c9a42
+Create Date: 2026-10-17 14:03:27.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = "8c2f4e6a1b37"
+down_revision = "5b1e7d3c9a42"
+branch_labels = None
+depends_on = None
+
+def create_changed_txid_trigger() -> None:
+    # the id of the transaction that last wrote a row - unlike updated_at (the transaction's *start* time)
+    # it lets delta sync tell which writes may still be uncommitted
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_changed_txid_column()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            NEW.changed_txid = txid_current();
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_todos_changed_txid
+            BEFORE UPDATE
+            ON todos
+            FOR EACH ROW
+        EXECUTE PROCEDURE update_changed_txid_column();
+        """
+    )
+
+def create_todo_tombstones_table() -> None:
+    # one row per deleted todo, so clients syncing changes learn about deletions too
+    op.create_table(
+        "todo_tombstones",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("owner", sa.Integer, nullable=True),
+        sa.Column("changed_txid", sa.BigInteger, nullable=False, server_default=sa.text("txid_current()")),
+        sa.Column("deleted_at", sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_todo_tombstones_owner_changed_txid", "todo_tombstones", ["owner", "changed_txid"])
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION record_todo_tombstone()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            INSERT INTO todo_tombstones (id, owner)
+            VALUES (OLD.id, OLD.owner)
+            ON CONFLICT (id) DO NOTHING;
+            RETURN OLD;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_todos_tombstone
+            AFTER DELETE
+            ON todos
+            FOR EACH ROW
+        EXECUTE PROCEDURE record_todo_tombstone();
+        """
+    )
+
+def upgrade() -> None:
+    op.add_column(
+        "todos",
+        sa.Column("changed_txid", sa.BigInteger, nullable=False, server_default=sa.text("txid_current()")),
+    )
+    op.create_index("ix_todos_owner_changed_txid", "todos", ["owner", "changed_txid"])
+    create_changed_txid_trigger()
+    create_todo_tombstones_table()
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER record_todos_tombstone ON todos")
+    op.execute("DROP FUNCTION record_todo_tombstone")
+    op.drop_index("ix_todo_tombstones_owner_changed_txid", table_name="todo_tombstones")
+    op.drop_table("todo_tombstones")
+    op.execute("DROP TRIGGER update_todos_changed_txid ON todos")
+    op.execute("DROP FUNCTION update_changed_txid_column")
+    op.drop_index("ix_todos_owner_changed_txid", table_name="todos")
+    op.drop_column("todos", "changed_txid")
@@ -0,0 +1,25 @@
+"""add_todo_changes_keyset_index
+
+Revision ID: a3c5e8f1b209
+Revises: f1b8c6d2e4a7
+Create Date: 2026-10-17 23:41:07.520316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = "a3c5e8f1b209"
+down_revision = "f1b8c6d2e4a7"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # the sync pages through a user's changes in (changed_txid, id) order
+    op.create_index("ix_todos_owner_changed_txid_id", "todos", ["owner", "changed_txid", "id"])
+    op.drop_index("ix_todos_owner_changed_txid", table_name="todos")
+
+def downgrade() -> None:
+    op.create_index("ix_todos_owner_changed_txid", "todos", ["owner", "changed_txid"])
+    op.drop_index("ix_todos_owner_changed_txid_id", table_name="todos")
@@ -0,0 +1,33 @@
+"""add_todo_tombstone_retention
+
+Revision ID: b6d2f9a4c183
+Revises: a3c5e8f1b209
+Create Date: 2026-10-17 09:12:44.183502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = "b6d2f9a4c183"
+down_revision = "a3c5e8f1b209"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # tombstones are pruned by age
+    op.create_index("ix_todo_tombstones_deleted_at", "todo_tombstones", ["deleted_at"])
+    # a single row holding the newest changed_txid pruned so far - a sync starting at or below it may have
+    # missed deletions and has to start over
+    op.create_table(
+        "todo_tombstones_pruned",
+        sa.Column("id", sa.Boolean, primary_key=True, server_default=sa.true()),
+        sa.Column("through_txid", sa.BigInteger, nullable=False, server_default="0"),
+        sa.CheckConstraint("id", name="todo_tombstones_pruned_single_row"),
+    )
+    op.execute("INSERT INTO todo_tombstones_pruned DEFAULT VALUES")
+
+def downgrade() -> None:
+    op.drop_table("todo_tombstones_pruned")
+    op.drop_index("ix_todo_tombstones_deleted_at", table_name="todo_tombstones")
@@ -0,0 +1,58 @@
+"""add_todo_change_notifications
+
+Revision ID: c4d9a7e2f610
+Revises: 8c2f4e6a1b37
+Create Date: 2026-10-17 16:41:09.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = "c4d9a7e2f610"
+down_revision = "8c2f4e6a1b37"
+branch_labels = None
+depends_on = None
+
+def create_notify_todo_change_trigger() -> None:
+    # NOTIFY is delivered on commit, so listeners never hear about rolled back writes.
+    # The payload stays tiny (well under NOTIFY's 8000 byte limit) - clients fetch the row itself if they need it
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_todo_change()
+            RETURNS TRIGGER AS
+        $$
+        DECLARE
+            todo RECORD;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                todo := OLD;
+            ELSE
+                todo := NEW;
+            END IF;
+            PERFORM pg_notify(
+                'todo_changes',
+                json_build_object('op', lower(TG_OP), 'id', todo.id, 'owner', todo.owner)::text
+            );
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER notify_todos_change
+            AFTER INSERT OR UPDATE OR DELETE
+            ON todos
+            FOR EACH ROW
+        EXECUTE PROCEDURE notify_todo_change();
+        """
+    )
+
+def upgrade() -> None:
+    create_notify_todo_change_trigger()
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER notify_todos_change ON todos")
+    op.execute("DROP FUNCTION notify_todo_change")
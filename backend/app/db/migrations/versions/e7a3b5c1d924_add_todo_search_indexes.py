@@ -0,0 +1,62 @@
+"""add_todo_search_indexes
+
+Revision ID: e7a3b5c1d924
+Revises: c4d9a7e2f610
+Create Date: 2026-10-17 18:22:51.730466
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# revision identifiers, used by Alembic
+revision = "e7a3b5c1d924"
+down_revision = "c4d9a7e2f610"
+branch_labels = None
+depends_on = None
+
+def create_trigram_index() -> None:
+    # pg_trgm speeds up substring / prefix matches, but needs the contrib package and the privilege to create
+    # extensions - without it the search still works, those matches just fall back to a scan of the owner's todos
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN insufficient_privilege OR feature_not_supported OR undefined_file THEN
+            RAISE NOTICE 'pg_trgm is not available, skipping the trigram index on todos.task';
+        END
+        $$;
+        """
+    )
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX ix_todos_task_trgm ON todos USING gin (task gin_trgm_ops);
+            END IF;
+        END
+        $$;
+        """
+    )
+
+def upgrade() -> None:
+    # kept in sync by postgres itself on every insert and update of task
+    op.add_column(
+        "todos",
+        sa.Column(
+            "task_tsv",
+            TSVECTOR,
+            sa.Computed("to_tsvector('english', task)", persisted=True),
+            nullable=False,
+        ),
+    )
+    op.create_index("ix_todos_task_tsv", "todos", ["task_tsv"], postgresql_using="gin")
+    create_trigram_index()
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_todos_task_trgm")
+    op.drop_index("ix_todos_task_tsv", table_name="todos")
+    op.drop_column("todos", "task_tsv")
@@ -0,0 +1,129 @@
+"""add_todo_counters
+
+Revision ID: f1b8c6d2e4a7
+Revises: e7a3b5c1d924
+Create Date: 2026-10-17 20:05:38.119624
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = "f1b8c6d2e4a7"
+down_revision = "e7a3b5c1d924"
+branch_labels = None
+depends_on = None
+
+# counts the todos that exist before the triggers do, like TodosRepository.reconcile_todo_counters
+BACKFILL_TODO_COUNTERS = """
+    INSERT INTO todo_counters (owner, total, completed)
+    SELECT owner, count(*), count(*) FILTER (WHERE completed)
+    FROM todos
+    WHERE owner IS NOT NULL
+    GROUP BY owner;
+"""
+
+def create_todo_counters_table() -> None:
+    op.create_table(
+        "todo_counters",
+        sa.Column("owner", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("total", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("completed", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+def create_todo_counters_triggers() -> None:
+    # statement-level triggers see every row a statement touched through its transition tables,
+    # so a batch insert/update/delete changes each owner's counters once rather than once per row
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_todo_counters()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO todo_counters (owner, total, completed)
+                SELECT owner, count(*), count(*) FILTER (WHERE completed)
+                FROM new_todos
+                WHERE owner IS NOT NULL
+                GROUP BY owner
+                ON CONFLICT (owner) DO UPDATE
+                SET total      = todo_counters.total + EXCLUDED.total,
+                    completed  = todo_counters.completed + EXCLUDED.completed,
+                    updated_at = now();
+            ELSIF TG_OP = 'UPDATE' THEN
+                -- only owners whose counts actually moved, e.g. not for edits to the task text
+                INSERT INTO todo_counters (owner, total, completed)
+                SELECT owner, sum(total), sum(completed)
+                FROM (
+                    SELECT owner, 1 AS total, completed::int AS completed FROM new_todos
+                    UNION ALL
+                    SELECT owner, -1, -completed::int FROM old_todos
+                ) AS deltas
+                WHERE owner IS NOT NULL
+                GROUP BY owner
+                HAVING sum(total) <> 0 OR sum(completed) <> 0
+                ON CONFLICT (owner) DO UPDATE
+                SET total      = todo_counters.total + EXCLUDED.total,
+                    completed  = todo_counters.completed + EXCLUDED.completed,
+                    updated_at = now();
+            ELSE
+                -- a plain UPDATE: when the owner itself is being deleted its counters row may already be gone
+                UPDATE todo_counters c
+                SET total      = c.total - deleted.total,
+                    completed  = c.completed - deleted.completed,
+                    updated_at = now()
+                FROM (
+                    SELECT owner, count(*) AS total, count(*) FILTER (WHERE completed) AS completed
+                    FROM old_todos
+                    GROUP BY owner
+                ) AS deleted
+                WHERE c.owner = deleted.owner;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_todo_counters_on_insert
+            AFTER INSERT
+            ON todos
+            REFERENCING NEW TABLE AS new_todos
+            FOR EACH STATEMENT
+        EXECUTE PROCEDURE update_todo_counters();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_todo_counters_on_update
+            AFTER UPDATE
+            ON todos
+            REFERENCING OLD TABLE AS old_todos NEW TABLE AS new_todos
+            FOR EACH STATEMENT
+        EXECUTE PROCEDURE update_todo_counters();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_todo_counters_on_delete
+            AFTER DELETE
+            ON todos
+            REFERENCING OLD TABLE AS old_todos
+            FOR EACH STATEMENT
+        EXECUTE PROCEDURE update_todo_counters();
+        """
+    )
+
+def upgrade() -> None:
+    create_todo_counters_table()
+    create_todo_counters_triggers()
+    op.execute(BACKFILL_TODO_COUNTERS)
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER update_todo_counters_on_{event} ON todos")
+    op.execute("DROP FUNCTION update_todo_counters")
+    op.drop_table("todo_counters")
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# channel the notify_todos_change trigger publishes on
+TODO_CHANGES_CHANNEL = "todo_changes"
+# sent in place of events a subscriber missed, telling it to catch up through /todos/changes/
+RESYNC_EVENT = {"op": "resync"}
+MAX_RECONNECT_INTERVAL = 30.0
+# seconds stop() waits for the listener task before shutdown goes on without it
+STOP_TIMEOUT = 5.0
+
+
+class Subscription:
+    """
+    One client's bounded queue of todo change events
+    """
+    __slots__ = ("user_id", "queue", "overflowed")
+
+    def __init__(self, user_id: int, max_queue: int) -> None:
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def push(self, event: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # a slow consumer never holds up the listener - its backlog is replaced by a single resync
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+    async def get(self) -> Dict[str, Any]:
+        event = await self.queue.get()
+        if event is RESYNC_EVENT:
+            self.overflowed = False
+        return event
+
+
+class TodoChangeListener:
+    """
+    Holds a single LISTEN connection per process and fans each todo change out to the
+    subscriptions of the todo's owner, instead of every client polling the database.
+    """
+    def __init__(self, dsn: str, *, max_queue: int, reconnect_interval: float) -> None:
+        self.dsn = dsn
+        self.max_queue = max_queue
+        self.reconnect_interval = reconnect_interval
+        self.connected = False
+        self.overflows = 0
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        self._stopping = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            # the flag ends the loop even when the cancellation is swallowed, as asyncpg.connect's
+            # wait_for can do before Python 3.10 (bpo-42130)
+            self._stopping.set()
+            self._task.cancel()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), STOP_TIMEOUT)
+            except asyncio.CancelledError:
+                pass
+            except asyncio.TimeoutError:
+                logger.warning("The todo change listener did not stop within %ss, leaving it behind", STOP_TIMEOUT)
+            self._task = None
+
+    @contextmanager
+    def subscribe(self, user_id: int) -> Iterator[Subscription]:
+        subscription = Subscription(user_id, self.max_queue)
+        self._subscriptions[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscriptions[user_id]
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "subscriptions": sum(len(subscribers) for subscribers in self._subscriptions.values()),
+            "overflows": self.overflows,
+        }
+
+    def publish(self, event: Dict[str, Any], *, user_id: Optional[int] = None) -> None:
+        """
+        Queue `event` for the user's subscriptions, or for everyone when `user_id` is None
+        """
+        if user_id is None:
+            subscribers = [s for subscribers in self._subscriptions.values() for s in subscribers]
+        else:
+            subscribers = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscribers:
+            overflowed = subscription.overflowed
+            subscription.push(event)
+            if subscription.overflowed and not overflowed:
+                self.overflows += 1
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed %s notification: %r", channel, payload)
+            return
+        self.publish(event, user_id=event.get("owner"))
+
+    async def _stopped_within(self, seconds: float) -> bool:
+        """
+        Sleep for up to `seconds`, returning True as soon as stop() is called
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _run(self) -> None:
+        interval = self.reconnect_interval
+        lost = False
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(TODO_CHANGES_CHANNEL, self._on_notification)
+                self.connected = True
+                interval = self.reconnect_interval
+                if lost:
+                    # changes made while nobody was listening were never delivered, catch up on them now
+                    lost = False
+                    self.publish(RESYNC_EVENT)
+                while not connection.is_closed() and not await self._stopped_within(self.reconnect_interval):
+                    # a round trip notices a dead server that hasn't closed the socket yet
+                    await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("--- TODO CHANGE LISTENER ERROR ---")
+                logger.warning(e)
+            finally:
+                if self.connected and not self._stopping.is_set():
+                    # events may already be missing, and the reconnect sends another resync for the rest
+                    lost = True
+                    self.publish(RESYNC_EVENT)
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            if await self._stopped_within(interval):
+                return
+            interval = min(interval * 2, MAX_RECONNECT_INTERVAL)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+import weakref
+from typing import Any, Dict
+
+
+class PoolExhausted(Exception):
+    """
+    No connection became free within the pool's acquire timeout - answered with a 503 by the app
+    """
+
+
+class PoolMetrics:
+    def __init__(self) -> None:
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.saturation_events = 0
+        self.recycled = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.total_acquire_wait = 0.0
+        self.max_acquire_wait = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "acquires": self.acquires,
+            "acquire_timeouts": self.acquire_timeouts,
+            "saturation_events": self.saturation_events,
+            "recycled_connections": self.recycled,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "avg_acquire_wait_seconds": self.total_acquire_wait / self.acquires if self.acquires else 0.0,
+            "max_acquire_wait_seconds": self.max_acquire_wait,
+        }
+
+
+class InstrumentedPool:
+    """
+    Wraps the asyncpg pool that `databases` creates to add an acquire timeout, a maximum
+    connection lifetime and pool metrics. Everything else is delegated to the real pool.
+    """
+    def __init__(self, *, min_size: int, max_size: int, acquire_timeout: float, max_lifetime: float) -> None:
+        self._pool: Any = None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.metrics = PoolMetrics()
+        self._opened_at: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    def attach(self, pool: Any) -> "InstrumentedPool":
+        self._pool = pool
+        return self
+
+    async def on_connect(self, connection: Any) -> None:
+        """
+        asyncpg `init` callback - runs once for every new physical connection
+        """
+        self._opened_at[connection] = time.monotonic()
+
+    async def acquire(self) -> Any:
+        if self.metrics.in_use >= self.max_size:
+            # every connection is checked out, this request will have to queue
+            self.metrics.saturation_events += 1
+        started = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=self.acquire_timeout or None)
+        except asyncio.TimeoutError:
+            self.metrics.acquire_timeouts += 1
+            raise PoolExhausted(f"no connection was free within {self.acquire_timeout}s") from None
+        wait = time.perf_counter() - started
+        self.metrics.acquires += 1
+        self.metrics.total_acquire_wait += wait
+        self.metrics.max_acquire_wait = max(self.metrics.max_acquire_wait, wait)
+        self.metrics.in_use += 1
+        self.metrics.max_in_use = max(self.metrics.max_in_use, self.metrics.in_use)
+        return connection
+
+    async def release(self, connection: Any) -> None:
+        self.metrics.in_use -= 1
+        raw = self._raw(connection)
+        if self.max_lifetime and time.monotonic() - self._opened_at.get(raw, time.monotonic()) > self.max_lifetime:
+            # a closed connection is dropped by the pool and transparently reopened on the next acquire
+            self.metrics.recycled += 1
+            self._opened_at.pop(raw, None)
+            await raw.close()
+        await self._pool.release(connection)
+
+    def stats(self) -> Dict[str, float]:
+        return {"min_size": self.min_size, "max_size": self.max_size, **self.metrics.as_dict()}
+
+    @staticmethod
+    def _raw(connection: Any) -> Any:
+        # asyncpg hands out proxies, the lifetime belongs to the underlying connection
+        return getattr(connection, "_con", None) or connection
@@ -0,0 +1,36 @@
+"""
+Delete the tombstones of todos deleted more than TODO_TOMBSTONE_RETENTION_DAYS ago.
+
+    python -m app.db.prune_tombstones
+
+Tombstones tell syncing clients which todos were deleted, so without this the table grows forever.
+Run it daily, e.g. from cron. A client whose last sync is older than the pruned tombstones gets a
+410 from /todos/changes/ and has to start over with a full sync.
+"""
+import asyncio
+import logging
+import os
+
+from databases import Database
+
+from app.core.config import DATABASE_URL
+from app.core.settings import TODO_TOMBSTONE_RETENTION_DAYS
+from app.db.repositories.todos import TodosRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def prune() -> int:
+    db_url = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
+    database = Database(str(db_url))
+    await database.connect()
+    try:
+        return await TodosRepository(database).prune_todo_tombstones(retention_days=TODO_TOMBSTONE_RETENTION_DAYS)
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    pruned = asyncio.run(prune())
+    logger.info("Pruned %s todo tombstone(s) older than %s day(s)", pruned, TODO_TOMBSTONE_RETENTION_DAYS)
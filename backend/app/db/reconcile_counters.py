@@ -0,0 +1,34 @@
+"""
+Recompute every user's todo_counters from the todos table.
+
+    python -m app.db.reconcile_counters
+
+The update_todo_counters triggers keep the counters current on their own. This is for repairing them
+after manual data fixes or restores, and is safe to run at any time - writes to todos wait while it runs.
+"""
+import asyncio
+import logging
+import os
+
+from databases import Database
+
+from app.core.config import DATABASE_URL
+from app.db.repositories.todos import TodosRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile() -> int:
+    db_url = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
+    database = Database(str(db_url))
+    await database.connect()
+    try:
+        return await TodosRepository(database).reconcile_todo_counters()
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    corrected = asyncio.run(reconcile())
+    logger.info("Corrected the todo counters of %s user(s)", corrected)
@@ -1,5 +1,13 @@
+from typing import Optional
 from databases import Database
+from app.db.loaders import LoaderRegistry
 
 class BaseRepository:
-    def __init__(self, db: Database) -> None:
+    def __init__(
+        self, db: Database, loaders: Optional[LoaderRegistry] = None, read_db: Optional[Database] = None
+    ) -> None:
         self.db = db
+        # read-only queries go through read_db, which is a replica for GET requests when one is configured
+        self.read_db = read_db if read_db is not None else db
+        # request-scoped when built through get_repository, otherwise private to this repository
+        self.loaders = loaders if loaders is not None else LoaderRegistry()
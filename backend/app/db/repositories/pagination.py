@@ -0,0 +1,33 @@
+import base64
+from typing import Any, Mapping, Sequence, Tuple
+
+
+def encode_cursor(*values: int) -> str:
+    """
+    Pack the keyset of the last row on a page into an opaque, url-safe cursor
+    """
+    raw = ":".join(str(value) for value in values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *, length: int) -> Tuple[int, ...]:
+    """
+    Unpack a cursor created by `encode_cursor`. Raises ValueError if it has been tampered with.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        values = tuple(int(value) for value in raw.split(":"))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    if len(values) != length:
+        raise ValueError("Malformed cursor")
+    return values
+
+
+def page_version(records: Sequence[Mapping]) -> Tuple[Any, ...]:
+    """
+    Values that change whenever a page of rows does: its size, newest updated_at and the ids at either end
+    """
+    if not records:
+        return (0,)
+    return len(records), max(record["updated_at"] for record in records), records[0]["id"], records[-1]["id"]
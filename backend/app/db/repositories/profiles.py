@@ -1,4 +1,9 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import HTTPException, status
+from app.db.loaders import PROFILES_BY_USER_ID, POPULATED_USERS_BY_ID
 from app.db.repositories.base import BaseRepository
+from app.models.core import from_trusted_record
 from app.models.profile import ProfileCreate, ProfileUpdate, ProfileInDB
 from app.models.user import UserInDB
 
@@ -13,6 +18,12 @@ GET_PROFILE_BY_USER_ID_QUERY = """
     WHERE user_id = :user_id;
 """
 
+GET_PROFILES_BY_USER_IDS_QUERY = """
+    SELECT id, full_name, phone_number, bio, image, user_id, created_at, updated_at
+    FROM profiles
+    WHERE user_id = ANY(:user_ids);
+"""
+
 GET_PROFILE_BY_USERNAME_QUERY = """
     SELECT p.id,
            u.email AS email,
@@ -30,6 +41,7 @@ GET_PROFILE_BY_USERNAME_QUERY = """
     WHERE user_id = (SELECT id FROM users WHERE username = :username);
 """
 
+# with :expected_updated_at the profile is only written if it hasn't changed since (optimistic concurrency)
 UPDATE_PROFILE_QUERY = """
     UPDATE profiles
     SET full_name    = :full_name,
@@ -37,6 +49,8 @@ UPDATE_PROFILE_QUERY = """
         bio          = :bio,
         image        = :image
     WHERE user_id = :user_id
+      AND (CAST(:expected_updated_at AS timestamptz) IS NULL
+           OR updated_at = CAST(:expected_updated_at AS timestamptz))
     RETURNING id, full_name, phone_number, bio, image, user_id, created_at, updated_at;
 """
 
@@ -47,21 +61,44 @@ class ProfilesRepository(BaseRepository):
         return created_profile
 
     async def get_profile_by_user_id(self, *, user_id: int) -> ProfileInDB:
-        profile_record = await self.db.fetch_one(query=GET_PROFILE_BY_USER_ID_QUERY, values={"user_id": user_id})
-        if not profile_record:
-            return None
-        return ProfileInDB(**profile_record)
+        # batched with any other profile lookups made in the same tick of this request
+        return await self.loaders.get(PROFILES_BY_USER_ID, self._fetch_profiles_by_user_ids).load(user_id)
+
+    async def _fetch_profiles_by_user_ids(self, user_ids: List[int]) -> Dict[int, ProfileInDB]:
+        profile_records = await self.read_db.fetch_all(
+            query=GET_PROFILES_BY_USER_IDS_QUERY, values={"user_ids": list(user_ids)}
+        )
+        return {record["user_id"]: from_trusted_record(ProfileInDB, record) for record in profile_records}
 
     async def get_profile_by_username(self, *, username: str) -> ProfileInDB:
-        profile_record = await self.db.fetch_one(query=GET_PROFILE_BY_USERNAME_QUERY, values={"username": username})
+        profile_record = await self.read_db.fetch_one(
+            query=GET_PROFILE_BY_USERNAME_QUERY, values={"username": username}
+        )
         if profile_record:
-            return ProfileInDB(**profile_record)
+            return from_trusted_record(ProfileInDB, profile_record)
             
-    async def update_profile(self, *, profile_update: ProfileUpdate, requesting_user: UserInDB) -> ProfileInDB:
+    async def update_profile(
+        self,
+        *,
+        profile_update: ProfileUpdate,
+        requesting_user: UserInDB,
+        expected_updated_at: Optional[datetime] = None,
+    ) -> ProfileInDB:
         profile = await self.get_profile_by_user_id(user_id=requesting_user.id)
         update_params = profile.copy(update=profile_update.dict(exclude_unset=True))
         updated_profile = await self.db.fetch_one(
             query=UPDATE_PROFILE_QUERY,
-            values=update_params.dict(exclude={"id", "created_at", "updated_at", "username", "email"}),
+            values={
+                **update_params.dict(exclude={"id", "created_at", "updated_at", "username", "email"}),
+                "expected_updated_at": expected_updated_at,
+            },
         )
-        return ProfileInDB(**updated_profile)
+        self.loaders.clear(PROFILES_BY_USER_ID, requesting_user.id)
+        # populated users embed the profile, so their memoized copies are stale too
+        self.loaders.clear(POPULATED_USERS_BY_ID, requesting_user.id)
+        if not updated_profile:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="The resource has changed since it was fetched.",
+            )
+        return from_trusted_record(ProfileInDB, updated_profile)
@@ -1,39 +1,96 @@
-from typing import List
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+from databases import Database
+from app.db.loaders import LoaderRegistry, TODOS_BY_ID
 from fastapi import HTTPException, status
 from app.db.repositories.base import BaseRepository
-from app.models.todo import Todo, TodoIn, TodoInDB, TodoPublic
+from app.db.repositories.pagination import encode_cursor, decode_cursor, page_version
+from app.db.repositories.users import UsersRepository
+from app.models.core import from_trusted_record
+from app.models.todo import (
+    CompactTodoList,
+    Todo,
+    TodoChanges,
+    TodoIn,
+    TodoInDB,
+    TodoPublic,
+    TodoPage,
+    TodoSearchResults,
+    TodoStats,
+    TodoBatchUpdate,
+    TodoBatchResult,
+)
 from app.models.user import UserInDB
 
 CREATE_TODO_QUERY = """
     INSERT INTO todos (task, completed, owner)
-    VALUES (:task, :completed)
+    VALUES (:task, :completed, :owner)
     RETURNING id, task, completed, owner, created_at, updated_at;
 """
 
-GET_TODO_BY_ID_QUERY = """
+GET_TODOS_BY_IDS_QUERY = """
     SELECT id, task, completed, owner, created_at, updated_at
     FROM todos
-    WHERE id = :id;
+    WHERE id = ANY(:ids);
 """
 
-GET_ALL_TODOS_QUERY = """
-    SELECT id, task, completed
-    FROM todos;  
+# keyset pagination over (owner, id) - filters are appended as needed so every
+# variant of the query can use the ix_todos_owner_id / ix_todos_owner_completed_id indexes
+LIST_TODOS_PAGE_QUERY = """
+    SELECT id, task, completed, owner, updated_at
+    FROM todos
+    {where}
+    ORDER BY owner, id
+    LIMIT :limit;
 """
 
+# the ownership check is folded into the write: `target` sees the row as it was before the statement,
+# so a missing existing_owner means "not found", a mismatched one "forbidden", otherwise the row was written.
+# When :expected_updated_at is given the row is only written if it hasn't changed since (optimistic concurrency).
+# The checks are on `t`, the row Postgres re-reads after waiting for a concurrent writer's lock - `target` is a
+# snapshot that would still hold the old updated_at, letting both writers through
 UPDATE_TODO_BY_ID_QUERY = """
-    UPDATE todos  
-    SET task         = :task,  
-        completed  = :completed
-    WHERE id = :id AND owner = :owner
-    RETURNING id, task, completed, owner, created_at, updated_at;
+    WITH target AS (
+        SELECT id, owner
+        FROM todos
+        WHERE id = :id
+    ), updated AS (
+        UPDATE todos t
+        SET task      = COALESCE(CAST(:task AS text), t.task),
+            completed = COALESCE(CAST(:completed AS boolean), t.completed)
+        FROM target
+        WHERE t.id = target.id
+          AND t.owner = :owner
+          AND (CAST(:expected_updated_at AS timestamptz) IS NULL
+               OR t.updated_at = CAST(:expected_updated_at AS timestamptz))
+        RETURNING t.id, t.task, t.completed, t.owner, t.created_at, t.updated_at
+    )
+    SELECT target.owner AS existing_owner,
+           updated.id,
+           updated.task,
+           updated.completed,
+           updated.owner,
+           updated.created_at,
+           updated.updated_at
+    FROM target
+        LEFT JOIN updated ON updated.id = target.id;
 """
 
 DELETE_TODO_BY_ID_QUERY = """
-    DELETE FROM todos  
-    WHERE id = :id AND owner = :owner
-    RETURNING id;  
-""" 
+    WITH target AS (
+        SELECT id, owner
+        FROM todos
+        WHERE id = :id
+    ), deleted AS (
+        DELETE FROM todos t
+        USING target
+        WHERE t.id = target.id AND target.owner = :owner
+        RETURNING t.id
+    )
+    SELECT target.owner AS existing_owner, deleted.id
+    FROM target
+        LEFT JOIN deleted ON deleted.id = target.id;
+"""
 
 LIST_ALL_USER_TODOS_QUERY = """
     SELECT id, task, completed, owner, created_at, updated_at
@@ -41,66 +98,473 @@ LIST_ALL_USER_TODOS_QUERY = """
     WHERE owner = :owner;
 """
 
+# batch statements - `{rows}` is filled with one parenthesised group of numbered params per item
+CREATE_TODOS_BATCH_QUERY = """
+    INSERT INTO todos (task, completed, owner)
+    VALUES {rows}
+    RETURNING id, task, completed, owner, created_at, updated_at;
+"""
+
+UPDATE_TODOS_BATCH_QUERY = """
+    WITH batch (id, task, completed) AS (
+        VALUES {rows}
+    ), updated AS (
+        UPDATE todos t
+        SET task      = COALESCE(batch.task, t.task),
+            completed = COALESCE(batch.completed, t.completed)
+        FROM batch
+        WHERE t.id = batch.id AND t.owner = :owner
+        RETURNING t.id, t.task, t.completed, t.owner, t.created_at, t.updated_at
+    )
+    SELECT batch.id AS requested_id,
+           existing.owner AS existing_owner,
+           updated.id,
+           updated.task,
+           updated.completed,
+           updated.owner,
+           updated.created_at,
+           updated.updated_at
+    FROM batch
+        LEFT JOIN updated ON updated.id = batch.id
+        LEFT JOIN todos existing ON existing.id = batch.id;
+"""
+
+# full-text matches on the GIN-indexed task_tsv, plus substring matches (trigram-indexed when pg_trgm
+# is installed) so partial words still match. Full-text matches rank first, by relevance then recency
+SEARCH_USER_TODOS_QUERY = """
+    SELECT id, task, completed, owner, created_at, updated_at
+    FROM todos, websearch_to_tsquery('english', :q) AS query
+    WHERE owner = :owner
+      AND (task_tsv @@ query OR task ILIKE :pattern)
+    ORDER BY ts_rank_cd(task_tsv, query) DESC, id DESC
+    LIMIT :limit
+    OFFSET :offset;
+"""
+
+# kept current by the update_todo_counters triggers, so reading them doesn't depend on how many todos there are
+GET_TODO_COUNTERS_QUERY = """
+    SELECT total, completed
+    FROM todo_counters
+    WHERE owner = :owner;
+"""
+# recomputes every user's counters from the todos themselves, touching only the rows that drifted.
+# The SHARE lock holds off writes to todos (not reads) so none land between the count and the upsert
+LOCK_TODOS_FOR_RECONCILE_QUERY = """
+    LOCK TABLE todos IN SHARE MODE;
+"""
+RECONCILE_TODO_COUNTERS_QUERY = """
+    WITH actual AS (
+        SELECT u.id AS owner, count(t.id) AS total, count(t.id) FILTER (WHERE t.completed) AS completed
+        FROM users u
+            LEFT JOIN todos t ON t.owner = u.id
+        GROUP BY u.id
+    )
+    INSERT INTO todo_counters (owner, total, completed)
+    SELECT owner, total, completed
+    FROM actual
+    ON CONFLICT (owner) DO UPDATE
+    SET total      = EXCLUDED.total,
+        completed  = EXCLUDED.completed,
+        updated_at = now()
+    WHERE (todo_counters.total, todo_counters.completed) IS DISTINCT FROM (EXCLUDED.total, EXCLUDED.completed)
+    RETURNING owner;
+"""
+
+# delta sync is keyed on the id of the transaction that last wrote each row: every transaction older than
+# the snapshot's xmin has finished, so it is a safe point to resume from - rows written by transactions
+# still running past it are simply sent again next time
+SYNC_WATERMARK_QUERY = """
+    SELECT txid_snapshot_xmin(txid_current_snapshot()) AS watermark;
+"""
+LIST_TODO_CHANGES_QUERY = """
+    SELECT id, task, completed, owner, created_at, updated_at, changed_txid
+    FROM todos
+    WHERE owner = :owner AND (changed_txid, id) > (:after_txid, :after_id)
+    ORDER BY changed_txid, id
+    LIMIT :limit;
+"""
+LIST_TODO_TOMBSTONES_QUERY = """
+    SELECT id
+    FROM todo_tombstones
+    WHERE owner = :owner AND changed_txid >= :since;
+"""
+# a sync starting at or below the newest pruned tombstone may have lost deletions
+GET_TOMBSTONES_PRUNED_THROUGH_QUERY = """
+    SELECT through_txid
+    FROM todo_tombstones_pruned;
+"""
+PRUNE_TODO_TOMBSTONES_QUERY = """
+    WITH pruned AS (
+        DELETE FROM todo_tombstones
+        WHERE deleted_at < now() - make_interval(days => :retention_days)
+        RETURNING changed_txid
+    ), horizon AS (
+        UPDATE todo_tombstones_pruned
+        SET through_txid = GREATEST(through_txid, (SELECT max(changed_txid) FROM pruned))
+    )
+    SELECT count(*) FROM pruned;
+"""
+DELETE_TODOS_BATCH_QUERY = """
+    WITH deleted AS (
+        DELETE FROM todos
+        WHERE id = ANY(:ids) AND owner = :owner
+        RETURNING id
+    )
+    SELECT requested.id AS requested_id,
+           existing.owner AS existing_owner,
+           deleted.id
+    FROM unnest(CAST(:ids AS integer[])) AS requested (id)
+        LEFT JOIN deleted ON deleted.id = requested.id
+        LEFT JOIN todos existing ON existing.id = requested.id;
+"""
+
+EXPORT_USER_TODOS_QUERY = """
+    SELECT id, task, completed, owner, created_at, updated_at
+    FROM todos
+    WHERE owner = :owner
+    ORDER BY id;
+"""
+
+
+def _decode_sync_cursor(cursor: str) -> Tuple[Optional[int], int, int]:
+    """
+    (watermark, changed_txid, id) of a cursor continuing a sync, or (None, since, 0) for one starting a sync
+    """
+    try:
+        [since] = decode_cursor(cursor, length=1)
+    except ValueError:
+        return decode_cursor(cursor, length=3)
+    return None, since, 0
+
 
 class TodosRepository(BaseRepository):
     """"
     All database actions associated with the Todo resource
     """
+    def __init__(
+        self, db: Database, loaders: Optional[LoaderRegistry] = None, read_db: Optional[Database] = None
+    ) -> None:
+        super().__init__(db, loaders=loaders, read_db=read_db)
+        self.users_repo = UsersRepository(db, loaders=self.loaders, read_db=self.read_db)
+
+    async def populate_todos(self, *, todos: List[TodoInDB]) -> List[TodoPublic]:
+        """
+        Replace each todo's owner id with the owner's UserPublic, loading every owner in one query
+        """
+        owners = await self.users_repo.get_populated_users_by_ids(user_ids=[todo.owner for todo in todos])
+        return [
+            TodoPublic.construct(**todo.dict(exclude={"owner"}), owner=owners.get(todo.owner, todo.owner))
+            for todo in todos
+        ]
+
     async def create_todo(self, *, new_todo: TodoIn, requesting_user: UserInDB) -> TodoInDB:
         todo = await self.db.fetch_one(query=CREATE_TODO_QUERY, values={**new_todo.dict(), "owner": requesting_user.id})
-        return TodoInDB(**todo)
+        return from_trusted_record(TodoInDB, todo)
 
     async def get_todo_by_id(self, *, id: int, requesting_user: UserInDB) -> TodoInDB:
-        todo = await self.db.fetch_one(query=GET_TODO_BY_ID_QUERY, values={"id": id})
-        if not todo:
-            return None
-        return TodoInDB(**todo)
+        # batched with any other todo lookups made in the same tick of this request
+        return await self.loaders.get(TODOS_BY_ID, self._fetch_todos_by_ids).load(id)
+
+    async def _fetch_todos_by_ids(self, ids: List[int]) -> Dict[int, TodoInDB]:
+        todos = await self.read_db.fetch_all(query=GET_TODOS_BY_IDS_QUERY, values={"ids": list(ids)})
+        return {todo["id"]: from_trusted_record(TodoInDB, todo) for todo in todos}
 
-    async def get_all_todos(self) -> List[Todo]:
-        todos = await self.db.fetch_all(query=GET_ALL_TODOS_QUERY)
-        return [Todo(**l) for l in todos]
+    async def list_todos_page(
+        self,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        requesting_user: UserInDB,
+        completed: Optional[bool] = None,
+    ) -> Tuple[TodoPage, Tuple[Any, ...]]:
+        """
+        Return at most `limit` of the user's todos ordered by (owner, id), starting after the opaque `after` cursor,
+        along with a version of the page that changes whenever any of its rows do
+        """
+        records, next_cursor = await self._fetch_todos_page(
+            limit=limit, after=after, owner=requesting_user.id, completed=completed
+        )
+        page = TodoPage.construct(
+            todos=[from_trusted_record(Todo, record) for record in records], next_cursor=next_cursor
+        )
+        return page, page_version(records)
+
+    async def list_todos_page_compact(
+        self,
+        *,
+        limit: int,
+        after: Optional[str] = None,
+        requesting_user: UserInDB,
+        completed: Optional[bool] = None,
+    ) -> Tuple[CompactTodoList, Tuple[Any, ...]]:
+        """
+        Same page and version as `list_todos_page`, held column by column without a model per row
+        """
+        records, next_cursor = await self._fetch_todos_page(
+            limit=limit, after=after, owner=requesting_user.id, completed=completed
+        )
+        return CompactTodoList(records, next_cursor=next_cursor), page_version(records)
+
+    async def _fetch_todos_page(
+        self, *, limit: int, after: Optional[str], owner: int, completed: Optional[bool]
+    ) -> Tuple[List[Mapping], Optional[str]]:
+        conditions = ["owner = :owner"]
+        values = {"limit": limit + 1, "owner": owner}
+        if completed is not None:
+            conditions.append("completed = :completed")
+            values["completed"] = completed
+        if after:
+            try:
+                after_owner, after_id = decode_cursor(after, length=2)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+            conditions.append("(owner, id) > (:after_owner, :after_id)")
+            values.update({"after_owner": after_owner, "after_id": after_id})
+        where = f"WHERE {' AND '.join(conditions)}"
+
+        # fetch one extra row to know whether another page exists without a COUNT(*)
+        records = await self.read_db.fetch_all(query=LIST_TODOS_PAGE_QUERY.format(where=where), values=values)
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            next_cursor = encode_cursor(last["owner"], last["id"])
+        return records, next_cursor
 
     async def list_all_user_todos(self, requesting_user: UserInDB) -> List[TodoInDB]:
-        todos_list = await self.db.fetch_all(
+        todos_list = await self.read_db.fetch_all(
             query=LIST_ALL_USER_TODOS_QUERY, values={"owner": requesting_user.id}
         )
-        return [TodoInDB(**l) for l in todos_list]
+        return [from_trusted_record(TodoInDB, record) for record in todos_list]
+
+    async def iterate_user_todos(self, *, requesting_user: UserInDB) -> AsyncIterator[Mapping]:
+        """
+        Yield the user's todos one raw record at a time from a server-side cursor,
+        so callers can stream them without holding the whole list in memory
+        """
+        async for record in self.read_db.iterate(query=EXPORT_USER_TODOS_QUERY, values={"owner": requesting_user.id}):
+            yield record
+
+    async def get_todo_stats(self, *, requesting_user: UserInDB) -> TodoStats:
+        counters = await self.read_db.fetch_one(query=GET_TODO_COUNTERS_QUERY, values={"owner": requesting_user.id})
+        # users who never had a todo have no counters row yet
+        total, completed = (counters["total"], counters["completed"]) if counters else (0, 0)
+        return TodoStats.construct(total=total, completed=completed, open=total - completed)
+
+    async def reconcile_todo_counters(self) -> int:
+        """
+        Recompute every user's counters from their todos, returning how many users' counters were corrected
+        """
+        async with self.db.transaction():
+            await self.db.execute(query=LOCK_TODOS_FOR_RECONCILE_QUERY)
+            corrected = await self.db.fetch_all(query=RECONCILE_TODO_COUNTERS_QUERY)
+        return len(corrected)
+
+    async def search_user_todos(
+        self, *, requesting_user: UserInDB, q: str, limit: int, after: Optional[str] = None
+    ) -> TodoSearchResults:
+        """
+        The user's todos matching `q` as words (stemmed, web-search syntax) or as a substring of the task
+        """
+        offset = 0
+        if after:
+            try:
+                [offset] = decode_cursor(after, length=1)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+        # the search term is matched literally by ILIKE, so its wildcards are escaped
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        records = await self.read_db.fetch_all(
+            query=SEARCH_USER_TODOS_QUERY,
+            values={
+                "q": q,
+                "pattern": f"%{escaped}%",
+                "owner": requesting_user.id,
+                # one extra row tells whether there is another page
+                "limit": limit + 1,
+                "offset": offset,
+            },
+        )
+        next_cursor = encode_cursor(offset + limit) if len(records) > limit else None
+        return TodoSearchResults.construct(
+            todos=[from_trusted_record(TodoInDB, record) for record in records[:limit]], next_cursor=next_cursor
+        )
+
+    async def list_todo_changes(
+        self, *, requesting_user: UserInDB, since: Optional[str] = None, limit: int
+    ) -> TodoChanges:
+        """
+        The user's todos created or updated since the `since` cursor, and the ids of those deleted since.
+        Without a cursor every todo is returned. Todos come `limit` at a time in (changed_txid, id) order -
+        while `has_more` is set `next_cursor` continues the same sync, after that it starts the next one.
+        Rows may be repeated across syncs but are never skipped. Starting from a cursor older than the
+        pruned tombstones (see `prune_todo_tombstones`) raises a 410, as deletions may have been lost.
+        """
+        try:
+            watermark, after_txid, after_id = _decode_sync_cursor(since) if since else (None, 0, 0)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync cursor.")
+        continuing = watermark is not None
+        if not continuing:
+            # taken before reading the changes, so everything below it is already visible to those reads
+            watermark = await self.read_db.fetch_val(query=SYNC_WATERMARK_QUERY)
+        changed = await self.read_db.fetch_all(
+            query=LIST_TODO_CHANGES_QUERY,
+            values={"owner": requesting_user.id, "after_txid": after_txid, "after_id": after_id, "limit": limit + 1},
+        )
+        deleted = []
+        if since and not continuing:
+            pruned_through = await self.read_db.fetch_val(query=GET_TOMBSTONES_PRUNED_THROUGH_QUERY)
+            if after_txid <= pruned_through:
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="The sync cursor is too old. Discard local todos and sync again without `since`.",
+                )
+            # sent with the first page only - anything deleted while paging is at or above the watermark
+            deleted = await self.read_db.fetch_all(
+                query=LIST_TODO_TOMBSTONES_QUERY, values={"owner": requesting_user.id, "since": after_txid}
+            )
+        has_more = len(changed) > limit
+        if has_more:
+            changed = changed[:limit]
+            next_cursor = encode_cursor(watermark, changed[-1]["changed_txid"], changed[-1]["id"])
+        else:
+            next_cursor = encode_cursor(watermark)
+        return TodoChanges.construct(
+            todos=[from_trusted_record(TodoInDB, record) for record in changed],
+            deleted=[record["id"] for record in deleted],
+            next_cursor=next_cursor,
+            has_more=has_more,
+        )
+
+    async def prune_todo_tombstones(self, *, retention_days: int) -> int:
+        """
+        Delete tombstones older than `retention_days`, returning how many were deleted.
+        Syncs started from before the newest of them are answered with a 410 from then on.
+        """
+        return await self.db.fetch_val(query=PRUNE_TODO_TOMBSTONES_QUERY, values={"retention_days": retention_days})
 
     async def update_todo(
-        self, *, id: int, todo_update: Todo, requesting_user: UserInDB
+        self,
+        *,
+        id: int,
+        todo_update: Todo,
+        requesting_user: UserInDB,
+        expected_updated_at: Optional[datetime] = None,
     ) -> TodoInDB:
-        todo = await self.get_todo_by_id(id=id, requesting_user=requesting_user)
-        if not todo:
-            return None
-        if todo.owner != requesting_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Users are only able to update todos that they created.",
-            )
-        todo_update_params = todo.copy(update=todo_update.dict(exclude_unset=True))
-        if todo_update_params.completed is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid completed checkbox. Cannot be None."
-            )
-        updated_todo = await self.db.fetch_one(
+        # fields left out of the update (or sent as null) keep their current value
+        update_params = todo_update.dict(include={"task", "completed"}, exclude_unset=True)
+        self.loaders.clear(TODOS_BY_ID, id)
+        record = await self.db.fetch_one(
             query=UPDATE_TODO_BY_ID_QUERY,
             values={
-                **todo_update_params.dict(exclude={"created_at", "updated_at"}),
+                "id": id,
+                "task": update_params.get("task"),
+                "completed": update_params.get("completed"),
                 "owner": requesting_user.id,
+                "expected_updated_at": expected_updated_at,
             },
         )
-        return TodoInDB(**updated_todo)
-
+        if not record:
+            return None
+        if record["id"] is None:
+            if record["existing_owner"] != requesting_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Users are only able to update todos that they created.",
+                )
+            if expected_updated_at is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail="The resource has changed since it was fetched.",
+                )
+            # without a precondition the write only misses a row deleted while it waited for the row lock
+            if not await self.db.fetch_all(query=GET_TODOS_BY_IDS_QUERY, values={"ids": [id]}):
+                return None
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="The todo changed while it was being updated, try again."
+            )
+        return from_trusted_record(TodoInDB, record)
 
     async def delete_todo_by_id(self, *, id: int, requesting_user: UserInDB) -> int:
-        todo = await self.get_todo_by_id(id=id, requesting_user=requesting_user)
-        if not todo:
+        self.loaders.clear(TODOS_BY_ID, id)
+        record = await self.db.fetch_one(query=DELETE_TODO_BY_ID_QUERY, values={"id": id, "owner": requesting_user.id})
+        if not record:
             return None
-        if todo.owner != requesting_user.id:
+        if record["id"] is None:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Users are only able to delete todos that they created.",
             )
-        deleted_id = await self.db.execute(query=DELETE_TODO_BY_ID_QUERY, values={"id": id, "owner": requesting_user.id})
-        return deleted_id
+        return record["id"]
 
+    async def create_todos_batch(self, *, new_todos: List[TodoIn], requesting_user: UserInDB) -> List[TodoBatchResult]:
+        """
+        Insert every todo with a single multi-row INSERT - either all of them are created or none are
+        """
+        rows, values = [], {"owner": requesting_user.id}
+        for i, new_todo in enumerate(new_todos):
+            rows.append(f"(:task_{i}, :completed_{i}, :owner)")
+            values.update({f"task_{i}": new_todo.task, f"completed_{i}": new_todo.completed})
+        created = await self.db.fetch_all(query=CREATE_TODOS_BATCH_QUERY.format(rows=", ".join(rows)), values=values)
+        return [
+            TodoBatchResult(
+                id=record["id"], status_code=status.HTTP_201_CREATED, todo=from_trusted_record(TodoInDB, record)
+            )
+            for record in created
+        ]
+
+    async def update_todos_batch(
+        self, *, todo_updates: List[TodoBatchUpdate], requesting_user: UserInDB
+    ) -> List[TodoBatchResult]:
+        """
+        Apply every update with one UPDATE ... FROM (VALUES ...) statement, reporting per item
+        whether it was updated, doesn't exist, or belongs to another user
+        """
+        if len({todo_update.id for todo_update in todo_updates}) != len(todo_updates):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Each todo may only be updated once per batch."
+            )
+        rows, values = [], {"owner": requesting_user.id}
+        for i, todo_update in enumerate(todo_updates):
+            # the VALUES list has no target column to infer types from, so cast each param explicitly
+            rows.append(f"(CAST(:id_{i} AS integer), CAST(:task_{i} AS text), CAST(:completed_{i} AS boolean))")
+            values.update(
+                {f"id_{i}": todo_update.id, f"task_{i}": todo_update.task, f"completed_{i}": todo_update.completed}
+            )
+        for todo_update in todo_updates:
+            self.loaders.clear(TODOS_BY_ID, todo_update.id)
+        records = await self.db.fetch_all(query=UPDATE_TODOS_BATCH_QUERY.format(rows=", ".join(rows)), values=values)
+        results = {
+            record["requested_id"]: self._batch_result(record, action="update", include_todo=True) for record in records
+        }
+        return [results[todo_update.id] for todo_update in todo_updates]
+
+    async def delete_todos_batch(self, *, ids: List[int], requesting_user: UserInDB) -> List[TodoBatchResult]:
+        """
+        Delete every owned todo in `ids` with one DELETE ... WHERE id = ANY(:ids) statement
+        """
+        for id in ids:
+            self.loaders.clear(TODOS_BY_ID, id)
+        records = await self.db.fetch_all(
+            query=DELETE_TODOS_BATCH_QUERY, values={"ids": list(ids), "owner": requesting_user.id}
+        )
+        results = {
+            record["requested_id"]: self._batch_result(record, action="delete", include_todo=False) for record in records
+        }
+        return [results[id] for id in ids]
+
+    @staticmethod
+    def _batch_result(record: Mapping, *, action: str, include_todo: bool) -> TodoBatchResult:
+        if record["id"] is not None:
+            todo = from_trusted_record(TodoInDB, record) if include_todo else None
+            return TodoBatchResult(id=record["requested_id"], status_code=status.HTTP_200_OK, todo=todo)
+        if record["existing_owner"] is None:
+            return TodoBatchResult(
+                id=record["requested_id"], status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id."
+            )
+        return TodoBatchResult(
+            id=record["requested_id"],
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Users are only able to {action} todos that they created.",
+        )
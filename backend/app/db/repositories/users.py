@@ -1,12 +1,15 @@
+from asyncpg.exceptions import UniqueViolationError
 from pydantic import EmailStr
 from fastapi import HTTPException, status
 from databases import Database  
 from app.db.repositories.base import BaseRepository
-from app.models.user import UserCreate, UserUpdate, UserInDB
-from app.services import auth_service  
-from typing import Optional
+from app.models.core import from_trusted_record
+from app.models.user import UserCreate, UserUpdate, UserInDB, UserPublic
+from app.services import auth_service, token_cache
+from typing import Dict, Iterable, List, Mapping, Optional
+from app.db.loaders import LoaderRegistry, POPULATED_USERS_BY_ID
 from app.db.repositories.profiles import ProfilesRepository
-from app.models.profile import ProfileCreate, ProfilePublic  
+from app.models.profile import ProfilePublic
 
 GET_USER_BY_EMAIL_QUERY = """
     SELECT id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at
@@ -18,108 +21,180 @@ GET_USER_BY_USERNAME_QUERY = """
     FROM users
     WHERE username = :username;
 """
-REGISTER_NEW_USER_QUERY = """
-    INSERT INTO users (username, email, password, salt)
-    VALUES (:username, :email, :password, :salt)
+# users joined with their profile - profile columns are prefixed where they'd clash with the user's
+POPULATED_USER_COLUMNS = (
+    "u.id, u.username, u.email, u.email_verified, u.password, u.salt, u.is_active, u.is_superuser, "
+    "u.created_at, u.updated_at, p.id AS profile_id, p.full_name, p.phone_number, p.bio, p.image, "
+    "p.created_at AS profile_created_at, p.updated_at AS profile_updated_at"
+)
+GET_POPULATED_USER_BY_EMAIL_QUERY = f"""
+    SELECT {POPULATED_USER_COLUMNS}
+    FROM users u
+        LEFT JOIN profiles p
+        ON p.user_id = u.id
+    WHERE u.email = :email;
+"""
+GET_POPULATED_USER_BY_USERNAME_QUERY = f"""
+    SELECT {POPULATED_USER_COLUMNS}
+    FROM users u
+        LEFT JOIN profiles p
+        ON p.user_id = u.id
+    WHERE u.username = :username;
+"""
+GET_POPULATED_USERS_BY_IDS_QUERY = f"""
+    SELECT {POPULATED_USER_COLUMNS}
+    FROM users u
+        LEFT JOIN profiles p
+        ON p.user_id = u.id
+    WHERE u.id = ANY(:ids);
+"""
+# creates the user and their empty profile in one statement - duplicate emails/usernames
+# surface as a unique violation on the users indexes instead of needing lookups beforehand
+REGISTER_NEW_USER_QUERY = f"""
+    WITH new_user AS (
+        INSERT INTO users (username, email, password, salt)
+        VALUES (:username, :email, :password, :salt)
+        RETURNING id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at
+    ), new_profile AS (
+        INSERT INTO profiles (user_id)
+        SELECT id FROM new_user
+        RETURNING id, full_name, phone_number, bio, image, user_id, created_at, updated_at
+    )
+    SELECT {POPULATED_USER_COLUMNS}
+    FROM new_user u
+        INNER JOIN new_profile p
+        ON p.user_id = u.id;
+"""
+UPDATE_USER_QUERY = """
+    UPDATE users
+    SET email    = COALESCE(:email, email),
+        username = COALESCE(:username, username)
+    WHERE id = :id
+    RETURNING id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at;
+"""
+SET_USER_ACTIVE_QUERY = """
+    UPDATE users
+    SET is_active = :is_active
+    WHERE id = :id
     RETURNING id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at;
 """
 class UsersRepository(BaseRepository):
 
-    def __init__(self, db: Database) -> None:
-        super().__init__(db)
+    def __init__(
+        self, db: Database, loaders: Optional[LoaderRegistry] = None, read_db: Optional[Database] = None
+    ) -> None:
+        super().__init__(db, loaders=loaders, read_db=read_db)
         self.auth_service = auth_service
-        self.profiles_repo = ProfilesRepository(db)  
+        self.token_cache = token_cache
+        self.profiles_repo = ProfilesRepository(db, loaders=self.loaders, read_db=self.read_db)
 
-    async def get_user_by_email(self, *, email: EmailStr, populate: bool = True) -> UserInDB:
-        user_record = await self.db.fetch_one(query=GET_USER_BY_EMAIL_QUERY, values={"email": email})
+    async def get_user_by_email(self, *, email: EmailStr, populate: bool = False) -> UserInDB:
+        if populate:
+            user_record = await self.read_db.fetch_one(query=GET_POPULATED_USER_BY_EMAIL_QUERY, values={"email": email})
+            return self.populate_user(record=user_record) if user_record else None
+        user_record = await self.read_db.fetch_one(query=GET_USER_BY_EMAIL_QUERY, values={"email": email})
         if user_record:
-            user = UserInDB(**user_record)
-            if populate:
-                return await self.populate_user(user=user)
-            return user
+            return from_trusted_record(UserInDB, user_record)
 
-    async def get_user_by_username(self, *, username: str, populate: bool = True) -> UserInDB:
-        user_record = await self.db.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values={"username": username})
+    async def get_user_by_username(self, *, username: str, populate: bool = False) -> UserInDB:
+        if populate:
+            user_record = await self.read_db.fetch_one(
+                query=GET_POPULATED_USER_BY_USERNAME_QUERY, values={"username": username}
+            )
+            return self.populate_user(record=user_record) if user_record else None
+        user_record = await self.read_db.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values={"username": username})
         if user_record:
-            user = UserInDB(**user_record)
-            if populate:
-                return await self.populate_user(user=user)
-            return user
+            return from_trusted_record(UserInDB, user_record)
 
-    async def get_user_by_email(self, *, email: EmailStr) -> UserInDB:
-        user_record = await self.db.fetch_one(query=GET_USER_BY_EMAIL_QUERY, values={"email": email})
-        if not user_record:
-            return None
-        return UserInDB(**user_record)
+    async def get_populated_user_by_id(self, *, user_id: int) -> Optional[UserPublic]:
+        return await self.loaders.get(POPULATED_USERS_BY_ID, self._fetch_populated_users).load(user_id)
 
-    async def get_user_by_username(self, *, username: str) -> UserInDB:
-        user_record = await self.db.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values={"username": username})
-        if not user_record:
-            return None
-        return UserInDB(**user_record)
+    async def get_populated_users_by_ids(self, *, user_ids: Iterable[int]) -> Dict[int, UserPublic]:
+        """
+        Load many users with their profiles keyed by user id - unknown ids are left out.
+        Lookups made in the same tick of a request share one query and are memoized for the request.
+        """
+        ids = list(set(user_ids))
+        users = await self.loaders.get(POPULATED_USERS_BY_ID, self._fetch_populated_users).load_many(ids)
+        return {user_id: user for user_id, user in zip(ids, users) if user is not None}
 
-    async def register_new_user(self, *, new_user: UserCreate) -> UserInDB:
-        # make sure email isn't already taken
-        if await self.get_user_by_email(email=new_user.email):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="That email is already taken. Login with that email or register with another one."
-            )
-        # make sure username isn't already taken
-        if await self.get_user_by_username(username=new_user.username):
+    async def _fetch_populated_users(self, user_ids: List[int]) -> Dict[int, UserPublic]:
+        user_records = await self.read_db.fetch_all(
+            query=GET_POPULATED_USERS_BY_IDS_QUERY, values={"ids": list(user_ids)}
+        )
+        return {record["id"]: self.populate_user(record=record) for record in user_records}
+
+    async def register_new_user(self, *, new_user: UserCreate) -> UserPublic:
+        user_password_update = await self.auth_service.create_salt_and_hashed_password_async(
+            plaintext_password=new_user.password
+        )
+        new_user_params = new_user.copy(update=user_password_update.dict())
+        try:
+            record = await self.db.fetch_one(query=REGISTER_NEW_USER_QUERY, values=new_user_params.dict())
+        except UniqueViolationError as e:
+            # the unique indexes on users are named after their column, e.g. ix_users_email
+            if "email" in (e.constraint_name or ""):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="That email is already taken. Login with that email or register with another one."
+                )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="That username is already taken. Please try another one."                
+                detail="That username is already taken. Please try another one."
             )
-        
-        user_password_update = self.auth_service.create_salt_and_hashed_password(plaintext_password=new_user.password)
-        new_user_params = new_user.copy(update=user_password_update.dict())
-        created_user = await self.db.fetch_one(query=REGISTER_NEW_USER_QUERY, values=new_user_params.dict())
-
-        # create profile for new user
-        await self.profiles_repo.create_profile_for_user(
-            profile_create=ProfileCreate(user_id=created_user["id"])
-        )
-        return await self.populate_user(user=UserInDB(**created_user))
-        
-        return UserInDB(**created_user)
+        return self.populate_user(record=record)
 
     async def authenticate_user(self, *, email: EmailStr, password: str) -> Optional[UserInDB]:
-        user = await self.get_user_by_email(email=email, populate=False) 
-        # make user user exists in db
+        # make sure user exists in db
         user = await self.get_user_by_email(email=email)
         if not user:
             return None
         # if submitted password doesn't match
-        if not self.auth_service.verify_password(password=password, salt=user.salt, hashed_pw=user.password):
+        if not await self.auth_service.verify_password_async(
+            password=password, salt=user.salt, hashed_pw=user.password
+        ):
             return None
         return user
 
-    async def populate_user(self, *, user: UserInDB) -> UserInDB:
-        return UserPublic(
-            # unpack the user in db dict into the UserPublic model
-            # which will remove "password" and "salt"
-            **user.dict(),
-            # fetch the user's profile from the profiles repo
-            profile=await self.profiles_repo.get_profile_by_user_id(user_id=user.id)
+    async def update_user(self, *, user: UserInDB, user_update: UserUpdate) -> Optional[UserInDB]:
+        updated_user = await self.db.fetch_one(
+            query=UPDATE_USER_QUERY, values={"id": user.id, **user_update.dict(include={"email", "username"})}
         )
+        # tokens cached under the old username must not keep serving the stale snapshot
+        self.token_cache.invalidate_user(username=user.username)
+        self.loaders.clear(POPULATED_USERS_BY_ID, user.id)
+        if not updated_user:
+            return None
+        return from_trusted_record(UserInDB, updated_user)
 
-    async def register_new_user(self, *, new_user: UserCreate) -> UserInDB:
-        # make sure email isn't already taken
-        if await self.get_user_by_email(email=new_user.email):
-            raise HTTPException(
-                status_code=HTTP_400_BAD_REQUEST,
-                detail="That email is already taken. Login with that email or register with another one."
-            )
-        # make sure username isn't already taken
-        if await self.get_user_by_username(username=new_user.username):
-            raise HTTPException(
-                status_code=HTTP_400_BAD_REQUEST,
-                detail="That username is already taken. Please try another one."                
-            )
-        user_password_update = self.auth_service.create_salt_and_hashed_password(plaintext_password=new_user.password)
-        new_user_params = new_user.copy(update=user_password_update.dict())
-        created_user = await self.db.fetch_one(query=REGISTER_NEW_USER_QUERY, values=new_user_params.dict())
-        await self.profiles_repo.create_profile_for_user(profile_create=ProfileCreate(user_id=created_user["id"]))
-        return UserInDB(**created_user)
+    async def set_user_active(self, *, user: UserInDB, is_active: bool) -> Optional[UserInDB]:
+        updated_user = await self.db.fetch_one(
+            query=SET_USER_ACTIVE_QUERY, values={"id": user.id, "is_active": is_active}
+        )
+        self.token_cache.invalidate_user(username=user.username)
+        self.loaders.clear(POPULATED_USERS_BY_ID, user.id)
+        if not updated_user:
+            return None
+        return from_trusted_record(UserInDB, updated_user)
 
+    @staticmethod
+    def populate_user(*, record: Mapping) -> UserPublic:
+        """
+        Build a UserPublic with its nested profile from one row selected with POPULATED_USER_COLUMNS
+        """
+        profile = None
+        if record["profile_id"] is not None:
+            profile = ProfilePublic.construct(
+                id=record["profile_id"],
+                user_id=record["id"],
+                username=record["username"],
+                email=record["email"],
+                full_name=record["full_name"],
+                phone_number=record["phone_number"],
+                bio=record["bio"],
+                image=record["image"],
+                created_at=record["profile_created_at"],
+                updated_at=record["profile_updated_at"],
+            )
+        # UserPublic has no password or salt fields, so those columns are dropped here
+        return from_trusted_record(UserPublic, record, profile=profile)
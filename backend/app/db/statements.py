@@ -0,0 +1,96 @@
+import re
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from databases import Database
+from sqlalchemy.sql import ClauseElement
+
+from app.core.settings import DB_COMPILED_QUERY_CACHE_SIZE
+
+# `:name` placeholders, but not the `::type` cast syntax
+NAMED_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+
+
+class CompiledQuery(NamedTuple):
+    sql: str
+    params: Tuple[str, ...]
+
+    def args(self, values: Optional[Dict[str, Any]]) -> List[Any]:
+        values = values or {}
+        return [values[name] for name in self.params]
+
+
+@lru_cache(maxsize=DB_COMPILED_QUERY_CACHE_SIZE)
+def compile_query(query: str) -> CompiledQuery:
+    """
+    Rewrite a repository query from `:name` to asyncpg's positional `$n` placeholders, once per query text.
+    Query text must not contain `:word` inside string literals.
+    """
+    params: List[str] = []
+
+    def replace(match: "re.Match") -> str:
+        name = match.group(1)
+        if name not in params:
+            params.append(name)
+        return f"${params.index(name) + 1}"
+
+    return CompiledQuery(sql=NAMED_PARAM.sub(replace, query), params=tuple(params))
+
+
+class PreparedDatabase(Database):
+    """
+    A `databases.Database` that sends the repositories' raw SQL strings straight to asyncpg.
+
+    The `:name` -> `$n` rewrite happens once per query (see `compile_query`) instead of going through
+    SQLAlchemy's text() compiler on every call, and asyncpg keeps each query as a prepared statement in its
+    per-connection statement cache, reusing it across requests. SQLAlchemy expressions still take the regular
+    `databases` path. Records are asyncpg Records, which support the same `record["column"]` and `**record` access.
+
+    Nothing here handles schema changes. When a migration invalidates a cached statement, asyncpg itself
+    re-prepares and retries it once, but only outside a transaction - inside one the
+    InvalidCachedStatementError reaches the caller, as it would without this class.
+
+    This reaches into databases 0.4.1 internals (the connection's `_query_lock`), which is why requirements.txt
+    pins that exact version.
+    """
+    async def fetch_all(self, query: Union[ClauseElement, str], values: dict = None) -> List[Any]:
+        if not isinstance(query, str):
+            return await super().fetch_all(query, values)
+        compiled = compile_query(query)
+        async with self.connection() as connection:
+            # reuse databases' per-connection lock so concurrent tasks never interleave on one connection
+            async with connection._query_lock:
+                return await connection.raw_connection.fetch(compiled.sql, *compiled.args(values))
+
+    async def fetch_one(self, query: Union[ClauseElement, str], values: dict = None) -> Optional[Any]:
+        if not isinstance(query, str):
+            return await super().fetch_one(query, values)
+        compiled = compile_query(query)
+        async with self.connection() as connection:
+            async with connection._query_lock:
+                return await connection.raw_connection.fetchrow(compiled.sql, *compiled.args(values))
+
+    async def fetch_val(self, query: Union[ClauseElement, str], values: dict = None, column: Any = 0) -> Any:
+        if not isinstance(query, str):
+            return await super().fetch_val(query, values, column=column)
+        compiled = compile_query(query)
+        async with self.connection() as connection:
+            async with connection._query_lock:
+                return await connection.raw_connection.fetchval(compiled.sql, *compiled.args(values), column=column)
+
+    async def execute(self, query: Union[ClauseElement, str], values: dict = None) -> Any:
+        # like databases, return the first column of the first row (e.g. a RETURNING id)
+        return await self.fetch_val(query, values)
+
+    async def iterate(self, query: Union[ClauseElement, str], values: dict = None) -> AsyncGenerator[Any, None]:
+        if not isinstance(query, str):
+            async for record in super().iterate(query, values):
+                yield record
+            return
+        compiled = compile_query(query)
+        async with self.connection() as connection:
+            # server-side cursors only live inside a transaction
+            async with connection.transaction():
+                async with connection._query_lock:
+                    async for record in connection.raw_connection.cursor(compiled.sql, *compiled.args(values)):
+                        yield record
@@ -1,27 +1,87 @@
+from typing import Tuple
 from fastapi import FastAPI
-from databases import Database
 from app.core.config import DATABASE_URL
+from app.core.settings import (
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_CONNECTION_MAX_LIFETIME,
+    DB_CONNECT_ATTEMPTS,
+    DB_CONNECT_BACKOFF,
+    DATABASE_REPLICA_URL,
+    DB_STATEMENT_CACHE_SIZE,
+    TODO_EVENTS_QUEUE_SIZE,
+    TODO_EVENTS_RECONNECT_INTERVAL,
+)
+from app.db.instrumentation import InstrumentedDatabase
+from app.db.notifications import TodoChangeListener
+from app.db.pool import InstrumentedPool
+import asyncio
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
+async def create_database(url: str) -> Tuple[InstrumentedDatabase, InstrumentedPool]:
+    pool = InstrumentedPool(
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+        max_lifetime=DB_CONNECTION_MAX_LIFETIME,
+    )
+    server_settings = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)} if DB_STATEMENT_TIMEOUT_MS else None
+    database = InstrumentedDatabase(
+        url,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        server_settings=server_settings,
+        init=pool.on_connect,
+    )
+
+    delay = DB_CONNECT_BACKOFF
+    for attempt in range(1, DB_CONNECT_ATTEMPTS + 1):
+        try:
+            await database.connect()
+            break
+        except Exception as e:
+            logger.warning("--- DB CONNECTION ERROR (attempt %s of %s) ---", attempt, DB_CONNECT_ATTEMPTS)
+            logger.warning(e)
+            if attempt == DB_CONNECT_ATTEMPTS:
+                # refuse to start rather than serve every request without a database
+                raise
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    # `databases` has no hook around pool.acquire, so swap its asyncpg pool for the instrumented wrapper.
+    # This relies on the private `_backend._pool` attribute of databases 0.4.1, which is why requirements.txt
+    # pins that exact version - check the attribute is still there before upgrading.
+    database._backend._pool = pool.attach(database._backend._pool)
+    return database, pool
+
 async def connect_to_db(app: FastAPI) -> None:
     DB_URL = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
-    database = Database(DB_URL, min_size=2, max_size=10)
-    
-    try:
-        await database.connect()
-        app.state._db = database
-    except Exception as e:
-        logger.warn("--- DB CONNECTION ERROR ---")
-        logger.warn(e)
-        logger.warn("--- DB CONNECTION ERROR ---")
+    app.state._db, app.state._db_pool = await create_database(DB_URL)
+    # replicas don't receive the primary's notifications, so the listener always uses the primary
+    app.state._todo_listener = TodoChangeListener(
+        str(DB_URL), max_queue=TODO_EVENTS_QUEUE_SIZE, reconnect_interval=TODO_EVENTS_RECONNECT_INTERVAL
+    )
+    app.state._todo_listener.start()
+
+    if DATABASE_REPLICA_URL:
+        REPLICA_URL = f"{DATABASE_REPLICA_URL}_test" if os.environ.get("TESTING") else DATABASE_REPLICA_URL
+        app.state._db_replica, app.state._db_replica_pool = await create_database(REPLICA_URL)
         
 async def close_db_connection(app: FastAPI) -> None:
-    try:
-        await app.state._db.disconnect()
-    except Exception as e:
-        logger.warn("--- DB DISCONNECT ERROR ---")
-        logger.warn(e)
-        logger.warn("--- DB DISCONNECT ERROR ---")
+    if hasattr(app.state, "_todo_listener"):
+        await app.state._todo_listener.stop()
+    for name in ("_db_replica", "_db"):
+        if not hasattr(app.state, name):
+            continue
+        try:
+            await getattr(app.state, name).disconnect()
+        except Exception as e:
+            logger.warn("--- DB DISCONNECT ERROR ---")
+            logger.warn(e)
+            logger.warn("--- DB DISCONNECT ERROR ---")
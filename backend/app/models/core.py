@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import Any, Mapping, Optional, Type, TypeVar
 from datetime import datetime
 from pydantic import BaseModel, validator
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
 
 class CoreModel(BaseModel):
     """
@@ -17,4 +19,14 @@ class DateTimeModelMixin(BaseModel):
     updated_at: Optional[datetime]
     @validator("created_at", "updated_at", pre=True)
     def default_datetime(cls, value: datetime) -> datetime:
-        return value or datetime.datetime.now()
\ No newline at end of file
+        return value or datetime.datetime.now()
+
+
+def from_trusted_record(model: Type[ModelT], record: Mapping, **values: Any) -> ModelT:
+    """
+    Build `model` from a row read back from our own tables without running pydantic validation -
+    the row already satisfied the model's constraints when it was written. Columns the model
+    doesn't declare are dropped, and `values` set or override fields. Never use it on client input.
+    """
+    fields = model.__fields__
+    return model.construct(**{**{key: value for key, value in record.items() if key in fields}, **values})
@@ -1,11 +1,8 @@
-from typing import Optional
-from enum import Enum
-from app.models.core import IDModelMixin, CoreModel
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
 from pydantic import BaseModel
-
-from typing import Optional, Union
-from enum import Enum
-from app.models.core import IDModelMixin, DateTimeModelMixin, CoreModel
+from app.models.core import IDModelMixin, DateTimeModelMixin
 from app.models.user import UserPublic
 
 
@@ -28,3 +25,84 @@ class TodoInDB(IDModelMixin, DateTimeModelMixin, BaseModel):
     
 class TodoPublic(TodoInDB):
     pass
+
+# used as response to list todos one page at a time
+class TodoPage(BaseModel):
+    todos: List[Todo]
+    next_cursor: Optional[str]
+
+# used as response to list todos one page at a time in the compact format - one array per column
+class CompactTodoPage(BaseModel):
+    id: List[int]
+    task: List[str]
+    completed: List[bool]
+    owner: List[int]
+    next_cursor: Optional[str]
+
+class CompactTodoList:
+    """
+    Todos held column by column in typed arrays rather than one model and dict per row.
+    Repeated task strings are interned so identical tasks share one object.
+    """
+    __slots__ = ("ids", "tasks", "completed", "owners", "next_cursor")
+
+    def __init__(self, records: Iterable[Mapping] = (), next_cursor: Optional[str] = None) -> None:
+        self.ids = array("q")
+        self.tasks: List[str] = []
+        self.completed = array("b")
+        self.owners = array("q")
+        self.next_cursor = next_cursor
+        for record in records:
+            self.append(record)
+
+    def append(self, record: Mapping) -> None:
+        self.ids.append(record["id"])
+        self.tasks.append(sys.intern(record["task"]))
+        self.completed.append(record["completed"])
+        self.owners.append(record["owner"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def as_columns(self) -> Dict[str, Any]:
+        """
+        The CompactTodoPage shape, ready to hand to the JSON encoder
+        """
+        return {
+            "id": self.ids.tolist(),
+            "task": self.tasks,
+            "completed": [bool(completed) for completed in self.completed],
+            "owner": self.owners.tolist(),
+            "next_cursor": self.next_cursor,
+        }
+
+# used as response for the user's todo counts
+class TodoStats(BaseModel):
+    total: int
+    completed: int
+    open: int
+
+# used as response to search the user's todos, best matches first
+class TodoSearchResults(BaseModel):
+    todos: List[TodoPublic]
+    next_cursor: Optional[str]
+
+# used as response to sync the todos created, updated or deleted since the client's last sync
+class TodoChanges(BaseModel):
+    todos: List[TodoPublic]
+    deleted: List[int]
+    next_cursor: str
+    has_more: bool
+
+# used as payload for each item of the batch update endpoint - omitted fields are left untouched
+class TodoBatchUpdate(BaseModel):
+    id: int
+    task: Optional[str]
+    completed: Optional[bool]
+
+# used as response for each item of the batch endpoints
+class TodoBatchResult(BaseModel):
+    id: int
+    status_code: int
+    todo: Optional[TodoPublic]
+    detail: Optional[str]
@@ -1,3 +1,29 @@
+from app.core.settings import (
+    AUTH_TOKEN_CACHE_MAX_SIZE,
+    AUTH_TOKEN_CACHE_TTL_SECONDS,
+    LOGIN_RATE_LIMIT_BACKEND,
+    LOGIN_RATE_LIMIT_IP_CAPACITY,
+    LOGIN_RATE_LIMIT_IP_PER_MINUTE,
+    LOGIN_RATE_LIMIT_EMAIL_CAPACITY,
+    LOGIN_RATE_LIMIT_EMAIL_PER_MINUTE,
+)
 from app.services.authentication import AuthService
+from app.services.token_cache import TokenCache
+from app.services.rate_limit import TokenBucketLimiter, get_rate_limit_backend
 
-auth_service = AuthService()
\ No newline at end of file
+auth_service = AuthService()
+token_cache = TokenCache(max_size=AUTH_TOKEN_CACHE_MAX_SIZE, ttl=AUTH_TOKEN_CACHE_TTL_SECONDS)
+
+rate_limit_backend = get_rate_limit_backend(LOGIN_RATE_LIMIT_BACKEND)
+login_ip_limiter = TokenBucketLimiter(
+    backend=rate_limit_backend,
+    name="login-ip",
+    capacity=LOGIN_RATE_LIMIT_IP_CAPACITY,
+    per_minute=LOGIN_RATE_LIMIT_IP_PER_MINUTE,
+)
+login_email_limiter = TokenBucketLimiter(
+    backend=rate_limit_backend,
+    name="login-email",
+    capacity=LOGIN_RATE_LIMIT_EMAIL_CAPACITY,
+    per_minute=LOGIN_RATE_LIMIT_EMAIL_PER_MINUTE,
+)
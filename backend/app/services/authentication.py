@@ -3,15 +3,14 @@ import jwt
 from typing import Optional
 from fastapi import HTTPException, status
 from pydantic import ValidationError
-from passlib.context import CryptContext
 from app.models.user import UserPasswordUpdate
 from datetime import datetime, timedelta
 from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.models.token import JWTMeta, JWTCreds, JWTPayload
 from app.models.user import UserPasswordUpdate, UserInDB
 from app.models.user import UserBase, UserPasswordUpdate  
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.settings import PASSWORD_HASHING_EXECUTOR, PASSWORD_HASHING_WORKERS, PASSWORD_HASHING_MAX_QUEUE
+from app.services.hashing import HashingPool, pwd_context, hash_secret, verify_secret
 
 class AuthException(BaseException):
     """
@@ -20,6 +19,13 @@ class AuthException(BaseException):
     pass
 
 class AuthService:
+    def __init__(self) -> None:
+        self.hashing_pool = HashingPool(
+            max_workers=PASSWORD_HASHING_WORKERS,
+            max_queue=PASSWORD_HASHING_MAX_QUEUE,
+            executor=PASSWORD_HASHING_EXECUTOR,
+        )
+
     def create_salt_and_hashed_password(self, *, plaintext_password: str) -> UserPasswordUpdate:
         salt = self.generate_salt()
         hashed_password = self.hash_password(password=plaintext_password, salt=salt)
@@ -33,6 +39,18 @@ class AuthService:
     
     def verify_password(self, *, password: str, salt: str, hashed_pw: str) -> bool:
         return pwd_context.verify(password + salt, hashed_pw)
+
+    # async variants run bcrypt on the hashing pool - use these from request handlers
+    async def create_salt_and_hashed_password_async(self, *, plaintext_password: str) -> UserPasswordUpdate:
+        salt = self.generate_salt()
+        hashed_password = await self.hash_password_async(password=plaintext_password, salt=salt)
+        return UserPasswordUpdate(salt=salt, password=hashed_password)
+
+    async def hash_password_async(self, *, password: str, salt: str) -> str:
+        return await self.hashing_pool.run(hash_secret, password + salt)
+
+    async def verify_password_async(self, *, password: str, salt: str, hashed_pw: str) -> bool:
+        return await self.hashing_pool.run(verify_secret, password + salt, hashed_pw)
     
     def create_access_token_for_user(
         self,
@@ -57,7 +75,7 @@ class AuthService:
         access_token = jwt.encode(token_payload.dict(), secret_key, algorithm=JWT_ALGORITHM).decode("utf-8")
         return access_token
 
-    def get_username_from_token(self, *, token: str, secret_key: str) -> Optional[str]:
+    def get_payload_from_token(self, *, token: str, secret_key: str) -> JWTPayload:
         try:
             decoded_token = jwt.decode(token, str(secret_key), audience=JWT_AUDIENCE, algorithms=[JWT_ALGORITHM])
             payload = JWTPayload(**decoded_token)
@@ -67,6 +85,7 @@ class AuthService:
                 detail="Could not validate token credentials.",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return payload.username
-
+        return payload
 
+    def get_username_from_token(self, *, token: str, secret_key: str) -> Optional[str]:
+        return self.get_payload_from_token(token=token, secret_key=secret_key).username
\ No newline at end of file
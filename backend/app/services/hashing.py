@@ -0,0 +1,93 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# module level so they can be pickled into a process pool
+def hash_secret(secret: str) -> str:
+    return pwd_context.hash(secret)
+
+
+def verify_secret(secret: str, hashed: str) -> bool:
+    return pwd_context.verify(secret, hashed)
+
+
+class HashingPool:
+    """
+    Runs bcrypt work on a bounded executor so a burst of logins queues up here
+    instead of blocking the event loop for every other request.
+
+    At most `max_workers` hashes run at once, at most `max_queue` more wait for a slot
+    (0 = unbounded); anything beyond that is rejected with a 503.
+    """
+    def __init__(self, *, max_workers: int, max_queue: int = 0, executor: str = "thread") -> None:
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hashing executor: {executor}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor_type = executor
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # created lazily so the semaphore binds to the loop that is actually serving requests
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        if self.max_queue and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests in progress. Please try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - queued_at
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait_seconds / self.completed if self.completed else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,74 @@
+import abc
+import importlib
+import math
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Storage for token buckets. The in-memory backend is enough for a single process;
+    multi-worker deployments should plug in a shared implementation (e.g. a Redis script
+    doing the same refill-and-take atomically) so every worker sees the same buckets.
+    """
+    @abc.abstractmethod
+    async def take(self, key: str, *, capacity: int, refill_per_second: float) -> float:
+        """
+        Take one token from the bucket at `key`. Return 0 if the attempt is allowed,
+        otherwise the number of seconds until a token becomes available.
+        """
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, *, max_keys: int = 100000) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, *, capacity: int, refill_per_second: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - updated_at) * refill_per_second)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / refill_per_second
+        self._buckets[key] = (tokens, now)
+        # forget the least recently seen keys so a scan of spoofed emails can't grow memory unbounded
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class TokenBucketLimiter:
+    def __init__(self, *, backend: RateLimitBackend, name: str, capacity: int, per_minute: float) -> None:
+        self.backend = backend
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = per_minute / 60
+        self.allowed = 0
+        self.rejected = 0
+
+    async def hit(self, key: str) -> Optional[int]:
+        """
+        Record an attempt for `key`. Returns None if allowed, else the Retry-After in whole seconds.
+        """
+        retry_after = await self.backend.take(
+            f"{self.name}:{key}", capacity=self.capacity, refill_per_second=self.refill_per_second
+        )
+        if retry_after:
+            self.rejected += 1
+            return max(1, math.ceil(retry_after))
+        self.allowed += 1
+        return None
+
+
+def get_rate_limit_backend(backend: str) -> RateLimitBackend:
+    """
+    "memory" or the dotted path of a RateLimitBackend subclass, e.g. "myproject.redis_limits:RedisBackend"
+    """
+    if backend == "memory":
+        return InMemoryRateLimitBackend()
+    module_path, _, class_name = backend.partition(":")
+    return getattr(importlib.import_module(module_path), class_name)()
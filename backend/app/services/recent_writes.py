@@ -0,0 +1,32 @@
+import time
+from collections import OrderedDict
+
+
+class RecentWrites:
+    """
+    The users who wrote within the last `window` seconds, for their reads to stay on the primary
+    until the replica has caught up. Like the token cache this is per process, so a read served by
+    another worker than the write can still land on the replica.
+    """
+    def __init__(self, *, window: float) -> None:
+        self.window = window
+        # user id -> monotonic time of the last write, oldest first
+        self._last_write: "OrderedDict[int, float]" = OrderedDict()
+
+    def record(self, user_id: int) -> None:
+        now = time.monotonic()
+        self._last_write[user_id] = now
+        self._last_write.move_to_end(user_id)
+        # everything before the first recent entry has expired, so this stays bounded by the write rate
+        while self._last_write:
+            oldest_id, written_at = next(iter(self._last_write.items()))
+            if written_at > now - self.window:
+                break
+            del self._last_write[oldest_id]
+
+    def wrote_recently(self, user_id: int) -> bool:
+        written_at = self._last_write.get(user_id)
+        return written_at is not None and written_at > time.monotonic() - self.window
+
+    def clear(self) -> None:
+        self._last_write.clear()
@@ -0,0 +1,97 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set
+
+from app.models.token import JWTPayload
+from app.models.user import UserInDB
+
+
+class CachedToken(NamedTuple):
+    expires_at: float
+    claims: JWTPayload
+    user: UserInDB
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified access tokens -> (decoded claims, user snapshot).
+
+    Entries expire after `ttl` seconds or at the token's `exp`, whichever comes first.
+    The cache is per process, so changes made through another worker are only picked up
+    once the entry expires - keep `ttl` short.
+    """
+    def __init__(self, *, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedToken]" = OrderedDict()
+        self._keys_by_username: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # never keep raw bearer tokens around in memory longer than the request
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[CachedToken]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def peek(self, token: str) -> Optional[CachedToken]:
+        """
+        Like `get`, without counting a hit or a miss or refreshing the entry
+        """
+        entry = self._entries.get(self._key(token))
+        if entry is None or entry.expires_at <= time.time():
+            return None
+        return entry
+
+    def set(self, token: str, *, claims: JWTPayload, user: UserInDB) -> None:
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        expires_at = min(time.time() + self.ttl, claims.exp)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedToken(expires_at=expires_at, claims=claims, user=user)
+        self._keys_by_username.setdefault(user.username, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate_user(self, *, username: str) -> None:
+        """
+        Drop every cached token belonging to `username` - call whenever the user row changes
+        """
+        for key in self._keys_by_username.pop(username, set()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_username.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_username.get(entry.user.username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_username[entry.user.username]
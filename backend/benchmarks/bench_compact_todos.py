@@ -0,0 +1,64 @@
+"""
+Memory benchmark: 100k todos as pydantic models vs the columnar CompactTodoList.
+
+    python -m benchmarks.bench_compact_todos
+
+Rows are built before measuring, so only what each representation adds on top of
+the fetched records is counted. Run from the backend directory.
+"""
+import gc
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, List
+
+import orjson
+
+from app.models.core import from_trusted_record
+from app.models.todo import CompactTodoList, Todo
+
+ROWS = int(os.environ.get("BENCH_ROWS", 100_000))
+# a realistic spread of tasks, many of which repeat across users
+TASKS = [f"task number {i % 5000}" for i in range(ROWS)]
+
+
+def make_records() -> List[dict]:
+    # tasks are copied so each row owns its string, as rows decoded off the wire do
+    return [
+        {"id": i, "task": "".join(TASKS[i]), "completed": i % 3 == 0, "owner": i % 1000 + 1}
+        for i in range(ROWS)
+    ]
+
+
+def measure(label: str, build: Callable[[List[dict]], Any], render: Callable[[Any], bytes]) -> None:
+    records = make_records()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(records)
+    built = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # once built, the representation is all a request keeps around
+    del records
+    started = time.perf_counter()
+    body = render(result)
+    rendered = time.perf_counter() - started
+    print(
+        f"{label:<22} {size / 2 ** 20:8.1f} MiB {size / ROWS:7.0f} B/row "
+        f"{built * 1000:8.1f} ms build {rendered * 1000:8.1f} ms render {len(body) / 2 ** 20:6.1f} MiB body"
+    )
+
+
+if __name__ == "__main__":
+    print(f"{ROWS} rows")
+    measure(
+        "list[Todo]",
+        lambda records: [from_trusted_record(Todo, record) for record in records],
+        lambda todos: orjson.dumps({"todos": todos, "next_cursor": None}, default=lambda todo: todo.dict()),
+    )
+    measure(
+        "CompactTodoList",
+        lambda records: CompactTodoList(records),
+        lambda compact: orjson.dumps(compact.as_columns()),
+    )
@@ -0,0 +1,71 @@
+"""
+Microbenchmark: per-request overhead of the metrics and query-timing middleware.
+
+    python -m benchmarks.bench_metrics_middleware
+
+Drives a bare ASGI app that sends a small JSON response directly, without a server or an HTTP
+client, so the difference between the rows is what each middleware adds. Run from the backend directory.
+"""
+import asyncio
+import os
+import time
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.middleware import MetricsMiddleware, QueryTimingMiddleware
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 100_000))
+BODY = b'{"id":1,"task":"write the benchmark","completed":false,"owner":1}'
+
+
+async def endpoint() -> None:
+    pass
+
+
+class RoutedApp:
+    """
+    Stands in for the router: leaves a matched endpoint in the scope and sends a fixed response
+    """
+    def __init__(self) -> None:
+        self.app = FastAPI()
+        self.app.add_api_route("/api/todos/1/", endpoint, name="todos:get-todo-by-id")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        scope["app"] = self.app
+        scope["endpoint"] = endpoint
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": BODY})
+
+
+async def drive(app: ASGIApp) -> float:
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        scope = {"type": "http", "method": "GET", "path": "/api/todos/1/", "headers": []}
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / ITERATIONS
+
+
+async def main() -> None:
+    stacks = [
+        ("no middleware", lambda app: app),
+        ("MetricsMiddleware", MetricsMiddleware),
+        ("QueryTimingMiddleware", QueryTimingMiddleware),
+        ("both", lambda app: MetricsMiddleware(QueryTimingMiddleware(app))),
+    ]
+    baseline = None
+    for label, wrap in stacks:
+        await drive(wrap(RoutedApp()))  # warm up
+        per_request = await drive(wrap(RoutedApp()))
+        baseline = per_request if baseline is None else baseline
+        print(f"{label:<22} {per_request * 1e6:7.2f} us/request {(per_request - baseline) * 1e6:+7.2f} us overhead")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Microbenchmark: repository queries through plain `databases` vs the PreparedDatabase registry.
+
+    python -m benchmarks.bench_prepared_statements                 # query compilation only
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_prepared_statements   # plus round trips
+
+Run from the backend directory. The database run only reads, using GET_USER_BY_USERNAME_QUERY.
+"""
+import asyncio
+import os
+import time
+
+from databases import Database
+from databases.backends.postgres import PostgresBackend
+from sqlalchemy import text
+
+from app.db.repositories.todos import UPDATE_TODO_BY_ID_QUERY
+from app.db.repositories.users import GET_USER_BY_USERNAME_QUERY
+from app.db.statements import PreparedDatabase, compile_query
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 5000))
+UPDATE_VALUES = {"id": 1, "owner": 1, "task": "bench", "completed": False}
+
+
+def report(label: str, elapsed: float, iterations: int) -> None:
+    print(f"{label:<40} {elapsed / iterations * 1e6:9.1f} us/op")
+
+
+def bench_compile() -> None:
+    connection = PostgresBackend("postgresql://localhost/bench").connection()
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        connection._compile(text(UPDATE_TODO_BY_ID_QUERY).bindparams(**UPDATE_VALUES))
+    report("databases text() compile", time.perf_counter() - started, ITERATIONS)
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        compiled = compile_query(UPDATE_TODO_BY_ID_QUERY)
+        compiled.args(UPDATE_VALUES)
+    report("compile_query (cached)", time.perf_counter() - started, ITERATIONS)
+
+
+async def bench_round_trips(url: str) -> None:
+    values = {"username": "bench-user-that-does-not-exist"}
+    for label, database in (("databases fetch_one", Database(url)), ("PreparedDatabase fetch_one", PreparedDatabase(url))):
+        await database.connect()
+        try:
+            # warm up the pool and the connection's statement cache
+            await database.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values=values)
+            started = time.perf_counter()
+            for _ in range(ITERATIONS):
+                await database.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values=values)
+            report(label, time.perf_counter() - started, ITERATIONS)
+        finally:
+            await database.disconnect()
+
+
+if __name__ == "__main__":
+    bench_compile()
+    if os.environ.get("BENCH_DATABASE_URL"):
+        asyncio.run(bench_round_trips(os.environ["BENCH_DATABASE_URL"]))
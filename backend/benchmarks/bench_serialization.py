@@ -0,0 +1,105 @@
+"""
+Microbenchmark: per-endpoint cost of turning database rows into a response body.
+
+    python -m benchmarks.bench_serialization
+
+"validated" is the old path - Model(**row) in the repository, then FastAPI's response_model
+validation and jsonable_encoder, rendered by JSONResponse. "trusted" is from_trusted_record
+in the repository rendered by TrustedJSONResponse. Run from the backend directory.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.api.responses import TrustedJSONResponse
+from app.db.repositories.users import UsersRepository
+from app.models.core import from_trusted_record
+from app.models.profile import ProfileInDB, ProfilePublic
+from app.models.todo import Todo, TodoInDB, TodoPage, TodoPublic
+from app.models.user import UserInDB, UserPublic
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 2000))
+NOW = datetime.now(timezone.utc)
+
+TODO_ROW = {"id": 1, "task": "write the benchmark", "completed": False, "owner": 1, "created_at": NOW, "updated_at": NOW}
+PROFILE_ROW = {
+    "id": 1, "full_name": "Bench User", "phone_number": "555-555-5555", "bio": "benchmarks",
+    "image": "https://example.com/avatar.png", "user_id": 1, "username": "bench", "email": "bench@example.com",
+    "created_at": NOW, "updated_at": NOW,
+}
+POPULATED_USER_ROW = {
+    "id": 1, "username": "bench", "email": "bench@example.com", "email_verified": False,
+    "password": "not-a-real-hash", "salt": "salt", "is_active": True, "is_superuser": False,
+    "created_at": NOW, "updated_at": NOW, "profile_id": 1, "full_name": "Bench User",
+    "phone_number": "555-555-5555", "bio": "benchmarks", "image": "https://example.com/avatar.png",
+    "profile_created_at": NOW, "profile_updated_at": NOW,
+}
+PAGE_ROWS = [{**TODO_ROW, "id": i} for i in range(50)]
+
+
+def validated_user(row: dict) -> UserPublic:
+    profile = ProfilePublic(
+        id=row["profile_id"], user_id=row["id"], username=row["username"], email=row["email"],
+        full_name=row["full_name"], phone_number=row["phone_number"], bio=row["bio"], image=row["image"],
+        created_at=row["profile_created_at"], updated_at=row["profile_updated_at"],
+    )
+    return UserPublic(**UserInDB(**row).dict(), profile=profile)
+
+
+# endpoint name, response_model, old repository result, new repository result
+ENDPOINTS = [
+    (
+        "GET /todos/ (50 rows)",
+        TodoPage,
+        lambda: TodoPage(todos=[Todo(**row) for row in PAGE_ROWS], next_cursor=None),
+        lambda: TodoPage.construct(todos=[from_trusted_record(Todo, row) for row in PAGE_ROWS], next_cursor=None),
+    ),
+    ("GET /todos/{id}/", TodoPublic, lambda: TodoInDB(**TODO_ROW), lambda: from_trusted_record(TodoInDB, TODO_ROW)),
+    (
+        "GET /profiles/{username}/",
+        ProfilePublic,
+        lambda: ProfileInDB(**PROFILE_ROW),
+        lambda: from_trusted_record(ProfileInDB, PROFILE_ROW),
+    ),
+    (
+        "GET /users/me/",
+        UserPublic,
+        lambda: validated_user(POPULATED_USER_ROW),
+        lambda: UsersRepository.populate_user(record=POPULATED_USER_ROW),
+    ),
+]
+
+
+async def validated_body(field: Any, build: Callable[[], Any]) -> bytes:
+    content = await serialize_response(field=field, response_content=build())
+    return JSONResponse(content).body
+
+
+async def trusted_body(build: Callable[[], Any]) -> bytes:
+    return TrustedJSONResponse(build()).body
+
+
+async def timed(make_body: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await make_body()
+    return (time.perf_counter() - started) / ITERATIONS * 1e6
+
+
+async def main() -> None:
+    print(f"{'endpoint':<28} {'validated':>12} {'trusted':>12} {'speedup':>8}")
+    for name, response_model, build_validated, build_trusted in ENDPOINTS:
+        field = create_response_field(name="bench", type_=response_model)
+        validated = await timed(lambda: validated_body(field, build_validated))
+        trusted = await timed(lambda: trusted_body(build_trusted))
+        print(f"{name:<28} {validated:9.1f} us {trusted:9.1f} us {validated / trusted:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
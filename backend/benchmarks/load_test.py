@@ -0,0 +1,335 @@
+"""
+Load test: latency, throughput and database queries per request for every API route.
+
+    BENCH_BASE_URL=http://localhost:8000 BENCH_DATABASE_URL=postgresql://... \
+        python -m benchmarks.load_test --concurrency 32 --requests 2000 --save-baseline
+
+    python -m benchmarks.load_test --concurrency 32 --requests 2000   # compares against the saved baseline
+
+Seed the database first with `python -m benchmarks.seed`. Each endpoint is driven on its own, at a fixed
+number of concurrent clients spread over the seeded users, after a warmup. Reports p50/p95/p99 latency,
+requests per second and - when BENCH_DATABASE_URL points at a database with the pg_stat_statements
+extension - statements executed per request. Exits non-zero when an endpoint's p95 or throughput is worse
+than the baseline by more than --tolerance.
+
+Access tokens are minted locally rather than through the login route, so this has to run with the
+server's SECRET_KEY. The login scenario is throttled per IP and per email like any other client, raise
+the LOGIN_RATE_LIMIT_* settings on the server under test to measure it. The SSE and WebSocket event
+streams are long-lived connections, not request/response, and are left out. Run from the backend directory.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import asyncpg
+import httpx
+
+from app.models.user import UserBase
+from app.services import auth_service
+from benchmarks.seed import BENCH_PASSWORD, bench_email, bench_username
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# todos per virtual user created up front for the routes that modify or delete one
+TARGET_TODOS = 50
+STATEMENT_CALLS_QUERY = """
+    SELECT coalesce(sum(calls), 0)
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND query NOT LIKE '%pg_stat_statements%'
+"""
+
+
+class VirtualUser(NamedTuple):
+    id: int
+    username: str
+    email: str
+    headers: Dict[str, str]
+    todo_ids: List[int]
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # (virtual user, request number) -> (path, httpx request kwargs)
+    build: Callable[[VirtualUser, int], Tuple[str, Dict[str, Any]]]
+    expected: Tuple[int, ...] = (200,)
+
+
+def _pick(todo_ids: List[int], i: int) -> int:
+    return todo_ids[i % len(todo_ids)]
+
+
+SCENARIOS = [
+    Scenario("health:liveness", "GET", lambda u, i: ("/api/health/live/", {})),
+    Scenario("health:readiness", "GET", lambda u, i: ("/api/health/ready/", {})),
+    Scenario(
+        "users:register-new-user",
+        "POST",
+        lambda u, i: (
+            "/api/users/",
+            {"json": {"new_user": {
+                "username": f"load_{os.getpid()}_{u.id}_{i}",
+                "email": f"load_{os.getpid()}_{u.id}_{i}@example.com",
+                "password": BENCH_PASSWORD,
+            }}},
+        ),
+        (201,),
+    ),
+    Scenario(
+        "users:login-email-and-password",
+        "POST",
+        lambda u, i: ("/api/users/login/token/", {"data": {"username": u.email, "password": BENCH_PASSWORD}}),
+        (200, 429),
+    ),
+    Scenario("users:get-current-user", "GET", lambda u, i: ("/api/users/me/", {"headers": u.headers})),
+    Scenario(
+        "profiles:get-profile-by-username",
+        "GET",
+        lambda u, i: (f"/api/profiles/{u.username}/", {"headers": u.headers}),
+    ),
+    Scenario(
+        "profiles:update-own-profile",
+        "PUT",
+        lambda u, i: ("/api/profiles/me/", {"headers": u.headers, "json": {"profile_update": {"bio": f"run {i}"}}}),
+    ),
+    Scenario("todos:get-all-todos", "GET", lambda u, i: ("/api/todos/", {"headers": u.headers})),
+    Scenario(
+        "todos:get-all-todos (compact)",
+        "GET",
+        lambda u, i: ("/api/todos/", {"headers": u.headers, "params": {"format": "compact"}}),
+    ),
+    Scenario("todos:export-user-todos", "GET", lambda u, i: ("/api/todos/export/", {"headers": u.headers})),
+    Scenario("todos:list-todo-changes", "GET", lambda u, i: ("/api/todos/changes/", {"headers": u.headers})),
+    Scenario("todos:get-todo-stats", "GET", lambda u, i: ("/api/todos/stats/", {"headers": u.headers})),
+    Scenario(
+        "todos:search-todos",
+        "GET",
+        lambda u, i: ("/api/todos/search/", {"headers": u.headers, "params": {"q": ("groceries", "pay taxes", "dent")[i % 3]}}),
+    ),
+    Scenario(
+        "todos:get-todo-by-id",
+        "GET",
+        lambda u, i: (f"/api/todos/{_pick(u.todo_ids, i)}/", {"headers": u.headers}),
+    ),
+    Scenario(
+        "todos:create-todo",
+        "POST",
+        lambda u, i: ("/api/todos/", {"headers": u.headers, "json": {"new_todo": {"task": f"load {i}", "completed": False}}}),
+        (201,),
+    ),
+    Scenario(
+        "todos:update-todo-by-id",
+        "PUT",
+        lambda u, i: (
+            f"/api/todos/{_pick(u.todo_ids, i)}/",
+            {"headers": u.headers, "json": {"todo_update": {"task": f"updated {i}", "completed": i % 2 == 0}}},
+        ),
+    ),
+    Scenario(
+        "todos:create-todos-batch",
+        "POST",
+        lambda u, i: (
+            "/api/todos/batch/",
+            {"headers": u.headers, "json": {"new_todos": [{"task": f"batch {i} {n}", "completed": False} for n in range(10)]}},
+        ),
+        (201,),
+    ),
+    Scenario(
+        "todos:update-todos-batch",
+        "PUT",
+        lambda u, i: (
+            "/api/todos/batch/",
+            {"headers": u.headers, "json": {"todo_updates": [{"id": todo_id, "completed": i % 2 == 0} for todo_id in u.todo_ids[:10]]}},
+        ),
+    ),
+    # the deletes run last, they use up the target todos - ids that are already gone come back as 404s
+    Scenario(
+        "todos:delete-todos-batch",
+        "POST",
+        lambda u, i: ("/api/todos/batch/delete/", {"headers": u.headers, "json": {"todo_ids": [_pick(u.todo_ids, i)]}}),
+    ),
+    Scenario(
+        "todos:delete-todo-by-id",
+        "DELETE",
+        lambda u, i: (f"/api/todos/{_pick(u.todo_ids, i)}/", {"headers": u.headers}),
+        (200, 404),
+    ),
+]
+
+
+class Result(NamedTuple):
+    requests: int
+    errors: int
+    seconds: float
+    latencies: List[float]
+    queries_per_request: Optional[float]
+
+    def percentile(self, p: float) -> float:
+        # nearest rank, in milliseconds
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "rps": round(self.requests / self.seconds, 1),
+            "queries_per_request": None if self.queries_per_request is None else round(self.queries_per_request, 2),
+        }
+
+
+async def prepare_users(client: httpx.AsyncClient, count: int) -> List[VirtualUser]:
+    users = []
+    for i in range(count):
+        user = UserBase(username=bench_username(i), email=bench_email(i))
+        headers = {"Authorization": f"Bearer {auth_service.create_access_token_for_user(user=user)}"}
+        me = await client.get("/api/users/me/", headers=headers)
+        if me.status_code != 200:
+            raise SystemExit(f"{user.username} can't authenticate ({me.status_code}) - seed with --users >= {count}")
+        created = await client.post(
+            "/api/todos/batch/",
+            headers=headers,
+            json={"new_todos": [{"task": f"load target {n}", "completed": False} for n in range(TARGET_TODOS)]},
+        )
+        todo_ids = [item["id"] for item in created.json()]
+        users.append(VirtualUser(me.json()["id"], user.username, user.email, headers, todo_ids))
+    return users
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    users: List[VirtualUser],
+    *,
+    concurrency: int,
+    requests: int,
+    warmup: int,
+    count_queries: Optional[Callable[[], Awaitable[int]]],
+) -> Result:
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(worker_id: int, numbers: range, record: bool) -> None:
+        nonlocal errors
+        user = users[worker_id % len(users)]
+        for i in numbers:
+            path, kwargs = scenario.build(user, i)
+            started = time.perf_counter()
+            response = await client.request(scenario.method, path, **kwargs)
+            elapsed = time.perf_counter() - started
+            if record:
+                latencies.append(elapsed)
+                errors += response.status_code not in scenario.expected
+
+    async def run(start: int, stop: int, record: bool) -> None:
+        # request numbers never repeat across warmup and measurement, so usernames to register stay unique
+        await asyncio.gather(*(worker(w, range(start + w, stop, concurrency), record) for w in range(concurrency)))
+
+    await run(0, warmup, record=False)
+    queries_before = await count_queries() if count_queries else None
+    started = time.perf_counter()
+    await run(warmup, warmup + requests, record=True)
+    seconds = time.perf_counter() - started
+    queries_per_request = None
+    if count_queries:
+        queries_per_request = (await count_queries() - queries_before) / requests
+    return Result(requests, errors, seconds, latencies, queries_per_request)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+        # an extra statement per request is a regression whatever it does to latency on this machine
+        if None not in (current["queries_per_request"], previous["queries_per_request"]) and (
+            current["queries_per_request"] > previous["queries_per_request"] + 0.5
+        ):
+            regressions.append(
+                f"{name}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}"
+            )
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    database_url = os.environ.get("BENCH_DATABASE_URL")
+    stats_connection = None
+    count_queries = None
+    if database_url:
+        stats_connection = await asyncpg.connect(database_url)
+        try:
+            await stats_connection.fetchval(STATEMENT_CALLS_QUERY)
+            count_queries = lambda: stats_connection.fetchval(STATEMENT_CALLS_QUERY)
+        except asyncpg.PostgresError as e:
+            print(f"query counts unavailable, pg_stat_statements isn't usable: {e}", file=sys.stderr)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    base_url = os.environ.get("BENCH_BASE_URL", "http://localhost:8000")
+    selected = [s for s in SCENARIOS if not args.only or any(part in s.name for part in args.only)]
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            users = await prepare_users(client, args.users)
+            print(f"{'endpoint':<36} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>7}")
+            for scenario in selected:
+                result = await run_scenario(
+                    client,
+                    scenario,
+                    users,
+                    concurrency=args.concurrency,
+                    requests=args.requests,
+                    warmup=args.warmup,
+                    count_queries=count_queries,
+                )
+                summary = results[scenario.name] = result.summary()
+                queries = "n/a" if summary["queries_per_request"] is None else summary["queries_per_request"]
+                print(
+                    f"{scenario.name:<36} {summary['p50_ms']:>8} {summary['p95_ms']:>8} {summary['p99_ms']:>8} "
+                    f"{summary['rps']:>8} {queries:>8} {summary['errors']:>7}"
+                )
+    finally:
+        if stats_connection:
+            await stats_connection.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per endpoint")
+    parser.add_argument("--users", type=int, default=16, help="seeded users to spread the clients over")
+    parser.add_argument("--only", nargs="*", help="only run endpoints whose name contains one of these")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change, as a fraction")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,120 @@
+"""
+Seed a database with benchmark users, profiles and todos.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.seed --users 1000 --todos-per-user 2000
+
+Everything is bulk loaded with COPY, so millions of todos take seconds rather than hours. Every
+benchmark user shares the password BENCH_PASSWORD, and existing benchmark users are only replaced
+with --reset. Run from the backend directory against a database migrated to head.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Iterator, Tuple
+
+import asyncpg
+
+from app.services import auth_service
+
+BENCH_PASSWORD = "benchmark-password"
+BENCH_USERNAME_PREFIX = "bench_user_"
+# enough variety for full-text search to have something to rank
+TASK_WORDS = (
+    "buy", "call", "email", "fix", "plan", "review", "write", "clean", "book", "renew", "pay", "water",
+    "groceries", "plumber", "report", "garden", "passport", "invoice", "car", "dentist", "meeting", "tickets",
+    "shoes", "taxes", "budget", "birthday", "present", "laundry", "kitchen", "presentation",
+)
+COPY_CHUNK_ROWS = 50_000
+
+
+def bench_username(i: int) -> str:
+    return f"{BENCH_USERNAME_PREFIX}{i}"
+
+
+def bench_email(i: int) -> str:
+    return f"{bench_username(i)}@example.com"
+
+
+def todo_rows(owners: Tuple[int, ...], todos_per_user: int, rng: random.Random) -> Iterator[Tuple[str, bool, int]]:
+    for owner in owners:
+        for _ in range(todos_per_user):
+            task = " ".join(rng.choice(TASK_WORDS) for _ in range(rng.randint(2, 6)))
+            yield task, rng.random() < 0.4, owner
+
+
+async def seed(database_url: str, *, users: int, todos_per_user: int, reset: bool, seed: int) -> None:
+    connection = await asyncpg.connect(database_url)
+    try:
+        existing = await connection.fetchval(
+            "SELECT count(*) FROM users WHERE username LIKE $1", f"{BENCH_USERNAME_PREFIX}%"
+        )
+        if existing and not reset:
+            raise SystemExit(f"{existing} benchmark users already exist - pass --reset to replace them")
+
+        # one bcrypt hash for everybody - hashing a million passwords would dominate seeding
+        credentials = auth_service.create_salt_and_hashed_password(plaintext_password=BENCH_PASSWORD)
+        started = time.perf_counter()
+        async with connection.transaction():
+            if existing:
+                await connection.execute("DELETE FROM users WHERE username LIKE $1", f"{BENCH_USERNAME_PREFIX}%")
+            # nobody is listening for seed data, so skip queueing a notification per row
+            await connection.execute("ALTER TABLE todos DISABLE TRIGGER notify_todos_change")
+
+            await connection.copy_records_to_table(
+                "users",
+                records=[
+                    (bench_username(i), bench_email(i), credentials.password, credentials.salt) for i in range(users)
+                ],
+                columns=["username", "email", "password", "salt"],
+            )
+            owners = tuple(
+                record["id"]
+                for record in await connection.fetch(
+                    "SELECT id FROM users WHERE username LIKE $1 ORDER BY id", f"{BENCH_USERNAME_PREFIX}%"
+                )
+            )
+            await connection.execute(
+                """
+                INSERT INTO profiles (user_id, full_name, bio)
+                SELECT id, 'Bench ' || username, 'Seeded for benchmarks'
+                FROM users
+                WHERE username LIKE $1
+                """,
+                f"{BENCH_USERNAME_PREFIX}%",
+            )
+
+            rows = todo_rows(owners, todos_per_user, random.Random(seed))
+            loaded = 0
+            while True:
+                chunk = [row for _, row in zip(range(COPY_CHUNK_ROWS), rows)]
+                if not chunk:
+                    break
+                await connection.copy_records_to_table("todos", records=chunk, columns=["task", "completed", "owner"])
+                loaded += len(chunk)
+                print(f"\r{loaded} todos", end="", flush=True)
+
+            await connection.execute("ALTER TABLE todos ENABLE TRIGGER notify_todos_change")
+        print(f"\nseeded {users} users and {loaded} todos in {time.perf_counter() - started:.1f}s")
+        await connection.execute("ANALYZE users, profiles, todos, todo_counters")
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos-per-user", type=int, default=1000)
+    parser.add_argument("--reset", action="store_true", help="replace existing benchmark users and their todos")
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for reproducible data")
+    args = parser.parse_args()
+    asyncio.run(
+        seed(
+            os.environ["BENCH_DATABASE_URL"],
+            users=args.users,
+            todos_per_user=args.todos_per_user,
+            reset=args.reset,
+            seed=args.seed,
+        )
+    )
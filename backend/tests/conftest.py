@@ -1,8 +1,6 @@
 import warnings
 import uuid
 import os
-import random
-from typing import List, Callable
 import pytest
 import docker as pydocker
 from asgi_lifespan import LifespanManager
@@ -11,8 +9,7 @@ from httpx import AsyncClient
 from databases import Database
 import alembic
 from alembic.config import Config
-from app.api.dependencies.database import get_repository
-from app.models.todo import Todo, TodoIn, TodoPublic, TodoInDB
+from app.models.todo import TodoIn, TodoInDB
 from app.db.repositories.todos import TodosRepository
 from app.models.user import UserCreate, UserInDB
 from app.db.repositories.users import UsersRepository
@@ -67,22 +64,6 @@ def app() -> FastAPI:
     return get_application()
 
 
-# Gets reference to the database
-@pytest.fixture
-def db(app: FastAPI) -> Database:
-    return app.state._db
-
-
-@pytest.fixture
-async def test_todo(db: Database) -> Todo:
-    todo_repo = TodosRepository(db)
-    new_todo = Todo(
-        task="fake todo task", completed=False,
-    )
-
-    return await todo_repo.create_todo(new_todo=new_todo)
-
-
 # Tests making requests
 @pytest.fixture
 async def client(app: FastAPI) -> AsyncClient:
@@ -92,6 +73,13 @@ async def client(app: FastAPI) -> AsyncClient:
         ) as client:
             yield client
 
+
+# Gets reference to the database, only connected once the client has started the app
+@pytest.fixture
+def db(app: FastAPI, client: AsyncClient) -> Database:
+    return app.state._db
+
+
 @pytest.fixture
 async def test_user(db: Database) -> UserInDB:
     new_user = UserCreate(
@@ -120,6 +108,16 @@ async def test_user2(db: Database) -> UserInDB:
 
 @pytest.fixture
 async def test_todo(db: Database, test_user: UserInDB) -> TodoInDB:
-    todo_repo = todosRepository(db)
+    todo_repo = TodosRepository(db)
     new_todo = TodoIn(task="fake todo name", completed=False)
     return await todo_repo.create_todo(new_todo=new_todo, requesting_user=test_user)
+
+
+@pytest.fixture
+def authorized_client(client: AsyncClient, test_user: UserInDB) -> AsyncClient:
+    access_token = auth_service.create_access_token_for_user(user=test_user, secret_key=str(SECRET_KEY))
+    client.headers = {
+        **client.headers,
+        "Authorization": f"{JWT_TOKEN_PREFIX} {access_token}",
+    }
+    return client
@@ -0,0 +1,99 @@
+import gzip
+import pytest
+import brotli
+from httpx import AsyncClient
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+from app.api.middleware import CompressionMiddleware, choose_encoding
+
+LARGE = {"todos": [{"id": i, "task": f"todo number {i}", "completed": False} for i in range(200)]}
+
+
+class TestContentNegotiation:
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        [
+            ("", None),
+            ("gzip, deflate", "gzip"),
+            ("gzip, deflate, br", "br"),
+            ("br;q=0.5, gzip", "gzip"),
+            ("br;q=0, *", "gzip"),
+            ("identity", None),
+            ("*;q=0", None),
+        ],
+    )
+    def test_picks_the_preferred_encoding(self, accept_encoding: str, expected: str) -> None:
+        assert choose_encoding(accept_encoding) == expected
+
+
+@pytest.mark.asyncio
+class TestCompressionMiddleware:
+    @pytest.fixture
+    def compressed_app(self) -> FastAPI:
+        app = FastAPI(default_response_class=ORJSONResponse)
+
+        @app.get("/large/")
+        async def large() -> ORJSONResponse:
+            return ORJSONResponse(LARGE, headers={"ETag": 'W/"v1"'})
+
+        @app.get("/small/")
+        async def small() -> dict:
+            return {"status": "ok"}
+
+        @app.get("/stream/")
+        async def stream() -> StreamingResponse:
+            async def rows():
+                for i in range(3):
+                    yield f'{{"id": {i}}}\n' * 100
+            return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+        @app.get("/events/")
+        async def events() -> StreamingResponse:
+            async def rows():
+                yield "data: {}\n\n" * 200
+            return StreamingResponse(rows(), media_type="text/event-stream")
+
+        app.add_middleware(CompressionMiddleware, minimum_size=1024, gzip_level=6, brotli_quality=4, cache_size=8)
+        return app
+
+    async def get(self, app: FastAPI, path: str, accept_encoding: str):
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    async def test_large_responses_are_compressed(self, compressed_app: FastAPI) -> None:
+        for encoding, decompress in (("gzip", gzip.decompress), ("br", brotli.decompress)):
+            res = await self.get(compressed_app, "/large/", encoding)
+            assert res.headers["content-encoding"] == encoding
+            assert res.headers["vary"] == "Accept-Encoding"
+            # httpx decodes the body, the length is the compressed one
+            assert int(res.headers["content-length"]) < len(res.content) // 4
+            assert res.json() == LARGE
+
+    async def test_unchanged_bodies_come_from_the_cache(self) -> None:
+        middleware = CompressionMiddleware(None, minimum_size=1024, gzip_level=6, brotli_quality=4, cache_size=1)
+        body = b"todo " * 1000
+        first = middleware._compress_body("gzip", body, cacheable=True)
+        assert middleware._compress_body("gzip", body, cacheable=True) is first
+        assert middleware._compress_body("gzip", body + b"!", cacheable=True) is not first
+        # the cache holds one body, so the first one was evicted
+        assert middleware._compress_body("gzip", body, cacheable=True) is not first
+        assert gzip.decompress(first) == body
+
+    async def test_small_responses_and_other_clients_are_left_alone(self, compressed_app: FastAPI) -> None:
+        small = await self.get(compressed_app, "/small/", "gzip, br")
+        assert "content-encoding" not in small.headers
+        assert small.headers["vary"] == "Accept-Encoding"
+        identity = await self.get(compressed_app, "/large/", "identity")
+        assert "content-encoding" not in identity.headers
+        assert identity.json() == LARGE
+
+    async def test_streaming_responses_are_compressed(self, compressed_app: FastAPI) -> None:
+        res = await self.get(compressed_app, "/stream/", "gzip")
+        assert res.headers["content-encoding"] == "gzip"
+        assert "content-length" not in res.headers
+        assert res.text == '{"id": 0}\n' * 100 + '{"id": 1}\n' * 100 + '{"id": 2}\n' * 100
+
+    async def test_event_streams_are_not_compressed(self, compressed_app: FastAPI) -> None:
+        res = await self.get(compressed_app, "/events/", "gzip, br")
+        assert "content-encoding" not in res.headers
@@ -0,0 +1,132 @@
+import pytest
+from databases import Database
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.db.instrumentation import QueryLog, QueryStat, statement_name
+from app.db.repositories.todos import TodosRepository
+from app.db.statements import PreparedDatabase, compile_query
+from app.models.todo import TodoIn, TodoInDB
+from app.models.user import UserInDB
+from app.services.recent_writes import RecentWrites
+
+
+@pytest.fixture
+async def stale_replica(app: FastAPI, db: Database) -> Database:
+    """
+    Stands in for a replica that has stopped replicating - a single connection reading one
+    repeatable read snapshot of the primary, taken when the fixture is set up
+    """
+    replica = Database(
+        str(db.url), force_rollback=True, server_settings={"default_transaction_isolation": "repeatable read"}
+    )
+    await replica.connect()
+    await replica.fetch_val("SELECT 1")
+    app.state._db_replica = replica
+    yield replica
+    await replica.disconnect()
+    del app.state._db_replica
+
+
+@pytest.mark.asyncio
+class TestReadReplicaRouting:
+    async def test_user_reads_own_writes(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB, stale_replica: Database
+    ) -> None:
+        res = await authorized_client.put(
+            app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id),
+            json={"todo_update": {"id": test_todo.id, "task": "written to the primary", "completed": True}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        res = await authorized_client.get(app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["task"] == "written to the primary"
+
+    async def test_failed_writes_leave_reads_on_replica(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, db: Database, stale_replica: Database
+    ) -> None:
+        # only on the primary, the replica's snapshot is older
+        todo = await TodosRepository(db).create_todo(
+            new_todo=TodoIn(task="not replicated", completed=False), requesting_user=test_user
+        )
+        todo_url = app.url_path_for("todos:get-todo-by-id", todo_id=todo.id)
+
+        res = await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=999999))
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+        res = await authorized_client.get(todo_url)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todo"), json={"new_todo": {"task": "a write", "completed": False}}
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        res = await authorized_client.get(todo_url)
+        assert res.status_code == status.HTTP_200_OK
+
+
+class TestRecentWrites:
+    def test_writes_expire_after_the_window(self) -> None:
+        recent_writes = RecentWrites(window=60)
+        recent_writes.record(1)
+        assert recent_writes.wrote_recently(1)
+        assert not recent_writes.wrote_recently(2)
+
+        recent_writes.window = 0
+        recent_writes.record(2)
+        assert not recent_writes.wrote_recently(1)
+        assert not recent_writes.wrote_recently(2)
+
+
+class TestCompiledQueries:
+    def test_named_params_become_positional(self) -> None:
+        compiled = compile_query("SELECT x::int FROM t WHERE a = :a AND b = CAST(:b AS text) OR a > :a;")
+        assert compiled.sql == "SELECT x::int FROM t WHERE a = $1 AND b = CAST($2 AS text) OR a > $1;"
+        assert compiled.params == ("a", "b")
+        assert compiled.args({"b": "two", "a": 1, "unused": None}) == [1, "two"]
+
+    def test_queries_are_compiled_once(self) -> None:
+        query = "SELECT :value;"
+        assert compile_query(query) is compile_query(query)
+
+
+@pytest.mark.asyncio
+class TestPreparedStatements:
+    async def test_statements_survive_a_schema_change(self, db: Database) -> None:
+        prepared = PreparedDatabase(str(db.url))
+        await prepared.connect()
+        try:
+            await prepared.execute("CREATE TABLE prepared_statement_test (id int PRIMARY KEY, name text);")
+            await prepared.execute("INSERT INTO prepared_statement_test VALUES (1, 'one');")
+            query = "SELECT * FROM prepared_statement_test WHERE id = :id;"
+            async with prepared.connection():
+                # pin one connection so the second call hits the statement cached by the first
+                assert dict(await prepared.fetch_one(query, {"id": 1})) == {"id": 1, "name": "one"}
+                await prepared.execute("ALTER TABLE prepared_statement_test ADD COLUMN done boolean DEFAULT false;")
+                assert dict(await prepared.fetch_one(query, {"id": 1})) == {"id": 1, "name": "one", "done": False}
+        finally:
+            await prepared.execute("DROP TABLE IF EXISTS prepared_statement_test;")
+            await prepared.disconnect()
+
+
+class TestStatementNames:
+    def test_repository_constants_are_named(self) -> None:
+        from app.db.repositories.todos import GET_TODO_COUNTERS_QUERY
+
+        assert statement_name(GET_TODO_COUNTERS_QUERY) == "GET_TODO_COUNTERS_QUERY"
+
+    def test_formatted_templates_are_named(self) -> None:
+        from app.db.repositories.todos import CREATE_TODOS_BATCH_QUERY
+
+        query = CREATE_TODOS_BATCH_QUERY.format(rows="(:task_0, :completed_0, :owner), (:task_1, :completed_1, :owner)")
+        assert statement_name(query) == "CREATE_TODOS_BATCH_QUERY"
+
+    def test_other_queries_are_unnamed(self) -> None:
+        assert statement_name("SELECT 1") == "unnamed"
+
+    def test_query_log_server_timing(self) -> None:
+        query_log = QueryLog()
+        query_log.statements.append(QueryStat("GET_TODO_COUNTERS_QUERY", 0.0015, 1))
+        query_log.statements.append(QueryStat("unnamed", 0.0005, 0))
+        assert query_log.server_timing() == 'db;dur=2.00;desc="2 queries"'
+        assert query_log.as_dict()["statements"][0] == {"name": "GET_TODO_COUNTERS_QUERY", "ms": 1.5, "rows": 1}
@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from fastapi import FastAPI, status
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestHealthRoutes:
+    async def test_liveness(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("health:liveness"))
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_readiness_reports_pool_stats(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("health:readiness"))
+        assert res.status_code == status.HTTP_200_OK
+        body = res.json()
+        assert body["status"] == "ok"
+        assert body["pool"]["max_size"] >= body["pool"]["min_size"]
+        assert body["pool"]["acquire_timeouts"] == 0
+
+    async def test_exhausted_pool_returns_503(self, app: FastAPI, client: AsyncClient, monkeypatch) -> None:
+        class BusyPool:
+            async def acquire(self, timeout: float) -> None:
+                raise asyncio.TimeoutError()
+
+        pool = app.state._db_pool
+        monkeypatch.setattr(pool, "_pool", BusyPool())
+        res = await client.post(
+            app.url_path_for("users:login-email-and-password"),
+            data={"username": "nobody@example.com", "password": "wrong password"},
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert res.headers["retry-after"] == "1"
+        assert pool.stats()["acquire_timeouts"] == 1
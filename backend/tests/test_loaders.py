@@ -0,0 +1,51 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from app.db.loaders import DataLoader, LoaderRegistry
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestDataLoader:
+    async def test_loads_in_the_same_tick_share_one_batch(self) -> None:
+        batches: List[List[int]] = []
+
+        async def load_squares(keys: List[int]) -> Dict[int, int]:
+            batches.append(keys)
+            return {key: key * key for key in keys}
+
+        loader = DataLoader(load_squares)
+        results = await asyncio.gather(loader.load(2), loader.load(3), loader.load(2))
+        assert results == [4, 9, 4]
+        assert batches == [[2, 3]]
+
+    async def test_results_are_memoized_until_cleared(self) -> None:
+        batches: List[List[int]] = []
+
+        async def load_keys(keys: List[int]) -> Dict[int, int]:
+            batches.append(keys)
+            return {key: key for key in keys}
+
+        loader = DataLoader(load_keys)
+        await loader.load(1)
+        await loader.load(1)
+        assert len(batches) == 1
+        loader.clear(1)
+        await loader.load(1)
+        assert len(batches) == 2
+
+    async def test_missing_keys_resolve_to_none(self) -> None:
+        async def load_nothing(keys: List[int]) -> Dict[int, int]:
+            return {}
+
+        assert await DataLoader(load_nothing).load(1) is None
+
+    async def test_registry_returns_the_same_loader_per_name(self) -> None:
+        async def load_nothing(keys: List[int]) -> Dict[int, int]:
+            return {}
+
+        registry = LoaderRegistry()
+        assert registry.get("things", load_nothing) is registry.get("things", load_nothing)
+        assert registry.get("things", load_nothing) is not registry.get("others", load_nothing)
@@ -0,0 +1,111 @@
+from typing import Any, Optional
+import pytest
+from httpx import AsyncClient
+from fastapi import FastAPI, status
+
+from app.api.middleware import MetricsMiddleware
+from app.api.routes import metrics
+from app.core.metrics import REGISTRY, Counter, Histogram, Metric, Registry
+from app.models.user import UserInDB
+
+
+class TestPrometheusRendering:
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        registry = Registry()
+        histogram = registry.register(Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "todos:get-todo-by-id")
+        lines = registry.render().splitlines()
+        assert "# TYPE latency_seconds histogram" in lines
+        assert 'latency_seconds_bucket{route="todos:get-todo-by-id",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{route="todos:get-todo-by-id",le="1.0"} 3' in lines
+        assert 'latency_seconds_bucket{route="todos:get-todo-by-id",le="+Inf"} 4' in lines
+        assert 'latency_seconds_count{route="todos:get-todo-by-id"} 4' in lines
+        assert 'latency_seconds_sum{route="todos:get-todo-by-id"} 3.65' in lines
+
+    def test_counter_label_values_are_escaped(self) -> None:
+        registry = Registry()
+        counter = registry.register(Counter("events", "Events.", ("name",)))
+        counter.inc('say "hi"\n', amount=2)
+        assert 'events_total{name="say \\"hi\\"\\n"} 2' in registry.render()
+
+    def test_metrics_must_implement_samples(self) -> None:
+        class Incomplete(Metric):
+            type = "gauge"
+
+        with pytest.raises(TypeError):
+            Incomplete("incomplete", "Incomplete.")
+
+    def test_metric_names_are_unique(self) -> None:
+        registry = Registry()
+        registry.register(Counter("events", "Events."))
+        with pytest.raises(ValueError):
+            registry.register(Counter("events", "Events."))
+
+
+@pytest.mark.asyncio
+class TestQueryInstrumentation:
+    async def test_responses_report_their_queries(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:get-todo-stats"))
+        assert res.status_code == status.HTTP_200_OK
+        server_timing = res.headers["server-timing"]
+        assert server_timing.startswith("db;dur=")
+        assert 'desc="0 queries"' not in server_timing
+
+    async def test_metrics_endpoint_exposes_query_histograms(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, monkeypatch: Any
+    ) -> None:
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", "scraper-token")
+        await authorized_client.get(app.url_path_for("todos:get-todo-stats"))
+        res = await authorized_client.get(
+            app.url_path_for("metrics:prometheus"), headers={"Authorization": "Bearer scraper-token"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-type"].startswith("text/plain")
+        assert 'nextup_db_query_duration_seconds_count{statement="GET_TODO_COUNTERS_QUERY"}' in res.text
+        assert "nextup_db_queries_per_request_bucket" in res.text
+
+
+@pytest.mark.asyncio
+class TestMetricsEndpoint:
+    async def test_metrics_are_not_served_without_a_token_setting(
+        self, app: FastAPI, client: AsyncClient, monkeypatch: Any
+    ) -> None:
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+        res = await client.get(app.url_path_for("metrics:prometheus"))
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.parametrize("authorization", (None, "Bearer wrong-token", "Basic scraper-token"))
+    async def test_scrapers_need_the_token(
+        self, app: FastAPI, client: AsyncClient, monkeypatch: Any, authorization: Optional[str]
+    ) -> None:
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", "scraper-token")
+        headers = {"Authorization": authorization} if authorization else {}
+        res = await client.get(app.url_path_for("metrics:prometheus"), headers=headers)
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+class TestRequestMetrics:
+    @pytest.fixture
+    def metered_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/echo/", name="test:echo")
+        async def echo(body: dict) -> dict:
+            return body
+
+        app.add_middleware(MetricsMiddleware)
+        return app
+
+    async def test_requests_are_labelled_with_the_route_name(self, metered_app: FastAPI) -> None:
+        async with AsyncClient(app=metered_app, base_url="http://testserver") as client:
+            await client.post("/echo/", json={"task": "x" * 300})
+            await client.get("/missing/")
+        rendered = REGISTRY.render()
+        assert 'nextup_http_request_duration_seconds_count{route="test:echo",method="POST",status="200"}' in rendered
+        assert 'nextup_http_request_duration_seconds_count{route="unmatched",method="GET",status="404"}' in rendered
+        assert 'nextup_http_request_size_bytes_bucket{route="test:echo",le="256"} 0' in rendered
+        assert "nextup_http_requests_in_flight 0" in rendered
@@ -0,0 +1,127 @@
+import asyncio
+from typing import Any, Callable, List
+import asyncpg
+import pytest
+from asgi_lifespan import LifespanManager
+
+from app.db.notifications import RESYNC_EVENT, TodoChangeListener
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_listener(max_queue: int = 10) -> TodoChangeListener:
+    # never started, notifications are fed in directly
+    return TodoChangeListener("postgresql://localhost/unused", max_queue=max_queue, reconnect_interval=1.0)
+
+
+class FakeConnection:
+    """
+    A LISTEN connection whose health check fails when `drops` is set, as if the server had gone away
+    """
+    def __init__(self, drops: bool) -> None:
+        self.drops = drops
+        self.listening = False
+        self.closed = False
+
+    async def add_listener(self, channel: str, callback: Callable) -> None:
+        self.listening = True
+
+    async def execute(self, query: str) -> None:
+        if self.drops:
+            raise ConnectionResetError("server closed the connection")
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class TestTodoChangeListener:
+    async def test_events_only_reach_the_owners_subscriptions(self) -> None:
+        listener = make_listener()
+        with listener.subscribe(1) as mine, listener.subscribe(2) as theirs:
+            listener._on_notification(None, 0, "todo_changes", '{"op": "update", "id": 5, "owner": 1}')
+            assert await asyncio.wait_for(mine.get(), timeout=1) == {"op": "update", "id": 5, "owner": 1}
+            assert theirs.queue.empty()
+        assert listener.stats()["subscriptions"] == 0
+
+    async def test_slow_subscribers_get_a_resync_instead_of_a_backlog(self) -> None:
+        listener = make_listener(max_queue=2)
+        with listener.subscribe(1) as subscription:
+            for id in range(5):
+                listener.publish({"op": "insert", "id": id, "owner": 1}, user_id=1)
+            assert subscription.queue.qsize() == 1
+            assert await subscription.get() == RESYNC_EVENT
+            assert listener.stats()["overflows"] == 1
+
+            # once caught up, events flow again
+            listener.publish({"op": "delete", "id": 9, "owner": 1}, user_id=1)
+            assert await subscription.get() == {"op": "delete", "id": 9, "owner": 1}
+
+    async def test_malformed_notifications_are_ignored(self) -> None:
+        listener = make_listener()
+        with listener.subscribe(1) as subscription:
+            listener._on_notification(None, 0, "todo_changes", "not json")
+            assert subscription.queue.empty()
+
+    async def test_reconnecting_sends_a_resync(self, monkeypatch: Any) -> None:
+        connections: List[FakeConnection] = []
+
+        async def connect(dsn: str) -> FakeConnection:
+            # only the first connection drops
+            connections.append(FakeConnection(drops=not connections))
+            return connections[-1]
+
+        monkeypatch.setattr(asyncpg, "connect", connect)
+        listener = TodoChangeListener("postgresql://localhost/unused", max_queue=10, reconnect_interval=0.01)
+        with listener.subscribe(1) as subscription:
+            listener.start()
+            try:
+                # one resync as soon as the connection is lost...
+                assert await asyncio.wait_for(subscription.get(), timeout=1) == RESYNC_EVENT
+                # ...and another once listening again, for the changes made in between
+                assert await asyncio.wait_for(subscription.get(), timeout=1) == RESYNC_EVENT
+                assert len(connections) == 2
+                assert connections[0].closed
+                assert connections[1].listening
+                assert listener.stats()["connected"]
+            finally:
+                await listener.stop()
+
+    async def test_stop_ends_the_loop_when_the_cancellation_is_swallowed(self, monkeypatch: Any) -> None:
+        connecting = asyncio.Event()
+
+        async def connect(dsn: str) -> FakeConnection:
+            # like asyncpg.connect's wait_for before Python 3.10 (bpo-42130), the cancellation is lost
+            connecting.set()
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                pass
+            return FakeConnection(drops=False)
+
+        monkeypatch.setattr(asyncpg, "connect", connect)
+        listener = TodoChangeListener("postgresql://localhost/unused", max_queue=10, reconnect_interval=0.01)
+        listener.start()
+        await asyncio.wait_for(connecting.wait(), timeout=1)
+        # asyncio.wait, unlike wait_for, doesn't cancel stop() and with it the listener again on timeout
+        stopping = asyncio.ensure_future(listener.stop())
+        done, _ = await asyncio.wait({stopping}, timeout=1)
+        if not done:
+            listener._task.cancel()
+        assert stopping in done
+        assert not listener.stats()["connected"]
+
+
+class TestListenerShutdown:
+    async def test_app_shuts_down_promptly(self) -> None:
+        from app.api.server import get_application
+
+        app = get_application()
+
+        async def run_briefly() -> None:
+            async with LifespanManager(app):
+                await asyncio.sleep(0.1)
+
+        await asyncio.wait_for(run_briefly(), timeout=10)
@@ -101,4 +101,18 @@ class TestProfileManagement:
         res = await authorized_client.put(
             app.url_path_for("profiles:update-own-profile"), json={"profile_update": {attr: value}},
         )
-        assert res.status_code == status_code
\ No newline at end of file
+        assert res.status_code == status_code
+
+    async def test_profile_updates_honour_if_match(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("profiles:get-profile-by-username", username=test_user.username)
+        )
+        etag = res.headers["etag"]
+        url = app.url_path_for("profiles:update-own-profile")
+
+        res = await authorized_client.put(url, json={"profile_update": {"bio": "first"}}, headers={"If-Match": etag})
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.put(url, json={"profile_update": {"bio": "second"}}, headers={"If-Match": etag})
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
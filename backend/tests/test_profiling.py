@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from app.core.profiling import TaskSampler, parse_sample_rates
+
+
+def spin(seconds: float) -> None:
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        pass
+
+
+async def fake_query() -> None:
+    await asyncio.sleep(0.05)
+
+
+async def fake_handler() -> None:
+    await fake_query()
+    spin(0.05)
+
+
+class TestSampleRates:
+    def test_parses_route_rates(self) -> None:
+        assert parse_sample_rates(["todos:search-todos=0.25", " todos:get-all-todos=1"]) == {
+            "todos:search-todos": 0.25,
+            "todos:get-all-todos": 1.0,
+        }
+
+    @pytest.mark.parametrize("item", ["todos:search-todos", "=0.5", "todos:search-todos=2"])
+    def test_rejects_malformed_rates(self, item: str) -> None:
+        with pytest.raises(ValueError):
+            parse_sample_rates([item])
+
+
+@pytest.mark.asyncio
+class TestTaskSampler:
+    async def test_samples_awaited_and_running_code(self) -> None:
+        task = asyncio.ensure_future(fake_handler())
+        sampler = TaskSampler(task, thread_id=threading.get_ident(), interval=0.001)
+        sampler.start()
+        await task
+        sampler.stop()
+        stacks = [line.rsplit(" ", 1)[0].split(";") for line in sampler.folded().splitlines()]
+        # suspended in the fake query, the stack ends in the future being awaited
+        assert any("fake_query" in stack[1] and stack[-1].startswith("[await") for stack in stacks)
+        # running, the plain function call under the coroutine is on the stack
+        assert any(stack[-1].startswith("spin ") for stack in stacks)
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.responses import TrustedJSONResponse, etag_matches, make_etag
+from app.models.core import from_trusted_record
+from app.models.todo import CompactTodoList, CompactTodoPage, Todo, TodoInDB, TodoPage
+
+
+NOW = datetime(2021, 3, 1, 12, 30, tzinfo=timezone.utc)
+TODO_RECORD = {
+    "id": 1, "task": "ship it", "completed": False, "owner": 2, "created_at": NOW, "updated_at": NOW,
+    "existing_owner": 2,
+}
+
+
+class TestTrustedRecords:
+    def test_unknown_columns_are_dropped(self) -> None:
+        todo = from_trusted_record(TodoInDB, TODO_RECORD)
+        assert todo == TodoInDB(**TODO_RECORD)
+        assert "existing_owner" not in todo.dict()
+
+    def test_values_override_record(self) -> None:
+        assert from_trusted_record(Todo, TODO_RECORD, completed=True).completed is True
+
+    def test_renders_like_the_validated_response(self) -> None:
+        page = TodoPage.construct(todos=[from_trusted_record(Todo, TODO_RECORD)], next_cursor="abc")
+        validated = jsonable_encoder(TodoPage(todos=[Todo(**TODO_RECORD)], next_cursor="abc"))
+        assert json.loads(TrustedJSONResponse(page).body) == validated
+
+        todo = from_trusted_record(TodoInDB, TODO_RECORD)
+        assert json.loads(TrustedJSONResponse(todo).body) == jsonable_encoder(TodoInDB(**TODO_RECORD))
+
+
+class TestCompactTodoList:
+    def test_columns_match_the_rows(self) -> None:
+        records = [{**TODO_RECORD, "id": i, "completed": i % 2 == 0, "task": "same " + "task"} for i in range(3)]
+        compact = CompactTodoList(records, next_cursor="abc")
+        assert len(compact) == 3
+        columns = compact.as_columns()
+        assert columns == {
+            "id": [0, 1, 2],
+            "task": ["same task"] * 3,
+            "completed": [True, False, True],
+            "owner": [2, 2, 2],
+            "next_cursor": "abc",
+        }
+        assert CompactTodoPage(**columns)
+        # identical tasks share a single string object
+        assert compact.tasks[0] is compact.tasks[2]
+
+
+class TestETags:
+    def test_etag_changes_with_version(self) -> None:
+        assert make_etag(1, NOW) == make_etag(1, NOW)
+        assert make_etag(1, NOW) != make_etag(1, NOW.replace(microsecond=1))
+
+    def test_matching_is_weak_and_handles_lists(self) -> None:
+        etag = make_etag(1, NOW)
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'W/"other", {etag[2:]}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('W/"other"', etag)
+        assert not etag_matches(None, etag)
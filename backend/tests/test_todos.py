@@ -1,16 +1,20 @@
-from typing import List, Dict, Union, Optional
+import asyncio
+import json
+from typing import List, Dict, Union
+import asyncpg
 import pytest
 from httpx import AsyncClient
 from fastapi import FastAPI, status
 from databases import Database
+from app.api.routes.todos import todo_etag
 from app.db.repositories.todos import TodosRepository
-from app.models.todo import Todo, TodoIn, TodoInDB, TodoPublic
+from app.models.todo import TodoIn, TodoInDB, TodoPublic
 from app.models.user import UserInDB
 
 pytestmark = pytest.mark.asyncio
 
 @pytest.fixture
-def new_TODO():
+def new_todo():
     return TodoIn(
         task="test TODO",
         completed=False
@@ -21,7 +25,7 @@ async def test_todos_list(db: Database, test_user2: UserInDB) -> List[TodoInDB]:
     todo_repo = TodosRepository(db)
     return [
         await todo_repo.create_todo(
-            new_todo=Todo(
+            new_todo=TodoIn(
                 task=f"test todo {i}", completed=False
             ),
             requesting_user=test_user2,
@@ -29,6 +33,16 @@ async def test_todos_list(db: Database, test_user2: UserInDB) -> List[TodoInDB]:
         for i in range(5)
     ]
 
+@pytest.fixture
+async def test_own_todos_list(db: Database, test_user: UserInDB) -> List[TodoInDB]:
+    todo_repo = TodosRepository(db)
+    return [
+        await todo_repo.create_todo(
+            new_todo=TodoIn(task=f"own todo {i}", completed=i % 2 == 0), requesting_user=test_user
+        )
+        for i in range(5)
+    ]
+
 class TestTodosRoutes:
     """
     Check each todo route to ensure none return 404s
@@ -38,7 +52,7 @@ class TestTodosRoutes:
         assert res.status_code != status.HTTP_404_NOT_FOUND
         res = await client.get(app.url_path_for("todos:get-todo-by-id", todo_id=1))
         assert res.status_code != status.HTTP_404_NOT_FOUND
-        res = await client.get(app.url_path_for("todos:list-all-user-todos"))
+        res = await client.get(app.url_path_for("todos:get-all-todos"))
         assert res.status_code != status.HTTP_404_NOT_FOUND
         res = await client.put(app.url_path_for("todos:update-todo-by-id", todo_id=1))
         assert res.status_code != status.HTTP_404_NOT_FOUND
@@ -55,7 +69,7 @@ class TestCreateTodo:
         )
         assert res.status_code == status.HTTP_201_CREATED
         created_todo = TodoPublic(**res.json())
-        assert created_todo.task == new_todo.TodoPublic
+        assert created_todo.task == new_todo.task
         assert created_todo.completed == new_todo.completed
         assert created_todo.owner == test_user.id
 
@@ -70,11 +84,11 @@ class TestCreateTodo:
     @pytest.mark.parametrize(
         "invalid_payload, status_code",
         (
-            (None, "task": "test1"),
-            ({}, "completed": "false"),
-            ({"task": "test2"}, "completed": 10.00),
+            (None, 422),
+            ({}, 422),
+            ({"task": "test2"}, 422),
             ({"completed": 10.00}, 422),
-            ({"name": "test", "description": "test"}),
+            ({"name": "test", "description": "test"}, 422),
         ),
     )
 
@@ -89,4 +103,479 @@ class TestCreateTodo:
         res = await authorized_client.post(
             app.url_path_for("todos:create-todo"), json={"new_todo": invalid_payload}
         )
-        assert res.status_code == status_code
\ No newline at end of file
+        assert res.status_code == status_code
+
+class TestListTodos:
+    async def test_todos_are_paginated_with_cursor(
+        self, app: FastAPI, authorized_client: AsyncClient, test_own_todos_list: List[TodoInDB]
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:get-all-todos"), params={"limit": 2})
+        assert res.status_code == status.HTTP_200_OK
+        first_page = res.json()
+        assert len(first_page["todos"]) == 2
+        assert first_page["next_cursor"] is not None
+
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-all-todos"), params={"limit": 2, "after": first_page["next_cursor"]},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        second_page = res.json()
+        first_ids = [todo["id"] for todo in first_page["todos"]]
+        second_ids = [todo["id"] for todo in second_page["todos"]]
+        assert not set(first_ids) & set(second_ids)
+        assert max(first_ids) < min(second_ids)
+
+    async def test_last_page_has_no_cursor(
+        self, app: FastAPI, authorized_client: AsyncClient, test_own_todos_list: List[TodoInDB]
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:get-all-todos"), params={"limit": 500})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["next_cursor"] is None
+
+    async def test_only_the_callers_todos_are_listed(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+        test_own_todos_list: List[TodoInDB],
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-all-todos"), params={"limit": 500, "format": "compact"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        compact = res.json()
+        assert set(compact["owner"]) == {test_user.id}
+        assert {todo.id for todo in test_own_todos_list} <= set(compact["id"])
+        assert not {todo.id for todo in test_todos_list} & set(compact["id"])
+
+    async def test_unauthenticated_user_cannot_list_todos(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("todos:get-all-todos"))
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_completed_filter(
+        self, app: FastAPI, authorized_client: AsyncClient, test_own_todos_list: List[TodoInDB]
+    ) -> None:
+        seeded_ids = {todo.id for todo in test_own_todos_list}
+        completed_ids = {todo.id for todo in test_own_todos_list if todo.completed}
+        assert completed_ids and completed_ids != seeded_ids
+
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-all-todos"), params={"completed": True, "limit": 500}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        todos = res.json()["todos"]
+        assert todos
+        assert all(todo["completed"] for todo in todos)
+        assert {todo["id"] for todo in todos} & seeded_ids == completed_ids
+
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-all-todos"), params={"completed": False, "limit": 500}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        todos = res.json()["todos"]
+        assert not any(todo["completed"] for todo in todos)
+        assert {todo["id"] for todo in todos} & seeded_ids == seeded_ids - completed_ids
+
+    async def test_compact_format_returns_columns(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_own_todos_list: List[TodoInDB]
+    ) -> None:
+        params = {"limit": 5}
+        full = (await authorized_client.get(app.url_path_for("todos:get-all-todos"), params=params)).json()
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-all-todos"), params={**params, "format": "compact"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        compact = res.json()
+        assert compact["id"] == [todo["id"] for todo in full["todos"]]
+        assert compact["task"] == [todo["task"] for todo in full["todos"]]
+        assert compact["completed"] == [todo["completed"] for todo in full["todos"]]
+        assert compact["owner"] == [test_user.id] * len(full["todos"])
+        assert compact["next_cursor"] == full["next_cursor"]
+
+    @pytest.mark.parametrize("cursor", ("not-a-cursor", "MQ", "%%%"))
+    async def test_invalid_cursor_returns_400(
+        self, app: FastAPI, authorized_client: AsyncClient, cursor: str
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:get-all-todos"), params={"after": cursor})
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestExportTodos:
+    async def test_user_can_export_todos_as_ndjson(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todo: TodoInDB
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in res.text.splitlines()]
+        assert rows
+        assert all(row["owner"] == test_user.id for row in rows)
+        assert test_todo.id in [row["id"] for row in rows]
+
+    async def test_user_can_export_todos_as_csv(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"), params={"format": "csv"})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-type"].startswith("text/csv")
+        header, *rows = res.text.splitlines()
+        assert header == "id,task,completed,owner,created_at,updated_at"
+        assert rows
+
+    async def test_unauthenticated_user_cannot_export(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("todos:export-user-todos"))
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestTodoBatch:
+    async def test_user_can_create_todos_in_batch(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        new_todos = [{"task": f"batch todo {i}", "completed": i % 2 == 0} for i in range(3)]
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todos-batch"), json={"new_todos": new_todos}
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        results = res.json()
+        assert [result["status_code"] for result in results] == [201, 201, 201]
+        assert [result["todo"]["task"] for result in results] == [todo["task"] for todo in new_todos]
+        assert all(result["todo"]["owner"] == test_user.id for result in results)
+
+    async def test_batch_update_reports_status_per_item(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_todo: TodoInDB,
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        todo_updates = [
+            {"id": test_todo.id, "completed": True},
+            {"id": test_todos_list[0].id, "completed": True},
+            {"id": 999999, "completed": True},
+        ]
+        res = await authorized_client.put(
+            app.url_path_for("todos:update-todos-batch"), json={"todo_updates": todo_updates}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        results = res.json()
+        assert [result["status_code"] for result in results] == [200, 403, 404]
+        assert results[0]["todo"]["completed"] is True
+        assert results[0]["todo"]["task"] == test_todo.task
+
+    async def test_batch_delete_reports_status_per_item(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todos_list: List[TodoInDB]
+    ) -> None:
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todos-batch"), json={"new_todos": [{"task": "to delete", "completed": False}]}
+        )
+        created_id = res.json()[0]["id"]
+        res = await authorized_client.post(
+            app.url_path_for("todos:delete-todos-batch"),
+            json={"todo_ids": [created_id, test_todos_list[0].id, 999999]},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert [result["status_code"] for result in res.json()] == [200, 403, 404]
+
+    async def test_empty_batch_is_rejected(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        res = await authorized_client.post(app.url_path_for("todos:create-todos-batch"), json={"new_todos": []})
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestTodoStats:
+    async def test_stats_follow_writes(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, db: Database
+    ) -> None:
+        url = app.url_path_for("todos:get-todo-stats")
+        before = (await authorized_client.get(url)).json()
+
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todos-batch"),
+            json={"new_todos": [{"task": f"counted {i}", "completed": i == 0} for i in range(3)]},
+        )
+        created = [result["id"] for result in res.json()]
+        await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=created[1]))
+
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        after = res.json()
+        assert after["total"] == before["total"] + 2
+        assert after["completed"] == before["completed"] + 1
+        assert after["open"] == after["total"] - after["completed"]
+
+    async def test_reconcile_repairs_drifted_counters(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todo: TodoInDB, db: Database
+    ) -> None:
+        url = app.url_path_for("todos:get-todo-stats")
+        expected = (await authorized_client.get(url)).json()
+        await db.execute("UPDATE todo_counters SET total = total + 10 WHERE owner = :owner", {"owner": test_user.id})
+
+        assert await TodosRepository(db).reconcile_todo_counters() >= 1
+        assert (await authorized_client.get(url)).json() == expected
+
+
+class TestSearchTodos:
+    async def test_search_matches_words_and_substrings(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        for task in ("Renew passport", "Buy running shoes", "Call the plumber"):
+            await authorized_client.post(
+                app.url_path_for("todos:create-todo"), json={"new_todo": {"task": task, "completed": False}}
+            )
+        url = app.url_path_for("todos:search-todos")
+
+        # stemmed full-text match - "runs" finds "running"
+        res = await authorized_client.get(url, params={"q": "runs"})
+        assert res.status_code == status.HTTP_200_OK
+        assert [todo["task"] for todo in res.json()["todos"]] == ["Buy running shoes"]
+
+        # partial words fall back to substring matching
+        res = await authorized_client.get(url, params={"q": "plumb"})
+        assert [todo["task"] for todo in res.json()["todos"]] == ["Call the plumber"]
+        assert all(todo["owner"] == test_user.id for todo in res.json()["todos"])
+
+    async def test_search_is_paginated(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        for i in range(3):
+            await authorized_client.post(
+                app.url_path_for("todos:create-todo"), json={"new_todo": {"task": f"water plant {i}", "completed": False}}
+            )
+        url = app.url_path_for("todos:search-todos")
+        first = (await authorized_client.get(url, params={"q": "water", "limit": 2})).json()
+        assert len(first["todos"]) == 2
+        second = (await authorized_client.get(url, params={"q": "water", "limit": 2, "after": first["next_cursor"]})).json()
+        assert second["todos"]
+        assert not {todo["id"] for todo in first["todos"]} & {todo["id"] for todo in second["todos"]}
+
+
+class TestTodoChanges:
+    async def test_sync_returns_only_changes_since_cursor(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todo: TodoInDB
+    ) -> None:
+        url = app.url_path_for("todos:list-todo-changes")
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        first_sync = res.json()
+        assert test_todo.id in [todo["id"] for todo in first_sync["todos"]]
+        assert all(todo["owner"] == test_user.id for todo in first_sync["todos"])
+        assert first_sync["deleted"] == []
+
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todo"), json={"new_todo": {"task": "synced", "completed": False}}
+        )
+        created_id = res.json()["id"]
+        await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=test_todo.id))
+
+        res = await authorized_client.get(url, params={"since": first_sync["next_cursor"]})
+        assert res.status_code == status.HTTP_200_OK
+        second_sync = res.json()
+        assert [todo["id"] for todo in second_sync["todos"]] == [created_id]
+        assert second_sync["deleted"] == [test_todo.id]
+
+    async def test_sync_is_paginated(self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB) -> None:
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todos-batch"),
+            json={"new_todos": [{"task": f"paged sync {i}", "completed": False} for i in range(3)]},
+        )
+        created_ids = [result["id"] for result in res.json()]
+        url = app.url_path_for("todos:list-todo-changes")
+
+        synced_ids: List[int] = []
+        params = {"limit": 2}
+        while True:
+            res = await authorized_client.get(url, params=params)
+            assert res.status_code == status.HTTP_200_OK
+            page = res.json()
+            assert len(page["todos"]) <= 2
+            synced_ids += [todo["id"] for todo in page["todos"]]
+            params = {"limit": 2, "since": page["next_cursor"]}
+            if not page["has_more"]:
+                break
+        assert len(synced_ids) == len(set(synced_ids))
+        assert set(created_ids) <= set(synced_ids)
+
+        # the cursor of the last page starts the next sync
+        res = await authorized_client.get(url, params=params)
+        assert not set(created_ids) & {todo["id"] for todo in res.json()["todos"]}
+
+    async def test_sync_from_before_pruned_tombstones_requires_full_resync(
+        self, app: FastAPI, authorized_client: AsyncClient, db: Database, test_todo: TodoInDB
+    ) -> None:
+        url = app.url_path_for("todos:list-todo-changes")
+        stale_cursor = (await authorized_client.get(url)).json()["next_cursor"]
+        await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=test_todo.id))
+        await db.execute(
+            "UPDATE todo_tombstones SET deleted_at = now() - interval '31 days' WHERE id = :id;", {"id": test_todo.id}
+        )
+        res = await authorized_client.post(
+            app.url_path_for("todos:create-todo"), json={"new_todo": {"task": "deleted recently", "completed": False}}
+        )
+        recent_id = res.json()["id"]
+        await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=recent_id))
+
+        assert await TodosRepository(db).prune_todo_tombstones(retention_days=30) >= 1
+        remaining = await db.fetch_all(
+            "SELECT id FROM todo_tombstones WHERE id = ANY(:ids);", {"ids": [test_todo.id, recent_id]}
+        )
+        assert [record["id"] for record in remaining] == [recent_id]
+
+        res = await authorized_client.get(url, params={"since": stale_cursor})
+        assert res.status_code == status.HTTP_410_GONE
+
+        # a full sync hands out a cursor past the pruned tombstones
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(url, params={"since": res.json()["next_cursor"]})
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_invalid_sync_cursor_returns_400(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        res = await authorized_client.get(app.url_path_for("todos:list-todo-changes"), params={"since": "%%%"})
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+async def wait_for_lock_waiters(connection: asyncpg.Connection, count: int) -> None:
+    # until `count` other sessions are blocked on a row lock
+    for _ in range(500):
+        waiting = await connection.fetchval("SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock'")
+        if waiting >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Expected {count} sessions waiting on a lock")
+
+
+class TestConditionalRequests:
+    async def test_unchanged_todo_returns_304(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        url = app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id)
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        etag = res.headers["etag"]
+        assert etag.startswith('W/"')
+
+        res = await authorized_client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res.content == b""
+
+    async def test_unchanged_list_returns_304(
+        self, app: FastAPI, authorized_client: AsyncClient, test_own_todos_list: List[TodoInDB]
+    ) -> None:
+        url = app.url_path_for("todos:get-all-todos")
+        res = await authorized_client.get(url)
+        res = await authorized_client.get(url, headers={"If-None-Match": res.headers["etag"]})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+    async def test_if_match_guards_updates(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        todo_url = app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id)
+        update_url = app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id)
+        etag = (await authorized_client.get(todo_url)).headers["etag"]
+        body = {"todo_update": {"id": test_todo.id, "task": "first writer", "completed": False}}
+
+        res = await authorized_client.put(update_url, json=body, headers={"If-Match": etag})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["etag"] != etag
+
+        # the same version can't be used to write twice
+        res = await authorized_client.put(update_url, json=body, headers={"If-Match": etag})
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+    async def test_concurrent_updates_with_the_same_if_match_only_write_once(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB, db: Database
+    ) -> None:
+        update_url = app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id)
+        # not fetched through the client - `databases` would keep that request's connection in this task's
+        # context, and both updates would inherit it and queue up on it instead of on the row lock
+        etag = todo_etag(test_todo)
+
+        async def update(task: str):
+            body = {"todo_update": {"id": test_todo.id, "task": task, "completed": False}}
+            return await authorized_client.put(update_url, json=body, headers={"If-Match": etag})
+
+        # hold the row from outside the app's pool, so both requests are past their If-Match check
+        # when they race for it
+        connection = await asyncpg.connect(str(db.url))
+        try:
+            async with connection.transaction():
+                await connection.execute("SELECT id FROM todos WHERE id = $1 FOR UPDATE", test_todo.id)
+                updates = asyncio.gather(update("first writer"), update("second writer"))
+                await wait_for_lock_waiters(connection, 2)
+        finally:
+            await connection.close()
+        responses = await updates
+        assert sorted(res.status_code for res in responses) == [
+            status.HTTP_200_OK,
+            status.HTTP_412_PRECONDITION_FAILED,
+        ]
+
+
+class TestUpdateAndDeleteTodo:
+    async def test_update_of_a_concurrently_deleted_todo_returns_404(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB, db: Database
+    ) -> None:
+        update_url = app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id)
+        body = {"todo_update": {"id": test_todo.id, "task": "too late", "completed": True}}
+        connection = await asyncpg.connect(str(db.url))
+        try:
+            async with connection.transaction():
+                await connection.execute("SELECT id FROM todos WHERE id = $1 FOR UPDATE", test_todo.id)
+                update = asyncio.ensure_future(authorized_client.put(update_url, json=body))
+                await wait_for_lock_waiters(connection, 1)
+                await connection.execute("DELETE FROM todos WHERE id = $1", test_todo.id)
+        finally:
+            await connection.close()
+        res = await update
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+    async def test_owner_can_update_todo(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        res = await authorized_client.put(
+            app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id),
+            json={"todo_update": {"id": test_todo.id, "task": "updated task", "completed": True}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        updated_todo = TodoPublic(**res.json())
+        assert updated_todo.task == "updated task"
+        assert updated_todo.completed is True
+
+    @pytest.mark.parametrize("method", ("put", "delete"))
+    async def test_mutating_other_users_todo_is_forbidden(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todos_list: List[TodoInDB], method: str
+    ) -> None:
+        todo = test_todos_list[0]
+        url = app.url_path_for(f"todos:{'update' if method == 'put' else 'delete'}-todo-by-id", todo_id=todo.id)
+        if method == "put":
+            res = await authorized_client.put(
+                url, json={"todo_update": {"id": todo.id, "task": todo.task, "completed": True}}
+            )
+        else:
+            res = await authorized_client.delete(url)
+        assert res.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_missing_todo_returns_404(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        res = await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=999999))
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_owner_can_delete_todo(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        res = await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=test_todo.id))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json() == test_todo.id
+
+
+class TestPopulatedTodo:
+    async def test_todo_owner_can_be_embedded(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todo: TodoInDB
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id), params={"populate_owner": True}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        owner = res.json()["owner"]
+        assert owner["id"] == test_user.id
+        assert owner["profile"]["user_id"] == test_user.id
+        assert "password" not in owner
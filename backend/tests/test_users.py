@@ -1,11 +1,16 @@
+import asyncio
 import pytest
+from datetime import datetime
+from fastapi import HTTPException
 from httpx import AsyncClient
 from fastapi import FastAPI
 
 from typing import List, Union, Type, Optional
 import jwt
 from pydantic import ValidationError
+from databases import Database
 from starlette.datastructures import Secret
+from starlette.requests import Request
 
 from starlette.status import (
     HTTP_200_OK, 
@@ -16,10 +21,16 @@ from starlette.status import (
     HTTP_422_UNPROCESSABLE_ENTITY,
 )
 
+from app.api.dependencies import rate_limit as rate_limit_dependencies
 from app.models.user import UserCreate, UserInDB, UserPublic
+from app.db.repositories.users import UsersRepository
+from app.services import auth_service
 
 from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.models.token import JWTMeta, JWTCreds, JWTPayload
+from app.services.token_cache import TokenCache
+from app.services.hashing import HashingPool, hash_secret, verify_secret
+from app.services.rate_limit import InMemoryRateLimitBackend, TokenBucketLimiter
 
 pytestmark = pytest.mark.asyncio
 
@@ -37,7 +48,7 @@ class TestUserRegistration:
         db: Database,
     ) -> None:
         user_repo = UsersRepository(db)
-        new_user = {"email": "christianwelch@gmail.com", "username": "christianwelch123", "password": "welchy"}
+        new_user = {"email": "christianwelch@gmail.com", "username": "christianwelch123", "password": "welchy123"}
 
         # make sure user doesn't exist yet
         user_in_db = await user_repo.get_user_by_email(email=new_user["email"])
@@ -61,7 +72,7 @@ class TestUserRegistration:
         "attr, value, status_code",
         (
             ("email", "christianwelch@gmail.com", 400),            
-            ("username", "christianwelch123rashakira", 400),
+            ("username", "christianwelch123", 400),
             ("email", "invalid_email@one@two.io", 422),
             ("password", "welchy", 422),
             ("username", "christianwelch#@$*&#&", 422),
@@ -176,6 +187,22 @@ class TestUserMe:
         res = await client.get(app.url_path_for("users:get-current-user"))
         assert res.status_code == HTTP_401_UNAUTHORIZED
 
+    async def test_deleted_user_cannot_access_own_data(
+        self, app: FastAPI, client: AsyncClient, db: Database,
+    ) -> None:
+        user = await UsersRepository(db).register_new_user(
+            new_user=UserCreate(email="vincent@pulpfiction.com", username="vincentvega", password="royalewithcheese")
+        )
+        token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+        headers = {"Authorization": f"{JWT_TOKEN_PREFIX} {token}"}
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        # the token and its cached user outlive the account
+        await db.execute("DELETE FROM users WHERE id = :id", {"id": user.id})
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
     @pytest.mark.parametrize("jwt_prefix", (("",), ("value",), ("Token",), ("JWT",), ("Swearer",),))
     async def test_user_cannot_access_own_data_with_incorrect_jwt_prefix(
         self, app: FastAPI, client: AsyncClient, test_user: UserInDB, jwt_prefix: str,
@@ -184,4 +211,134 @@ class TestUserMe:
         res = await client.get(
             app.url_path_for("users:get-current-user"), headers={"Authorization": f"{jwt_prefix} {token}"}
         )
-        assert res.status_code == HTTP_401_UNAUTHORIZED
\ No newline at end of file
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+
+class TestTokenCache:
+    def _payload(self, user: UserInDB, **kwargs) -> JWTPayload:
+        return JWTPayload(sub=user.email, username=user.username, **kwargs)
+
+    async def test_cached_token_is_served_until_invalidated(self, test_user: UserInDB) -> None:
+        cache = TokenCache(max_size=10, ttl=60)
+        assert cache.get("token") is None
+        cache.set("token", claims=self._payload(test_user), user=test_user)
+        assert cache.get("token").user.id == test_user.id
+        cache.invalidate_user(username=test_user.username)
+        assert cache.get("token") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    async def test_entries_never_outlive_token_expiry(self, test_user: UserInDB) -> None:
+        cache = TokenCache(max_size=10, ttl=60)
+        expired = self._payload(test_user, exp=datetime.timestamp(datetime.utcnow()) - 1)
+        cache.set("token", claims=expired, user=test_user)
+        assert cache.get("token") is None
+
+    async def test_least_recently_used_entry_is_evicted(self, test_user: UserInDB) -> None:
+        cache = TokenCache(max_size=2, ttl=60)
+        for token in ("first", "second"):
+            cache.set(token, claims=self._payload(test_user), user=test_user)
+        cache.get("first")
+        cache.set("third", claims=self._payload(test_user), user=test_user)
+        assert cache.get("second") is None
+        assert cache.get("first") is not None
+        assert cache.stats()["evictions"] == 1
+
+
+class TestHashingPool:
+    async def test_hashes_run_off_the_event_loop(self) -> None:
+        pool = HashingPool(max_workers=2)
+        hashed = await pool.run(hash_secret, "isolveproblems")
+        assert await pool.run(verify_secret, "isolveproblems", hashed)
+        assert not await pool.run(verify_secret, "wrongpassword", hashed)
+        assert pool.stats()["completed"] == 3
+        pool.shutdown()
+
+    async def test_excess_hashes_are_rejected_once_queue_is_full(self) -> None:
+        pool = HashingPool(max_workers=1, max_queue=1)
+        results = await asyncio.gather(*[pool.run(hash_secret, "pw") for _ in range(3)], return_exceptions=True)
+        rejected = [result for result in results if isinstance(result, HTTPException)]
+        assert len(rejected) == 1
+        assert rejected[0].status_code == 503
+        assert pool.stats()["rejected"] == 1
+        pool.shutdown()
+
+
+class TestLoginRateLimit:
+    async def test_bucket_rejects_once_empty_and_reports_retry_after(self) -> None:
+        limiter = TokenBucketLimiter(backend=InMemoryRateLimitBackend(), name="test", capacity=2, per_minute=60)
+        assert await limiter.hit("key") is None
+        assert await limiter.hit("key") is None
+        assert await limiter.hit("key") == 1
+        # buckets are independent per key
+        assert await limiter.hit("other-key") is None
+
+    async def test_clients_are_keyed_on_user_then_ip(self, test_user: UserInDB, monkeypatch) -> None:
+        token = "cached-token"
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.set(token, claims=JWTPayload(sub=test_user.email, username=test_user.username), user=test_user)
+        monkeypatch.setattr(rate_limit_dependencies, "token_cache", cache)
+        scope = {"type": "http", "client": ("10.0.0.1", 1234)}
+        authenticated = Request({**scope, "headers": [(b"authorization", f"Bearer {token}".encode())]})
+        anonymous = Request({**scope, "headers": []})
+        assert rate_limit_dependencies.client_key(authenticated) == f"user:{test_user.id}"
+        assert rate_limit_dependencies.client_key(anonymous) == "ip:10.0.0.1"
+
+    async def test_login_is_throttled_per_email_before_authentication(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        client.headers["content-type"] = "application/x-www-form-urlencoded"
+        login_data = {"username": "bruteforced@email.io", "password": "guessing"}
+        statuses = [
+            (await client.post(app.url_path_for("users:login-email-and-password"), data=login_data)).status_code
+            for _ in range(10)
+        ]
+        assert HTTP_401_UNAUTHORIZED in statuses
+        assert statuses[-1] == 429
+
+
+class TestRegistrationConflicts:
+    @pytest.mark.parametrize(
+        "attr, detail",
+        (
+            ("email", "That email is already taken. Login with that email or register with another one."),
+            ("username", "That username is already taken. Please try another one."),
+        ),
+    )
+    async def test_conflicting_registration_maps_to_400(
+        self, app: FastAPI, client: AsyncClient, test_user: UserInDB, attr: str, detail: str
+    ) -> None:
+        new_user = {"email": "fresh@email.io", "username": "fresh_username", "password": "freshpassword"}
+        new_user[attr] = getattr(test_user, attr)
+        res = await client.post(app.url_path_for("users:register-new-user"), json={"new_user": new_user})
+        assert res.status_code == HTTP_400_BAD_REQUEST
+        assert res.json()["detail"] == detail
+
+    async def test_registration_returns_user_with_profile(self, app: FastAPI, client: AsyncClient) -> None:
+        new_user = {"email": "vincent@vega.io", "username": "vincentvega", "password": "royalewithcheese"}
+        res = await client.post(app.url_path_for("users:register-new-user"), json={"new_user": new_user})
+        assert res.status_code == HTTP_201_CREATED
+        created_user = UserPublic(**res.json())
+        assert created_user.profile is not None
+        assert created_user.profile.user_id == created_user.id
+        assert created_user.access_token is not None
+
+
+class TestPopulatedUsers:
+    async def test_me_includes_profile(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == HTTP_200_OK
+        user = UserPublic(**res.json())
+        assert user.profile is not None
+        assert user.profile.user_id == test_user.id
+
+    async def test_users_are_batch_loaded_by_id(
+        self, db: Database, test_user: UserInDB, test_user2: UserInDB
+    ) -> None:
+        user_repo = UsersRepository(db)
+        users = await user_repo.get_populated_users_by_ids(user_ids=[test_user.id, test_user2.id, 999999])
+        assert set(users) == {test_user.id, test_user2.id}
+        assert users[test_user2.id].username == test_user2.username
+        assert users[test_user2.id].profile.user_id == test_user2.id